@@ -14,10 +14,11 @@
 # under the License.
 #
 
-from aria import install_aria_extensions
+import time
+
 from aria.utils.console import (Colored, puts)
-from aria_rest.api import AriaRestApi
-from aria_rest.daemon import (BackgroundTaskContext, start_daemon, status_daemon, stop_daemon)
+from aria_rest.daemon import (BackgroundTaskContext, profile_daemon, start_daemon, status_daemon,
+                              stop_daemon)
 
 from .argparser import AriaOpenOArgumentParser
 from .registration import ServiceRegistration
@@ -31,29 +32,66 @@ OPENO_REGISTRATION_PATH = '/openoapi/microservices/v1/services'
 
 
 def main():
-    def start():
+    def serve(started):
+        # Loaded in the daemon, so that starting returns without waiting for them
+        from aria import install_aria_extensions
+        from aria_rest.affinity import AffinityRing
+        from aria_rest.api import (AriaRestApi, create_controllers, create_upload_spooler, warm_up)
+        from aria_rest.load import RequestLoad
+        from aria_rest.readiness import Readiness
+
         install_aria_extensions()
 
+        readiness = Readiness(started)
+        readiness.on_ready(registration.start)
+
+        request_load = RequestLoad(arguments.workers)
+        registration.load = request_load
+
+        if arguments.affinity:
+            registration.affinity = AffinityRing(context.replicas_path)
+
+        controllers = create_controllers(arguments, registration.affinity)
         aria = AriaRestApi(name=OPENO_SERVICE_NAME,
-                           port=arguments.port or OPENO_SERVICE_PORT,
-                           base_path=OPENO_BASE_PATH)
+                           port=port,
+                           base_path=OPENO_BASE_PATH,
+                           controllers=controllers,
+                           workers=arguments.workers,
+                           max_requests=arguments.max_requests,
+                           max_rss=arguments.max_rss * 1024 * 1024 if arguments.max_rss else None,
+                           upload_spooler=create_upload_spooler(arguments),
+                           request_load=request_load,
+                           readiness=readiness,
+                           specification_cache_dir=context.rundir)
+
+        # Also when terminated, which raises SystemExit in the daemon
+        with registration:
+            aria.run(workers_file=context.workers_path,
+                     warm_up=lambda: warm_up(controllers, arguments))
 
-        registration.register()
-        start_daemon(context, aria.run)
+    def start():
+        start_daemon(context, serve, started=time.time())
 
     def stop():
         stop_daemon(context)
-        registration.unregister()
+
+        # The daemon unregisters when it stops, unless it died
+        registration.unregister(missing_ok=True)
 
     arguments, _ = AriaOpenOArgumentParser().parse_known_args()
     openo_msb_url = 'http://{0}:{1}{2}'.format(arguments.msb_ip, arguments.msb_port, OPENO_REGISTRATION_PATH)
     context = BackgroundTaskContext(APP_NAME, arguments.rundir)
+    port = arguments.port or OPENO_SERVICE_PORT
 
     registration = ServiceRegistration(arguments.ip,
-                                       OPENO_SERVICE_PORT,
+                                       port,
                                        OPENO_SERVICE_NAME,
                                        OPENO_SERVICE_VERSION,
-                                       openo_msb_url)
+                                       openo_msb_url,
+                                       timeout=arguments.msb_timeout,
+                                       heartbeat=arguments.msb_heartbeat,
+                                       weight_interval=arguments.msb_weight_interval,
+                                       instance_id=arguments.instance_id)
 
     if arguments.command == 'start':
         start()
@@ -64,6 +102,8 @@ def main():
         start()
     elif arguments.command == 'status':
         status_daemon(context)
+    elif arguments.command == 'profile':
+        profile_daemon(context)
     else:
         puts(Colored.red('Unknown command: {0}'.format(arguments.command)))
 
@@ -33,3 +33,26 @@ class AriaOpenOArgumentParser(AriaRestArgumentParser):
                           type=int,
                           help='Open-O Message Service Bus port',
                           default=80)
+        self.add_argument('--msb_timeout',
+                          type=float,
+                          help='seconds after which a request to the Message Service Bus is '
+                               'abandoned',
+                          default=5)
+        self.add_argument('--msb_heartbeat',
+                          type=float,
+                          help='seconds between re-registrations with the Message Service Bus '
+                               '(0 to register only once)',
+                          default=30)
+        self.add_argument('--msb_weight_interval',
+                          type=float,
+                          help='seconds between checks of the load-balancing weight, which is '
+                               're-registered with the Message Service Bus when it changes',
+                          default=2)
+        self.add_argument('--instance_id',
+                          type=str,
+                          help='identifier of this replica of the service with the Message '
+                               'Service Bus (its address by default)')
+        self.add_argument('--affinity',
+                          action='store_true',
+                          help='tell clients which replica to send requests for the same '
+                               'blueprint to, in the X-Aria-Affinity response header')
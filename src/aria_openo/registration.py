@@ -15,23 +15,88 @@
 #
 
 import json
+import random
+import threading
+import time
 import requests
 import warnings
+from requests.adapters import HTTPAdapter
 
 
 class ServiceRegistration(object):
+    """
+    Registers the service with the Open-O Microservice Bus (MSB).
+
+    :code:`register` makes a single attempt. :code:`start` registers in a background
+    thread instead, retrying with exponential backoff until the MSB accepts, and then
+    re-registers every `heartbeat` seconds. All requests go through one pooled
+    keep-alive connection and give up after `timeout` seconds. Used as a context manager,
+    it stops and unregisters on exit.
+
+    Every replica of the service registers as its own node, identified by
+    `instance_id`. With a `load`, the node's weight for load balancing follows the
+    requests in flight: it is checked every `weight_interval` seconds between
+    re-registrations, and the node re-registers as soon as it changes. With an `affinity` ring, the replicas
+    registered with the MSB are read back after every registration, so that the ring
+    stays up to date.
+    """
+
+    MAX_WEIGHT = 100
+    DEFAULT_TIMEOUT = 5
+    DEFAULT_HEARTBEAT = 30
+    DEFAULT_BACKOFF = 1
+    DEFAULT_MAX_BACKOFF = 60
+    DEFAULT_WEIGHT_INTERVAL = 2
+
+    def __init__(self, service_ip, service_port, service_name, service_version, openo_services_url,
+                 timeout=DEFAULT_TIMEOUT, heartbeat=DEFAULT_HEARTBEAT, backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF, instance_id=None, load=None, affinity=None,
+                 weight_interval=DEFAULT_WEIGHT_INTERVAL):
+        """
+        :param instance_id - identifier of this replica (its address by default)
+        :param load - :class:`RequestLoad` of this replica
+        :param affinity - :class:`AffinityRing` to update with the registered replicas
+        :param timeout - seconds after which a request to the MSB is abandoned
+        :param heartbeat - seconds between re-registrations, or 0 to register only once
+        :param backoff - seconds before the first retry of a failed registration, doubled
+        for every further retry up to `max_backoff`
+        :param weight_interval - seconds between checks of the weight of a registered node
+        with a `load`
+        """
 
-    def __init__(self, service_ip, service_port, service_name, service_version, openo_services_url):
         self.service_ip = service_ip
         self.service_port = service_port
         self.service_name = service_name
         self.service_version = service_version
         self.openo_services_url = openo_services_url
+        self.timeout = timeout
+        self.heartbeat = heartbeat
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.instance_id = instance_id or '{0}:{1}'.format(service_ip, service_port)
+        self.load = load
+        self.affinity = affinity
+        self.weight_interval = weight_interval
         self.is_registered = False
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        self._stopped = threading.Event()
+        self._thread = None
+        self._weight = None
 
     def _register_request_headers(self):
         return {"Content-Type": "application/json"}
 
+    def _node(self):
+        node = {'ip': self.service_ip, 'port': '%d' % self.service_port, 'nodeId': self.instance_id}
+
+        if self.load is not None:
+            self._weight = self.load.weight(self.MAX_WEIGHT)
+            node['lb_server_params'] = 'weight={0}'.format(self._weight)
+
+        return node
+
     def _register_request_payload(self):
         return {
             'serviceName': self.service_name,
@@ -39,7 +104,7 @@ class ServiceRegistration(object):
             'url': '/openoapi/{0}/{1}'.format(self.service_name, self.service_version),
             'protocol': 'REST',
             'visualRange': '1',
-            'nodes': [{'ip': self.service_ip, 'port': '%d' % self.service_port}]
+            'nodes': [self._node()]
         }
 
     def _register_request(self):
@@ -60,20 +125,134 @@ class ServiceRegistration(object):
     def _unregister_request(self):
         return {'url': self._unregister_request_url()}
 
+    def _service_url(self):
+        return '{0}/{1}/version/{2}'.format(self.openo_services_url, self.service_name,
+                                            self.service_version)
+
+    def replicas(self):
+        """
+        Returns the addresses of the replicas registered with the MSB.
+        """
+
+        response = self.session.get(self._service_url(), timeout=self.timeout)
+        response.raise_for_status()
+
+        return ['{0}:{1}'.format(node['ip'], node['port'])
+                for node in response.json().get('nodes') or ()]
+
     def register(self):
-        response = requests.post(**self._register_request())
+        response = self.session.post(timeout=self.timeout, **self._register_request())
 
-        if response.status_code != 201:
+        # The MSB answers 200 when a registration is renewed
+        if response.status_code not in (200, 201):
             raise RuntimeError('An error occurred while registering the parser service:\n {0} - {1}'
                                .format(response.status_code, response.reason))
 
         self.is_registered = True
 
-    def unregister(self):
-        response = requests.delete(**self._unregister_request())
+    def unregister(self, timeout=None, missing_ok=False):
+        """
+        :param timeout - seconds after which the request is abandoned (the registration
+        timeout by default)
+        :param missing_ok - whether a node that is not registered is fine, rather than a
+        failure
+        """
 
-        if response.status_code != 204:
-            warnings.warn('Unregistering the parser service failed:\n {0} - {1}'
-                          .format(response.status_code, response.reason))
+        try:
+            response = self.session.delete(timeout=timeout or self.timeout,
+                                           **self._unregister_request())
+
+            if response.status_code != 204 and not (missing_ok and response.status_code == 404):
+                warnings.warn('Unregistering the parser service failed:\n {0} - {1}'
+                              .format(response.status_code, response.reason))
+        except requests.RequestException as e:
+            warnings.warn('Unregistering the parser service failed:\n {0}'.format(e))
 
         self.is_registered = False
+
+    def _run(self):
+        retries = 0
+
+        while not self._stopped.is_set():
+            try:
+                self.register()
+                retries = 0
+                delay = self.heartbeat
+            except (requests.RequestException, RuntimeError) as e:
+                self.is_registered = False
+                delay = min(self.backoff * 2 ** retries, self.max_backoff) * \
+                    random.uniform(0.5, 1)
+                retries += 1
+                warnings.warn('Registration failed, retrying in {0:.1f} seconds: {1}'
+                              .format(delay, e))
+
+            if self.is_registered and self.affinity is not None:
+                self._update_affinity()
+
+            if not delay:
+                return
+
+            self._wait(delay)
+
+    def _wait(self, delay):
+        """
+        Waits `delay` seconds, or until the node's weight changes while registered.
+        """
+
+        deadline = time.time() + delay
+
+        while not self._stopped.is_set():
+            remaining = deadline - time.time()
+
+            if remaining <= 0:
+                return
+
+            if self.load is None or not self.is_registered:
+                self._stopped.wait(remaining)
+                continue
+
+            self._stopped.wait(min(remaining, self.weight_interval))
+
+            if self.load.weight(self.MAX_WEIGHT) != self._weight:
+                return
+
+    def _update_affinity(self):
+        """
+        Updates the affinity ring with the registered replicas. Failures leave the ring as
+        it is until the next registration.
+        """
+
+        try:
+            self.affinity.update(self.replicas())
+        except (requests.RequestException, ValueError, EnvironmentError) as e:
+            warnings.warn('Updating the replicas failed: {0}'.format(e))
+
+    def start(self):
+        """
+        Registers, and keeps re-registering, in a background thread.
+        """
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops re-registering and unregisters, waiting at most `timeout` seconds for a
+        registration in progress (the registration timeout by default).
+        """
+
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout or self.timeout)
+            self._thread = None
+
+        self.unregister(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
@@ -14,22 +14,40 @@
 # under the License.
 #
 
-from aria import install_aria_extensions
+import time
+
 from aria.utils.console import (Colored, puts)
 
-from .api import AriaRestApi
 from .argparser import AriaRestArgumentParser
-from .daemon import (BackgroundTaskContext, start_daemon, status_daemon, stop_daemon)
+from .daemon import (BackgroundTaskContext, profile_daemon, start_daemon, status_daemon,
+                     stop_daemon)
 
 APP_NAME = 'aria-rest'
 
 
 def main():
-    def start():
+    def serve(started):
+        # Loaded in the daemon, so that starting returns without waiting for them
+        from aria import install_aria_extensions
+        from .api import (AriaRestApi, create_controllers, create_upload_spooler, warm_up)
+        from .readiness import Readiness
+
         install_aria_extensions()
 
-        aria = AriaRestApi(port=arguments.port) if arguments.port else AriaRestApi()
-        start_daemon(context, aria.run)
+        controllers = create_controllers(arguments)
+        aria = AriaRestApi(port=arguments.port or AriaRestApi.DEFAULT_PORT,
+                           controllers=controllers,
+                           workers=arguments.workers,
+                           max_requests=arguments.max_requests,
+                           max_rss=arguments.max_rss * 1024 * 1024 if arguments.max_rss else None,
+                           upload_spooler=create_upload_spooler(arguments),
+                           readiness=Readiness(started),
+                           specification_cache_dir=context.rundir)
+        aria.run(workers_file=context.workers_path,
+                 warm_up=lambda: warm_up(controllers, arguments))
+
+    def start():
+        start_daemon(context, serve, started=time.time())
 
     arguments, _ = AriaRestArgumentParser().parse_known_args()
     context = BackgroundTaskContext(APP_NAME, arguments.rundir)
@@ -43,6 +61,8 @@ def main():
         start()
     elif arguments.command == 'status':
         status_daemon(context)
+    elif arguments.command == 'profile':
+        profile_daemon(context)
     else:
         puts(Colored.red('Unknown command: {0}'.format(arguments.command)))
 
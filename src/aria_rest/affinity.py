@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import bisect
+import hashlib
+import json
+import threading
+
+from .cache import content_key, fingerprint
+from .jobs import write_atomically
+
+BLUEPRINT_PARAMETERS = ('uri', 'literal_location')
+
+
+def blueprint_key(command_data):
+    """
+    Hashes the blueprint of parse command data, regardless of the other parameters. A
+    :code:`uri` of a local file contributes the hash of its bytes, which is shared with
+    the cache keys (see :func:`content_key`), so the file is not read again.
+    """
+
+    return content_key(dict((name, command_data[name]) for name in BLUEPRINT_PARAMETERS
+                            if name in command_data), ())
+
+
+def _point(value):
+    return int(hashlib.md5(value).hexdigest()[:16], 16)
+
+
+class AffinityRing(object):
+    """
+    Consistent-hash ring of the replicas of the service, mapping every blueprint to the
+    replica that should parse it, so that repeated work reaches the replica that has it
+    in its caches. Adding or removing a replica only remaps the blueprints it gains or
+    loses.
+
+    The replicas are kept in a file, so that the process that learns them (from service
+    registration) can update them for all the server processes.
+    """
+
+    POINTS_PER_REPLICA = 64
+
+    def __init__(self, path):
+        self.path = path
+        self._fingerprint = None
+        self._points = []
+        self._replicas = []
+        self._lock = threading.Lock()
+
+    def update(self, replicas):
+        replicas = sorted(set(replicas))
+
+        if replicas != self.replicas:
+            write_atomically(self.path, json.dumps(replicas))
+
+    @property
+    def replicas(self):
+        self._load()
+        return list(self._replicas)
+
+    def _load(self):
+        file_fingerprint = fingerprint(self.path)
+
+        with self._lock:
+            if file_fingerprint == self._fingerprint:
+                return
+
+            try:
+                with open(self.path) as replicas_file:
+                    replicas = json.load(replicas_file)
+            except (IOError, ValueError):
+                replicas = []
+
+            self._points = sorted((_point('{0}#{1}'.format(replica, index)), replica)
+                                  for replica in replicas
+                                  for index in xrange(self.POINTS_PER_REPLICA))
+            self._replicas = replicas
+            self._fingerprint = file_fingerprint
+
+    def owner(self, key):
+        """
+        Returns the replica that `key` (such as a :func:`blueprint_key`) maps to, or None
+        if no replicas are known.
+        """
+
+        self._load()
+        points = self._points
+
+        if not points:
+            return None
+
+        index = bisect.bisect(points, (_point(key),)) % len(points)
+        return points[index][1]
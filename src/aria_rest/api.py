@@ -15,18 +15,245 @@
 #
 
 import connexion
+import hashlib
+import json
 import os
+import pkg_resources
 import sys
+import tempfile
+import threading
+import traceback
+import yaml
 
-from .controllers import ParseController
+from aria.utils.console import (Colored, puts)
+
+from .archives import ArchiveCache
+from .aria_customisation import HttpLoaderSource
+from .cache import ContextSnapshotCache, ParseResultCache, RawCache, fingerprint
+from .controllers import (BatchController, JobController, MetricsController, ParseController,
+                          ReadinessController, SessionController)
+from .fetching import HttpFetcher
+from .jobs import write_atomically
+from .metrics import Metrics
+from .prefork import PreforkServer
+from .readiness import Readiness
+from .store import ContentStore, ResultStore
+from .templates import TemplateCache
+from .uploads import UploadSpooler
+
+ADMIN_TOKEN_VARIABLE = 'ARIA_REST_ADMIN_TOKEN'
+
+
+def _upload_store(arguments):
+    """
+    Store of uploaded archives and spooled request bodies, shared by the workers of a
+    prefork server.
+    """
+
+    uploads_dir = os.path.abspath(os.path.join(arguments.rundir, 'uploads')) if arguments.rundir \
+        else ArchiveCache.DEFAULT_DIRECTORY
+
+    return ContentStore(uploads_dir, arguments.archive_cache_size * 1024 * 1024)
+
+
+def result_version():
+    """
+    Version of the code that results depend on: ARIA and this package.
+    """
+
+    versions = []
+
+    for name in ('aria', 'aria_openo'):
+        try:
+            versions.append('{0}=={1}'.format(name, pkg_resources.get_distribution(name).version))
+        except pkg_resources.DistributionNotFound:
+            versions.append(name)
+
+    return ','.join(versions)
+
+
+def _result_store(arguments):
+    """
+    Store of parse results and read files kept across restarts, shared by the workers of
+    a prefork server (and by other servers, given a shared directory), or None if disabled.
+    """
+
+    if not arguments.result_store_size:
+        return None
+
+    results_dir = arguments.result_store_dir or \
+        (os.path.join(arguments.rundir, 'results') if arguments.rundir
+         else ResultStore.DEFAULT_DIRECTORY)
+
+    return ResultStore(os.path.abspath(results_dir), arguments.result_store_size * 1024 * 1024,
+                       result_version())
+
+
+def _admin_token(arguments):
+    """
+    The admin token, read from a file or from the :code:`ADMIN_TOKEN_VARIABLE` environment
+    variable rather than from the command line, where other users could see it.
+    """
+
+    if arguments.admin_token_file:
+        with open(arguments.admin_token_file) as token_file:
+            return token_file.read().strip() or None
+
+    return os.environ.get(ADMIN_TOKEN_VARIABLE) or None
+
+
+def create_controllers(arguments, affinity=None):
+    """
+    Creates the default controllers, configured by parsed command line arguments.
+
+    :param affinity - :class:`AffinityRing` of the replicas of the service, if known
+    """
+
+    http_dir = os.path.abspath(os.path.join(arguments.rundir, 'http')) if arguments.rundir \
+        else HttpFetcher.DEFAULT_DIRECTORY
+    fetcher = HttpFetcher(http_dir, arguments.http_connections, arguments.http_timeout)
+
+    # Shared by the workers of a prefork server, which is forked from this process
+    metrics_dir = os.path.abspath(os.path.join(arguments.rundir, 'metrics')) if arguments.rundir \
+        else tempfile.mkdtemp(prefix='aria_rest_metrics')
+    metrics = Metrics(metrics_dir)
+    metrics.clear()
+
+    archives = ArchiveCache(_upload_store(arguments), arguments.archive_cache_size * 1024 * 1024)
+    results = _result_store(arguments)
+    raw_results = results
+
+    # Read files are stored pickled, and only loaded from a directory that only we can change
+    if results is not None and not results.is_private:
+        puts(Colored.yellow('Not storing read files in {0}, which other users can write to'
+                            .format(results.directory)))
+        raw_results = None
+
+    memory_limit = arguments.memory_limit * 1024 * 1024 if arguments.memory_limit else None
+    max_rss = arguments.max_rss * 1024 * 1024 if arguments.max_rss else None
+
+    parse_controller = ParseController(cache=ParseResultCache(arguments.cache_size * 1024 * 1024,
+                                                              results),
+                                       snapshots=ContextSnapshotCache(arguments.snapshots),
+                                       raw_cache=RawCache(arguments.read_cache_size * 1024 * 1024,
+                                                          raw_results),
+                                       pool_size=arguments.parsers,
+                                       timeout=arguments.timeout,
+                                       cpu_limit=arguments.cpu_limit,
+                                       loader_source=HttpLoaderSource(fetcher),
+                                       metrics=metrics,
+                                       admin_token=_admin_token(arguments),
+                                       memory_limit=memory_limit,
+                                       max_requests=arguments.max_requests,
+                                       max_rss=max_rss,
+                                       archives=archives,
+                                       affinity=affinity)
+
+    jobs_dir = os.path.abspath(os.path.join(arguments.rundir, 'jobs')) if arguments.rundir else None
+    sessions_dir = os.path.abspath(os.path.join(arguments.rundir, 'sessions')) \
+        if arguments.rundir else None
+
+    return [parse_controller,
+            JobController(parse_controller, jobs_dir, arguments.job_threads, arguments.job_ttl),
+            SessionController(parse_controller, sessions_dir, arguments.session_ttl),
+            BatchController(parse_controller, arguments.batch_parsers, arguments.timeout,
+                            arguments.cpu_limit, memory_limit, arguments.max_requests, max_rss,
+                            TemplateCache(arguments.templates)),
+            MetricsController(metrics)]
+
+
+def create_upload_spooler(arguments):
+    """
+    Creates the middleware bounding request bodies, configured by parsed command line
+    arguments.
+    """
+
+    return UploadSpooler(_upload_store(arguments),
+                         arguments.upload_spool_size * 1024,
+                         arguments.max_upload_size * 1024 * 1024)
+
+
+def warm_up(controllers, arguments):
+    """
+    Preloads the profiles and parses the warm-up blueprints configured by parsed command
+    line arguments.
+    """
+
+    for controller in controllers:
+        if isinstance(controller, ParseController):
+            for path, issues in controller.preload(arguments.profile or ()).iteritems():
+                puts(Colored.yellow('Profile {0} has {1} issue(s)'.format(path, len(issues))))
+
+            for path, seconds in controller.warm_up(arguments.warmup or ()).iteritems():
+                puts(Colored.blue('Warmed up {0} in {1:.2f} seconds'.format(path, seconds)))
+
+
+def load_specification(path, directory=None):
+    """
+    Loads the swagger specification at `path` from a JSON copy compiled in `directory`
+    (the system temporary directory by default), compiling it first if the
+    specification changed, so that the YAML is parsed only once.
+    """
+
+    source_fingerprint = fingerprint(path)
+    key = hashlib.sha256(repr((os.path.abspath(path), source_fingerprint))).hexdigest()
+    compiled_path = os.path.join(directory or tempfile.gettempdir(),
+                                 'aria_rest_swagger_{0}.json'.format(key))
+
+    try:
+        with open(compiled_path) as compiled_file:
+            return json.load(compiled_file)
+    except (IOError, ValueError):
+        pass
+
+    with open(path) as specification_file:
+        specification = yaml.safe_load(specification_file)
+
+    try:
+        write_atomically(compiled_path, json.dumps(specification))
+    except (IOError, OSError):
+        pass
+
+    return specification
+
+
+def instantiate_controllers(controllers):
+    """
+    Instantiates the controller classes in `controllers` with their default settings,
+    sharing one :class:`ParseController` (the one in `controllers`, if any) between those
+    depending on it, like :func:`create_controllers`. Instances are kept as they are.
+    """
+
+    parse_controller = next((controller for controller in controllers
+                             if isinstance(controller, ParseController)), None)
+
+    if parse_controller is None and ParseController in controllers:
+        parse_controller = ParseController()
+
+    instances = []
+
+    for controller in controllers:
+        if controller is ParseController:
+            instances.append(parse_controller)
+        elif isinstance(controller, type) and \
+                issubclass(controller, (JobController, SessionController, BatchController)):
+            instances.append(controller(parse_controller))
+        elif isinstance(controller, type):
+            instances.append(controller())
+        else:
+            instances.append(controller)
+
+    return instances
 
 
 class AriaRestApi(object):
-    DEFAULT_CONTROLLERS = [ParseController]
+    DEFAULT_CONTROLLERS = [ParseController, JobController, SessionController, BatchController,
+                           MetricsController]
     DEFAULT_NAME = 'aria_rest'
     DEFAULT_PORT = 8080
     DEFAULT_SWAGGER_FILE = 'swagger.yaml'
     DEFAULT_BASE_PATH = '/'
+    DEFAULT_WORKERS = 1
 
     def _resolve(self, function_name):
         if '.' in function_name:
@@ -45,17 +272,89 @@ class AriaRestApi(object):
                  base_path=DEFAULT_BASE_PATH,
                  controllers=DEFAULT_CONTROLLERS,
                  swagger_file=DEFAULT_SWAGGER_FILE,
+                 workers=DEFAULT_WORKERS,
+                 readiness=None,
+                 specification_cache_dir=None,
+                 max_requests=None,
+                 max_rss=None,
+                 upload_spooler=None,
+                 request_load=None,
                  *args,
                  **kwargs):
+        """
+        :param readiness - :class:`Readiness` reported by the :code:`/ready` endpoint
+        :param specification_cache_dir - directory of the compiled swagger specification,
+        see :func:`load_specification`
+        :param max_requests - number of requests after which a worker is replaced
+        :param max_rss - resident set size in bytes above which a worker is replaced
+        :param upload_spooler - :class:`UploadSpooler` wrapping the application, if request
+        bodies are to be bounded and spooled
+        :param request_load - :class:`RequestLoad` wrapping the application, if the requests
+        in flight are to be counted
+        """
+
         super(AriaRestApi, self).__init__(*args, **kwargs)
 
         self.port = port
-        self.controllers = [controller_cls() for controller_cls in controllers]
-        self.app = connexion.App(name,
-                                 specification_dir=os.path.dirname(sys.modules[__name__].__file__))
-        self.app.add_api(swagger_file,
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+        self.readiness = readiness if readiness is not None else Readiness()
+        self.controllers = instantiate_controllers(controllers)
+        self.controllers.append(ReadinessController(self.readiness))
+
+        specification_dir = os.path.dirname(sys.modules[__name__].__file__)
+        self.app = connexion.App(name, specification_dir=specification_dir)
+        self.app.add_api(load_specification(os.path.join(specification_dir, swagger_file),
+                                            specification_cache_dir),
                          base_path=base_path,
                          resolver=connexion.Resolver(function_resolver=self._resolve))
 
-    def run(self):
-        self.app.run(self.port)
+        if upload_spooler is not None:
+            upload_spooler.app = self.app.app.wsgi_app
+            self.app.app.wsgi_app = upload_spooler
+
+        if request_load is not None:
+            request_load.app = self.app.app.wsgi_app
+            self.app.app.wsgi_app = request_load
+
+    def _retire_worker(self):
+        """
+        Saves the metrics recorded by a worker of a prefork server before it exits.
+        """
+
+        for metrics in set(getattr(controller, 'metrics', None) for controller in self.controllers):
+            if metrics is not None:
+                metrics.retire()
+
+    def run(self, workers_file=None, warm_up=None):
+        """
+        Serves until terminated, reporting ready once `warm_up` (if given) returns.
+
+        Several workers are forked only after warming up, so that they share what was
+        loaded; a single worker starts serving immediately and warms up meanwhile, unless
+        it has to be replaced after some requests or above some memory size, which
+        requires it to be forked too.
+        """
+
+        def start():
+            try:
+                if warm_up is not None:
+                    warm_up()
+            except Exception:
+                traceback.print_exc()
+
+            self.readiness.mark_ready()
+
+        if self.workers > 1 or self.max_requests or self.max_rss:
+            start()
+            server = PreforkServer(self.app.app, self.port, self.workers, workers_file=workers_file,
+                                   max_requests=self.max_requests, max_rss=self.max_rss,
+                                   on_exit=self._retire_worker)
+            server.serve_forever()
+        else:
+            thread = threading.Thread(target=start)
+            thread.daemon = True
+            thread.start()
+
+            self.app.run(self.port)
@@ -0,0 +1,220 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import mmap
+import os
+import posixpath
+import tempfile
+import threading
+import zipfile
+
+from .cache import LruCache
+from .store import ContentStore
+
+ZIP_SIGNATURE = 'PK\x03\x04'
+TOSCA_META = 'TOSCA-Metadata/TOSCA.meta'
+ENTRY_DEFINITIONS = 'Entry-Definitions'
+BLUEPRINT_EXTENSIONS = ('.yaml', '.yml')
+SCHEME = 'archive'
+
+
+def is_archive(content):
+    """
+    Whether uploaded content is a zip archive (such as a TOSCA CSAR) rather than a
+    blueprint.
+    """
+
+    return isinstance(content, str) and content.startswith(ZIP_SIGNATURE)
+
+
+def parse_uri(uri):
+    """
+    Returns the (key, entry name) pair of an archive URI, or None for other URIs.
+    """
+
+    if not isinstance(uri, basestring) or not uri.startswith(SCHEME + ':'):
+        return None
+
+    key, _, name = uri[len(SCHEME) + 1:].partition('/')
+    return key, name
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class MappedFile(object):
+    """
+    Read-only file interface to a memory map, as expected by :class:`zipfile.ZipFile`.
+    """
+
+    def __init__(self, memory_map):
+        self.memory_map = memory_map
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self.memory_map) - self.memory_map.tell()
+        return self.memory_map.read(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        try:
+            self.memory_map.seek(offset, whence)
+        except ValueError as e:
+            raise IOError(str(e))
+
+    def tell(self):
+        return self.memory_map.tell()
+
+    def close(self):
+        self.memory_map.close()
+
+
+class Archive(object):
+    """
+    A zip archive stored in a file, read in place through a memory map. Entries are
+    decompressed on first read only.
+    """
+
+    def __init__(self, key, path):
+        with open(path, 'rb') as archive_file:
+            self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._zip = zipfile.ZipFile(MappedFile(self._map))
+        except (zipfile.BadZipfile, zipfile.LargeZipFile) as e:
+            self._map.close()
+            raise ArchiveError('Not a valid zip archive: {0}'.format(e))
+
+        self.key = key
+        self.names = frozenset(info.filename for info in self._zip.infolist()
+                               if not info.filename.endswith('/'))
+        self.size = len(self._map) + sum(info.file_size for info in self._zip.infolist())
+        self._texts = {}
+        self._lock = threading.Lock()
+
+    def uri(self, name):
+        return '{0}:{1}/{2}'.format(SCHEME, self.key, name)
+
+    def read(self, name):
+        """
+        :raises KeyError: when the archive has no such entry
+        """
+
+        with self._lock:
+            text = self._texts.get(name)
+
+            if text is None:
+                if name not in self.names:
+                    raise KeyError(name)
+
+                # The zip file reads through the memory map from a single position
+                text = self._texts[name] = self._zip.read(name)
+
+        return text
+
+    def resolve(self, name, origin_name=None):
+        """
+        Returns the entry `name` refers to, relative to the directory of entry
+        `origin_name` if given, or None if the archive has no such entry.
+        """
+
+        if origin_name is not None:
+            name = posixpath.join(posixpath.dirname(origin_name), name)
+
+        name = posixpath.normpath(name)
+        return name if name in self.names else None
+
+    @property
+    def entry(self):
+        """
+        The main blueprint: the :code:`Entry-Definitions` of a CSAR, or else the only
+        blueprint at the root of the archive.
+
+        :raises ArchiveError: when there is no single main blueprint
+        """
+
+        if TOSCA_META in self.names:
+            for line in self.read(TOSCA_META).splitlines():
+                name, _, value = line.partition(':')
+
+                if name.strip() == ENTRY_DEFINITIONS:
+                    entry = self.resolve(value.strip())
+
+                    if entry is None:
+                        raise ArchiveError('Entry definitions not found: {0}'
+                                           .format(value.strip()))
+
+                    return entry
+
+        candidates = [name for name in self.names
+                      if '/' not in name and name.endswith(BLUEPRINT_EXTENSIONS)]
+
+        if len(candidates) != 1:
+            raise ArchiveError('Archive has no {0} and {1} blueprints at its root'
+                               .format(TOSCA_META, len(candidates)))
+
+        return candidates[0]
+
+
+class ArchiveCache(LruCache):
+    """
+    Uploaded archives, bounded by their total size, compressed and decompressed.
+    Archives are stored as :code:`.zip` files in a :class:`ContentStore`, so that all
+    processes sharing it can open them by their content hash, and uploading the same
+    archive again reuses it.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'aria_rest_uploads')
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    EXTENSION = '.zip'
+
+    def __init__(self, store=None, max_bytes=DEFAULT_MAX_BYTES):
+        super(ArchiveCache, self).__init__(max_bytes)
+        self.store = store if store is not None else ContentStore(self.DEFAULT_DIRECTORY)
+
+    def add(self, content):
+        """
+        Stores archive `content` and returns it as an :class:`Archive`.
+
+        :raises ArchiveError: when the content is not a valid zip archive
+        """
+
+        key = self.store.put(content, self.EXTENSION)
+
+        try:
+            return self.open(key)
+        except ArchiveError:
+            self.store.remove(key, self.EXTENSION)
+            raise
+
+    def open(self, key):
+        """
+        Returns the archive stored under `key`.
+
+        :raises ArchiveError: when there is no such archive
+        """
+
+        archive = self.get(key)
+
+        if archive is None:
+            try:
+                archive = Archive(key, self.store.path(key, self.EXTENSION))
+            except (IOError, ValueError):
+                raise ArchiveError('Archive not found: {0}'.format(key))
+
+            self.put(key, archive, archive.size)
+
+        return archive
@@ -16,6 +16,9 @@
 
 from argparse import ArgumentParser
 
+from .fetching import HttpFetcher
+from .pool import WorkerPool
+
 
 class AriaRestArgumentParser(ArgumentParser):
 
@@ -23,10 +26,117 @@ class AriaRestArgumentParser(ArgumentParser):
         super(AriaRestArgumentParser, self).__init__(description='Aria REST server', prog='aria-rest')
         self.add_argument('command',
                           nargs='?',
-                          help='daemon command: start, stop, restart, or status',
+                          help='daemon command: start, stop, restart, status, or profile (turns stack '
+                               'sampling on or off)',
                           default='status')
         self.add_argument('--port',
                           type=int,
                           help='HTTP port')
         self.add_argument('--rundir',
                           help='pid and log files directory for daemons (defaults to user home)')
+        self.add_argument('--cache-size',
+                          type=int,
+                          help='parse result cache size in megabytes (0 disables caching)',
+                          default=64)
+        self.add_argument('--read-cache-size',
+                          type=int,
+                          help='size in megabytes of the files whose parsed content is kept for reuse '
+                               'by other blueprints importing them (0 disables it)',
+                          default=64)
+        self.add_argument('--archive-cache-size',
+                          type=int,
+                          help='size in megabytes of the uploaded blueprint archives and spooled '
+                               'request bodies kept on disk',
+                          default=256)
+        self.add_argument('--upload-spool-size',
+                          type=int,
+                          help='size in kilobytes above which request bodies are spooled to disk '
+                               'rather than kept in memory',
+                          default=1024)
+        self.add_argument('--max-upload-size',
+                          type=int,
+                          help='size in megabytes above which request bodies are refused',
+                          default=64)
+        self.add_argument('--result-store-size',
+                          type=int,
+                          help='size in megabytes of the parse results and read files kept on '
+                               'disk across restarts (0 disables it)',
+                          default=256)
+        self.add_argument('--result-store-dir',
+                          help='directory of the results kept on disk, which can be shared by '
+                               'several servers (defaults to "results" in the rundir)')
+        self.add_argument('--profile',
+                          action='append',
+                          help='type definitions file (or directory of them) imported by many '
+                               'blueprints, read once at startup (it is still validated with every '
+                               'blueprint); may be repeated')
+        self.add_argument('--warmup',
+                          action='append',
+                          help='blueprint file (or directory of them) parsed at startup, before the '
+                               'server reports ready; may be repeated')
+        self.add_argument('--snapshots',
+                          type=int,
+                          help='number of modeled blueprints kept for instantiation with new inputs',
+                          default=16)
+        self.add_argument('--templates',
+                          type=int,
+                          help='number of compiled blueprint templates kept for rendering',
+                          default=64)
+        self.add_argument('--workers',
+                          type=int,
+                          help='number of forked server processes sharing the HTTP port',
+                          default=1)
+        self.add_argument('--parsers',
+                          type=int,
+                          help='number of isolated parser processes per worker '
+                               '(0 parses in the worker itself)',
+                          default=0)
+        self.add_argument('--timeout',
+                          type=float,
+                          help='wall-clock limit in seconds for parsing a request (requires --parsers)')
+        self.add_argument('--cpu-limit',
+                          type=int,
+                          help='CPU time limit in seconds for parsing a request (requires --parsers)')
+        self.add_argument('--memory-limit',
+                          type=int,
+                          help='limit in megabytes of the memory allocated for parsing a request, '
+                               'beyond which parsing is aborted with an issue (requires --parsers)')
+        self.add_argument('--max-requests',
+                          type=int,
+                          help='number of requests after which a server or parser process is '
+                               'replaced by a fresh one')
+        self.add_argument('--max-rss',
+                          type=int,
+                          help='resident memory in megabytes above which a server or parser '
+                               'process is replaced by a fresh one')
+        self.add_argument('--job-threads',
+                          type=int,
+                          help='number of background jobs run concurrently by each worker',
+                          default=2)
+        self.add_argument('--job-ttl',
+                          type=int,
+                          help='seconds for which finished background jobs are kept',
+                          default=3600)
+        self.add_argument('--session-ttl',
+                          type=int,
+                          help='seconds for which idle validation sessions are kept',
+                          default=3600)
+        self.add_argument('--batch-parsers',
+                          type=int,
+                          help='number of parser processes per worker for batch requests '
+                               '(defaults to the number of cores)',
+                          default=WorkerPool.DEFAULT_SIZE)
+        self.add_argument('--admin-token-file',
+                          help='file holding the token that enables the profile parameter of the '
+                               'parser endpoints for requests sending it in the X-Admin-Token '
+                               'header (defaults to the ARIA_REST_ADMIN_TOKEN environment '
+                               'variable)')
+        self.add_argument('--http-connections',
+                          type=int,
+                          help='number of keep-alive connections per host for fetching remote '
+                               'blueprints and imports',
+                          default=HttpFetcher.DEFAULT_CONNECTIONS)
+        self.add_argument('--http-timeout',
+                          type=float,
+                          help='seconds to wait for remote blueprints and imports',
+                          default=HttpFetcher.DEFAULT_TIMEOUT)
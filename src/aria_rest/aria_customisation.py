@@ -13,12 +13,28 @@
 # under the License.
 #
 
+import copy
 import os
+import threading
+import urlparse
 
+from aria.parser.consumption import Read
 from aria.parser.consumption.context import ConsumptionContext
-from aria.parser.loading import UriLocation, LiteralLocation
+from aria.parser.loading import (DefaultLoaderSource, DocumentNotFoundException, Loader,
+                                 LoaderException, LoaderSource, LiteralLocation, UriLocation)
+from aria.parser.reading import AlreadyReadException
+from aria.parser.validation import Issue, ValidationContext
 from aria.utils.imports import import_fullname
 
+from .archives import ArchiveError, parse_uri
+from .cache import fingerprint
+from .fetching import FetchError, HttpFetcher
+
+
+def is_remote(location):
+    return location is not None and \
+        urlparse.urlparse(unicode(location)).scheme in ('http', 'https')
+
 
 class ConsumptionContextBuilder(object):
     """
@@ -28,7 +44,8 @@ class ConsumptionContextBuilder(object):
 
     Currently supported parameters:
 
-    * :code:`loader_source`
+    * :code:`loader_source` - e.g. :code:`aria_rest.aria_customisation.HttpLoaderSource`
+      for pooled and cached HTTP loading
     * :code:`reader_source`
     * :code:`presenter_source`
     * :code:`presenter`
@@ -37,12 +54,97 @@ class ConsumptionContextBuilder(object):
     * :code:`uri`
     * :code:`literal_location`
     * :code:`prefixes`
+    * :code:`import_prefixes` - additional directories or URIs to resolve imports against,
+      such as the directory of a template that :code:`literal_location` was rendered from
+    * :code:`snapshot` - context already consumed up to the `Model` stage, whose
+      presentation and (copied) model are reused, so only later stages need to run.
+      Every context gets its own copy of the id generation state
+    * :code:`raw_cache` - :class:`RawCache` shared with other contexts, used by
+      :class:`CachedRead`
+    * :code:`timings` - :class:`Timings` to which :class:`CachedRead` adds the time spent
+      loading every file (as :code:`load`)
+    * :code:`level` - highest level of the issues to report (see :class:`Issue`), others
+      are ignored
+    * :code:`max_issues` - number of issues after which consumption stops, see
+      :class:`BoundedValidationContext`
+
+    Classes are imported once. The fields set by :code:`TEMPLATE_PARAMETERS` are computed
+    once per combination of their values and then assigned to every new context, so the
+    source objects are shared by all contexts built with the same parameters and must
+    not keep per-context state.
     """
 
+    TEMPLATE_PARAMETERS = ('loader_source', 'reader_source', 'presenter_source', 'presenter',
+                           'debug', 'prefixes')
+    MAX_TEMPLATES = 64
+    ID_STATE = ('_serial_id_counter', '_locally_unique_ids')
+
+    _classes = {}
+    _templates = {}
+    _lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         self.parameters = kwargs
         self.args = args
 
+    @classmethod
+    def _import(cls, name):
+        """
+        Memoized :func:`import_fullname`.
+        """
+
+        imported = cls._classes.get(name)
+
+        if imported is None:
+            imported = import_fullname(name)
+
+            with cls._lock:
+                cls._classes[name] = imported
+
+        return imported
+
+    def _template(self):
+        """
+        Returns the (object name, field name, value) assignments and the loading prefixes
+        for the template parameters, building them on first use.
+        """
+
+        key = repr(tuple(self.parameters.get(name) for name in self.TEMPLATE_PARAMETERS))
+        template = self._templates.get(key)
+
+        if template is not None:
+            return template
+
+        def instance(name):
+            return self._import(name)()
+
+        assignments = []
+
+        for object_name, field_name, parameter_name, function in (
+                ('loading', 'loader_source', 'loader_source', instance),
+                ('reading', 'reader_source', 'reader_source', instance),
+                ('presentation', 'presenter_source', 'presenter_source', instance),
+                ('presentation', 'presenter_class', 'presenter', self._import),
+                ('presentation', 'print_exceptions', 'debug', lambda x: x)):
+            value = self.parameters.get(parameter_name)
+
+            if value:
+                assignments.append((object_name, field_name, function(value)))
+
+        prefixes = []
+
+        if self.parameters.get('prefixes'):
+            prefixes.append(os.path.join(self.parameters['prefixes'], 'definitions'))
+
+        template = (tuple(assignments), tuple(prefixes))
+
+        with self._lock:
+            if len(self._templates) >= self.MAX_TEMPLATES:
+                self._templates.clear()
+            self._templates[key] = template
+
+        return template
+
     def _set_when_defined(self,
                           object,
                           object_field_name,
@@ -80,26 +182,46 @@ class ConsumptionContextBuilder(object):
         def set_literal_location(literal_location):
             return LiteralLocation(literal_location)
 
+        assignments, prefixes = self._template()
+
         context = ConsumptionContext()
         context.args.extend(list(self.args))
 
-        self._set_when_defined(
-            context.loading, 'loader_source', 'loader_source', import_fullname)
-        self._set_when_defined(
-            context.reading, 'reader_source', 'reader_source', import_fullname)
-        self._set_when_defined(
-            context.presentation, 'presenter_source', 'presenter_source', import_fullname)
-        self._set_when_defined(
-            context.presentation, 'presenter_class', 'presenter', import_fullname)
+        for object_name, field_name, value in assignments:
+            setattr(getattr(context, object_name), field_name, value)
+
         self._set_when_defined(
             context, 'out', 'out', lambda x: x, False)
-        self._set_when_defined(
-            context.presentation, 'print_exceptions', 'debug', lambda x: x, False)
         self._set_when_defined(
             context.presentation, 'location', 'uri', set_uri, False)
         self._set_when_defined(
             context.presentation, 'location', 'literal_location', set_literal_location, False)
 
+        # Set even when empty: caches are false while they have no entries
+        for name in ('raw_cache', 'timings'):
+            if self.parameters.get(name) is not None:
+                setattr(context.reading, name, self.parameters[name])
+
+        if self.parameters.get('level') is not None or self.parameters.get('max_issues'):
+            context.validation = BoundedValidationContext(self.parameters.get('level'),
+                                                          self.parameters.get('max_issues'))
+
+        if 'snapshot' in self.parameters and self.parameters['snapshot']:
+            snapshot = self.parameters['snapshot']
+            modeling = copy.copy(snapshot.modeling)
+            modeling.model = copy.deepcopy(snapshot.modeling.model)
+            modeling.instance = None
+            modeling.inputs = context.modeling.inputs
+
+            # Own id generation state, so that instances of the same snapshot do not
+            # interleave or collide on generated ids
+            for name in self.ID_STATE:
+                if hasattr(snapshot.modeling, name):
+                    setattr(modeling, name, copy.copy(getattr(snapshot.modeling, name)))
+
+            context.presentation.presenter = snapshot.presentation.presenter
+            context.modeling = modeling
+
         if 'inputs' in self.parameters:
             inputs = self.parameters['inputs']
 
@@ -110,7 +232,342 @@ class ConsumptionContextBuilder(object):
                 else:
                     context.args.append('--inputs=%s' % inputs)
 
-        if 'prefixes' in self.parameters and self.parameters['prefixes']:
-            context.loading.prefixes += [os.path.join(self.parameters['prefixes'], 'definitions')]
+        if prefixes:
+            context.loading.prefixes += list(prefixes)
+
+        if self.parameters.get('import_prefixes'):
+            context.loading.prefixes += list(self.parameters['import_prefixes'])
 
         return context
+
+
+class IssueLimitError(Exception):
+    pass
+
+
+class BoundedValidationContext(ValidationContext):
+    """
+    Validation context reporting the issues up to `level` (ARIA's :code:`max_level`), which
+    stops consumption by raising :class:`IssueLimitError` as soon as `max_issues` of them
+    were reported.
+
+    Issues above `level` are still found, only not reported.
+    """
+
+    def __init__(self, level=None, max_issues=None):
+        super(BoundedValidationContext, self).__init__()
+        self.max_level = level if level is not None else Issue.ALL
+        self.max_issues = max_issues
+
+    @property
+    def has_issues(self):
+        # Unlike ARIA's, ignores the issues above the level
+        return len(self.issues) > 0
+
+    def report(self, message=None, exception=None, location=None, line=None, column=None,
+               locator=None, snippet=None, level=Issue.PLATFORM, issue=None):
+        if issue is None:
+            issue = Issue(message=message, exception=exception, location=location, line=line,
+                          column=column, locator=locator, snippet=snippet, level=level)
+
+        super(BoundedValidationContext, self).report(issue=issue)
+
+        if self.max_issues and issue.level <= self.max_level and \
+                len(self.issues) >= self.max_issues:
+            raise IssueLimitError('reached {0} issues'.format(self.max_issues))
+
+
+class HttpTextLoader(Loader):
+    """
+    Loads a document through an :class:`HttpFetcher`.
+    """
+
+    def __init__(self, fetcher, location, uri):
+        self.fetcher = fetcher
+        self.location = location
+        self.uri = uri
+        self._text = None
+
+    def open(self):
+        try:
+            self._text = self.fetcher.fetch(self.uri)
+        except FetchError as e:
+            if e.status == 404:
+                raise DocumentNotFoundException('URI not found: "{0}"'.format(self.uri))
+            raise LoaderException(str(e))
+
+        # Imports relative to this document are resolved against its actual URI
+        self.location.uri = self.uri
+
+    def close(self):
+        pass
+
+    def load(self):
+        return self._text
+
+    def get_canonical_location(self):
+        return self.uri
+
+
+class HttpLoaderSource(LoaderSource):
+    """
+    Loads HTTP(S) URIs, and URIs relative to documents loaded over HTTP(S), through a
+    pooled and cached :class:`HttpFetcher`. Other locations are loaded by `loader_source`
+    (ARIA's default loader source if not given).
+
+    Can be used as the :code:`loader_source` parameter of
+    :class:`ConsumptionContextBuilder`, in which case a fetcher with the default settings
+    is shared by all contexts.
+    """
+
+    DEFAULT_FETCHER = None
+
+    def __init__(self, fetcher=None, loader_source=None):
+        super(HttpLoaderSource, self).__init__()
+
+        if fetcher is None:
+            if HttpLoaderSource.DEFAULT_FETCHER is None:
+                HttpLoaderSource.DEFAULT_FETCHER = HttpFetcher()
+            fetcher = HttpLoaderSource.DEFAULT_FETCHER
+
+        self.fetcher = fetcher
+        self.loader_source = loader_source or DefaultLoaderSource()
+
+    @staticmethod
+    def _remote_uri(location, origin_location):
+        uri = location.uri
+
+        if is_remote(uri):
+            return uri
+
+        if isinstance(origin_location, UriLocation) and is_remote(origin_location.uri) \
+                and not os.path.isabs(uri) and not urlparse.urlparse(uri).scheme:
+            return urlparse.urljoin(origin_location.uri, uri)
+
+        return None
+
+    def get_loader(self, context, location, origin_location):
+        if isinstance(location, UriLocation):
+            uri = self._remote_uri(location, origin_location)
+
+            if uri is not None:
+                return HttpTextLoader(self.fetcher, location, uri)
+
+        return self.loader_source.get_loader(context, location, origin_location)
+
+
+class ArchiveTextLoader(Loader):
+    """
+    Loads an entry of an :class:`Archive`.
+    """
+
+    def __init__(self, archive, location, name):
+        self.archive = archive
+        self.location = location
+        self.name = name
+        self._text = None
+
+    def open(self):
+        try:
+            self._text = self.archive.read(self.name)
+        except KeyError:
+            raise DocumentNotFoundException('Archive entry not found: "{0}"'.format(self.name))
+
+        # Imports relative to this entry are resolved against its archive URI
+        self.location.uri = self.archive.uri(self.name)
+
+    def close(self):
+        pass
+
+    def load(self):
+        return self._text
+
+    def get_canonical_location(self):
+        return self.archive.uri(self.name)
+
+
+class ArchiveLoaderSource(LoaderSource):
+    """
+    Loads archive URIs (see :meth:`Archive.uri`), and URIs relative to archive entries
+    that are found in the same archive, from an :class:`ArchiveCache`. Other locations
+    are loaded by `loader_source`.
+    """
+
+    def __init__(self, archives, loader_source):
+        super(ArchiveLoaderSource, self).__init__()
+        self.archives = archives
+        self.loader_source = loader_source
+
+    def _entry(self, location, origin_location):
+        parsed = parse_uri(location.uri)
+
+        if parsed is not None:
+            key, name = parsed
+            origin_name = None
+        elif isinstance(origin_location, UriLocation) and \
+                parse_uri(origin_location.uri) is not None and \
+                not os.path.isabs(location.uri) and not urlparse.urlparse(location.uri).scheme:
+            key, origin_name = parse_uri(origin_location.uri)
+            name = location.uri
+        else:
+            return None, None
+
+        try:
+            archive = self.archives.open(key)
+        except ArchiveError as e:
+            raise LoaderException(str(e))
+
+        if origin_name is None:
+            # Missing entries of archive URIs are reported by the loader
+            return archive, archive.resolve(name) or name
+
+        return archive, archive.resolve(name, origin_name)
+
+    def get_loader(self, context, location, origin_location):
+        if isinstance(location, UriLocation):
+            archive, name = self._entry(location, origin_location)
+
+            if name is not None:
+                return ArchiveTextLoader(archive, location, name)
+
+        return self.loader_source.get_loader(context, location, origin_location)
+
+
+class RecordingLoaderSource(LoaderSource):
+    """
+    Wraps another loader source and remembers every loader it provided, so that the
+    files a blueprint was actually loaded from (including resolved imports) are known
+    after consumption.
+    """
+
+    def __init__(self, loader_source):
+        super(RecordingLoaderSource, self).__init__()
+        self.loader_source = loader_source
+        self.loaders = []
+        self.paths = []
+        self._lock = threading.Lock()
+
+    def get_loader(self, context, location, origin_location):
+        loader = self.loader_source.get_loader(context, location, origin_location)
+
+        with self._lock:
+            self.loaders.append(loader)
+
+        return loader
+
+    def record(self, path):
+        """
+        Records a file that was used without being loaded through this source.
+        """
+
+        with self._lock:
+            self.paths.append(path)
+
+    @property
+    def dependencies(self):
+        """
+        List of (path, fingerprint) pairs of the loaded files, or None when something was
+        loaded from a location that cannot be tracked (remote URIs or failed loads).
+        Archive entries never change, since archives are keyed by their content.
+        """
+
+        dependencies = []
+
+        with self._lock:
+            loaders = list(self.loaders)
+            paths = list(self.paths)
+
+        for loader in loaders:
+            if isinstance(getattr(loader, 'location', None), LiteralLocation) or \
+                    isinstance(loader, ArchiveTextLoader):
+                continue
+
+            paths.append(loader.get_canonical_location())
+
+        for path in paths:
+            if not isinstance(path, basestring) or not os.path.isfile(path):
+                return None
+
+            dependencies.append((path, fingerprint(path)))
+
+        return dependencies
+
+
+class CachedRead(Read):
+    """
+    Read consumer that reuses the raw data of files already read by other contexts
+    sharing the same :code:`context.reading.raw_cache` (including preloaded profiles),
+    so that commonly imported files are loaded and parsed only once. Behaves like
+    :class:`Read` when there is no cache.
+    """
+
+    def __init__(self, context):
+        super(CachedRead, self).__init__(context)
+        self._canonical_locations = set()
+        self._lock = threading.Lock()
+
+    def _visit(self, canonical_location):
+        with self._lock:
+            if canonical_location in self._canonical_locations:
+                raise AlreadyReadException('already read: %s' % canonical_location)
+            self._canonical_locations.add(canonical_location)
+
+    def _resolve(self, location, origin_location):
+        """
+        Finds the canonical location of a local file without reading it.
+        """
+
+        if is_remote(location) or is_remote(origin_location):
+            return None
+
+        loader = self.context.loading.loader_source.get_loader(self.context.loading, location,
+                                                               origin_location)
+
+        try:
+            loader.open()
+            return loader.get_canonical_location()
+        except Exception:
+            return None
+        finally:
+            loader.close()
+
+    def _read(self, location, origin_location):
+        # Imports are read in other threads, so the timings are taken from the context
+        timings = getattr(self.context.reading, 'timings', None)
+
+        if timings is None:
+            return self._read_cached(location, origin_location)
+
+        with timings.measure('load'):
+            return self._read_cached(location, origin_location)
+
+    def _read_cached(self, location, origin_location):
+        cache = getattr(self.context.reading, 'raw_cache', None)
+
+        if cache is None or self.context.reading.reader is not None:
+            return super(CachedRead, self)._read(location, origin_location)
+
+        key = cache.key(location, origin_location, self.context.loading)
+        canonical_location = cache.resolve(key) or self._resolve(location, origin_location)
+        raw = cache.get(canonical_location) if canonical_location is not None else None
+
+        if raw is not None:
+            self._visit(canonical_location)
+
+            if isinstance(self.context.loading.loader_source, RecordingLoaderSource):
+                self.context.loading.loader_source.record(canonical_location)
+
+            return raw
+
+        loader = self.context.loading.loader_source.get_loader(self.context.loading, location,
+                                                               origin_location)
+        reader = self.context.reading.reader_source.get_reader(self.context.reading, location,
+                                                              loader)
+        raw = reader.read()
+        canonical_location = loader.get_canonical_location()
+        self._visit(canonical_location)
+
+        if isinstance(canonical_location, basestring) and os.path.isfile(canonical_location):
+            cache.put(key, canonical_location, raw)
+
+        return raw
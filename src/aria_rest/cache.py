@@ -0,0 +1,355 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import cPickle
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+READ_CHUNK_SIZE = 64 * 1024
+FILE_DIGESTS = 256
+
+
+def fingerprint(path):
+    """
+    Returns the (mtime, size) pair of a file, or None if it cannot be accessed.
+    """
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_mtime, stat.st_size
+
+
+def update_digest(digest, value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True, default=repr)
+
+    digest.update(value)
+    digest.update('\0')
+
+
+def content_key(command_data, consumers, *args):
+    """
+    Hashes everything that affects a parse result: the consumer stages, the context
+    arguments and the command parameters. A :code:`uri` parameter pointing at a local
+    file contributes the hash of its bytes rather than its name, see :func:`file_digest`.
+    """
+
+    digest = hashlib.sha256()
+
+    for consumer in consumers:
+        update_digest(digest, consumer.__name__)
+
+    for arg in args:
+        update_digest(digest, arg)
+
+    for name in sorted(command_data):
+        value = command_data[name]
+        update_digest(digest, name)
+
+        if name == 'uri' and isinstance(value, basestring) and os.path.isfile(value):
+            update_digest(digest, file_digest(value))
+        else:
+            update_digest(digest, value)
+
+    return digest.hexdigest()
+
+
+class CacheEntry(object):
+
+    def __init__(self, value, size, dependencies):
+        self.value = value
+        self.size = size
+        self.dependencies = dependencies
+
+    @property
+    def is_valid(self):
+        for path, file_fingerprint in self.dependencies:
+            if fingerprint(path) != file_fingerprint:
+                return False
+
+        return True
+
+
+class LruCache(object):
+    """
+    Thread-safe least-recently-used cache bounded by the total size of its entries.
+
+    Every entry may depend on a set of files: the entry is discarded as soon as the
+    modification time or size of any of them changes.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is None:
+                return None
+
+            if not entry.is_valid:
+                self.size -= entry.size
+                return None
+
+            self._entries[key] = entry
+            return entry.value
+
+    def put(self, key, value, size, dependencies=()):
+        """
+        :param dependencies - iterable of (path, fingerprint) pairs, see :func:`fingerprint`
+        """
+
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+
+            if previous is not None:
+                self.size -= previous.size
+
+            while self._entries and self.size + size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= evicted.size
+
+            self._entries[key] = CacheEntry(value, size, tuple(dependencies))
+            self.size += size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+_file_digests = LruCache(FILE_DIGESTS)
+
+
+def file_digest(path):
+    """
+    Hashes the bytes of a file. The hash is kept until the file changes, so that the
+    keys computed for the same blueprint during a request (or across requests) read it
+    only once.
+    """
+
+    file_fingerprint = fingerprint(path)
+    file_hash = _file_digests.get(path)
+
+    if file_hash is None:
+        digest = hashlib.sha256()
+
+        with open(path, 'rb') as blueprint:
+            for chunk in iter(lambda: blueprint.read(READ_CHUNK_SIZE), ''):
+                digest.update(chunk)
+
+        file_hash = digest.hexdigest()
+        _file_digests.put(path, file_hash, 1, ((path, file_fingerprint),))
+
+    return file_hash
+
+
+class ParseResultCache(LruCache):
+    """
+    Caches serialized parse results, bounded by their total length in bytes.
+
+    Keys are content hashes, see :func:`content_key`. Imported files are tracked as
+    dependencies.
+
+    With a `store` (a :class:`ResultStore`), results are also saved on disk, and the
+    results missing from memory are loaded from it.
+    """
+
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, store=None):
+        super(ParseResultCache, self).__init__(max_bytes)
+        self.store = store
+
+    @staticmethod
+    def key(command_data, consumers, render, *args):
+        """
+        Like :func:`content_key`, also covering how the result is rendered (by the string
+        form of `render`).
+        """
+
+        return content_key(command_data, consumers, str(render), *args)
+
+    def get(self, key):
+        text = super(ParseResultCache, self).get(key)
+
+        if text is None and self.store is not None:
+            stored = self.store.load(key)
+
+            if stored is not None:
+                text, dependencies = stored
+                super(ParseResultCache, self).put(key, text, len(text), dependencies)
+
+        return text
+
+    def put(self, key, text, dependencies=()):
+        super(ParseResultCache, self).put(key, text, len(text), dependencies)
+
+        if self.store is not None:
+            self.store.save(key, text, dependencies)
+
+
+class ContextSnapshotCache(LruCache):
+    """
+    Keeps consumption contexts that went through the model stages, so that they can be
+    instantiated again without reparsing. Bounded by the number of contexts.
+    """
+
+    DEFAULT_MAX_ENTRIES = 16
+
+    key = staticmethod(content_key)
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        super(ContextSnapshotCache, self).__init__(max_entries)
+
+    def put(self, key, snapshot, dependencies=()):
+        super(ContextSnapshotCache, self).put(key, snapshot, 1, dependencies)
+
+
+class RawCache(LruCache):
+    """
+    Caches the raw data read from files as pickled blobs, keyed by the canonical path of
+    the files and bounded by the total size of the blobs. Every use unpickles a fresh
+    copy, so cached data is never modified.
+
+    Also remembers how locations were resolved to canonical paths (see :code:`key`), and
+    holds "profiles": files pinned at startup that are never evicted. Pinned blobs are
+    shared by all processes forked afterwards.
+
+    With a `store` (a :class:`ResultStore`), blobs are also saved on disk, keyed by the
+    hash of their path, and the blobs missing from memory are loaded from it. Since
+    unpickling can run arbitrary code, the store must be trusted: its directory must be
+    private to the user running the server (see :code:`ContentStore.is_private`).
+    """
+
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    MAX_LOCATIONS = 4096
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, store=None):
+        """
+        :raises ValueError: when other users can write to the directory of `store`
+        """
+
+        if store is not None and not store.is_private:
+            raise ValueError('Other users can write to {0}'.format(store.directory))
+
+        super(RawCache, self).__init__(max_bytes)
+        self.locations = LruCache(self.MAX_LOCATIONS)
+        self.profiles = {}
+        self.store = store
+
+    @staticmethod
+    def _store_key(path):
+        return hashlib.sha256(path.encode('utf-8') if isinstance(path, unicode) else path) \
+            .hexdigest()
+
+    @staticmethod
+    def key(location, origin_location, loading_context):
+        """
+        Key for the resolution of `location`, which depends on where it is imported from
+        and on the search paths.
+        """
+
+        digest = hashlib.sha256()
+
+        for value in (location, origin_location):
+            update_digest(digest, unicode(value) if value is not None else '')
+
+        for path in loading_context.prefixes:
+            update_digest(digest, path)
+
+        for path in loading_context.file_search_paths:
+            update_digest(digest, path)
+
+        return digest.hexdigest()
+
+    def resolve(self, key):
+        return self.locations.get(key)
+
+    def get(self, path):
+        """
+        Returns a copy of the raw data read from `path`, or None.
+        """
+
+        profile = self.profiles.get(path)
+
+        if profile is not None and fingerprint(path) == profile[0]:
+            blob = profile[1]
+        else:
+            blob = super(RawCache, self).get(path)
+
+        if blob is None and self.store is not None:
+            stored = self.store.load(self._store_key(path))
+
+            if stored is not None:
+                blob, dependencies = stored
+                super(RawCache, self).put(path, blob, len(blob), dependencies)
+
+        return cPickle.loads(blob) if blob is not None else None
+
+    def put(self, key, path, raw):
+        file_fingerprint = fingerprint(path)
+
+        if file_fingerprint is None:
+            return
+
+        try:
+            blob = cPickle.dumps(raw, cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError):
+            return
+
+        if key is not None:
+            self.locations.put(key, path, 1)
+
+        super(RawCache, self).put(path, blob, len(blob), [(path, file_fingerprint)])
+
+        if self.store is not None:
+            self.store.save(self._store_key(path), blob, [(path, file_fingerprint)])
+
+    def pin(self, path):
+        """
+        Turns the cached data of `path` into a profile.
+        """
+
+        with self._lock:
+            entry = self._entries.pop(path, None)
+
+            if entry is not None:
+                self.size -= entry.size
+                self.profiles[path] = (entry.dependencies[0][1], entry.value)
@@ -14,16 +14,115 @@
 # under the License.
 #
 
+import copy
+import fnmatch
+import hmac
 import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+from StringIO import StringIO
 
 from aria.parser.consumption import ConsumerChain, Read, Validate, Model, Inputs, Instance
+from aria.parser.validation import Issue
 from aria.utils.formatting import json_dumps
+from flask import Response, g, has_request_context, request
+from jinja2 import TemplateError
 
-from .aria_customisation import ConsumptionContextBuilder
+from .affinity import blueprint_key
+from .archives import ArchiveCache, ArchiveError, is_archive
+from .aria_customisation import (ArchiveLoaderSource, CachedRead, ConsumptionContextBuilder,
+                                 IssueLimitError, RecordingLoaderSource)
+from .cache import ContextSnapshotCache, ParseResultCache, RawCache
+from .jobs import JobQueue
+from .memory import PeakMemory
+from .metrics import CONTENT_TYPE, METRICS, Timings, measure
+from .pool import WorkerLimitError, WorkerPool
+from .profiling import FORMATS as PROFILE_FORMATS, STATS, profile_call
+from .readiness import Readiness
+from .responses import encoded_response, join_lines, streamed_response
+from .sessions import ValidationSessions
+from .templates import TemplateCache
+from .uploads import spooled_body
+
+AFFINITY_HEADER = 'X-Aria-Affinity'
+
+
+def has_issues(text):
+    """
+    Whether a serialized result holds issues rather than a result, without parsing it:
+    issues are rendered as an object with the single key :code:`issues`.
+    """
+
+    return text[:16].lstrip('{ \n').startswith('"issues"')
 
 
 def json_response(function):
-    return lambda instance, **kwargs: json.loads(json_dumps(function(instance, **kwargs)))
+    """
+    Sends the JSON text returned by `function` with its timings as a :code:`Server-Timing`
+    header, and records them, along with the request outcome and peak memory growth, in
+    the metrics of the controller. The replica that the blueprint has affinity with, if
+    known, is sent as the :code:`AFFINITY_HEADER` header.
+    """
+
+    def respond(instance, **kwargs):
+        timings = Timings()
+        outcome = 'error'
+        started = time.time()
+
+        try:
+            with timings.activate():
+                text = function(instance, **kwargs)
+
+            if isinstance(text, Response):
+                outcome = 'ok'
+                return text
+
+            outcome = 'issues' if has_issues(text) else 'ok'
+            headers = {'Server-Timing': timings.header()}
+
+            if getattr(g, 'affinity', None) is not None:
+                headers[AFFINITY_HEADER] = g.affinity
+
+            return encoded_response(text, headers=headers)
+        except ControllerRequestError as e:
+            return str(e), e.status
+        finally:
+            metrics = getattr(instance, 'metrics', None)
+
+            if metrics is not None:
+                metrics.increment('aria_rest_requests_total', endpoint=function.__name__,
+                                  outcome=outcome)
+                metrics.observe('aria_rest_request_seconds', time.time() - started,
+                                endpoint=function.__name__)
+                metrics.observe_timings('aria_rest_stage_seconds', timings,
+                                        endpoint=function.__name__)
+
+                if timings.peak_memory is not None:
+                    metrics.observe('aria_rest_request_peak_bytes', timings.peak_memory,
+                                    endpoint=function.__name__)
+
+    return respond
+
+
+@contextmanager
+def recorded_timings(metrics, endpoint):
+    """
+    Activates new :class:`Timings` for parsing outside of a :func:`json_response`, such as
+    in a batch or a job, and records them in `metrics` as the stages of `endpoint`.
+    """
+
+    timings = Timings()
+
+    try:
+        with timings.activate():
+            yield timings
+    finally:
+        metrics.observe_timings('aria_rest_stage_seconds', timings, endpoint=endpoint)
 
 
 def dump_issues(function):
@@ -43,83 +142,935 @@ class ControllerOperationError(Exception):
         self.issues = issues
 
 
+class ControllerRequestError(Exception):
+
+    def __init__(self, message, status=400):
+        super(ControllerRequestError, self).__init__(message)
+        self.status = status
+
+
+class Sections(object):
+    """
+    Renders the requested sections of a consumed context. Each section is computed only
+    if requested: :code:`types`, :code:`model` and :code:`instance` map to the
+    corresponding :code:`*_as_raw` properties of the modeling context.
+    """
+
+    def __init__(self, *names):
+        self.names = names
+
+    def __str__(self):
+        return 'sections:{0}'.format(','.join(self.names))
+
+    def __call__(self, context):
+        with measure('render'):
+            return dict((name, getattr(context.modeling, '{0}_as_raw'.format(name)))
+                        for name in self.names)
+
+    def select(self, fields):
+        """
+        Returns the sections limited to `fields` (a list or a comma-separated string), or
+        these sections if `fields` is empty.
+
+        :raises ControllerRequestError: for fields that are not among these sections
+        """
+
+        if not fields:
+            return self
+
+        if isinstance(fields, basestring):
+            fields = fields.split(',')
+
+        fields = [field.strip() for field in fields]
+        unknown = [field for field in fields if field not in self.names]
+
+        if unknown:
+            raise ControllerRequestError('Unknown fields: {0}'.format(', '.join(unknown)))
+
+        return Sections(*[name for name in self.names if name in fields])
+
+
+def _values(collection):
+    return collection.itervalues() if isinstance(collection, dict) else iter(collection or ())
+
+
+def _as_raw(value):
+    if hasattr(value, 'as_raw'):
+        return value.as_raw
+
+    raise TypeError('{0!r} is not JSON serializable'.format(value))
+
+
+def instance_records(instance):
+    """
+    Generates the nodes of a service instance, their relationships, its groups and its
+    policies as separate records, so that only one of them is rendered at a time.
+    Relationships follow the node they belong to.
+    """
+
+    for node in _values(instance.nodes):
+        raw = node.as_raw
+        relationships = raw.pop('relationships', None) or ()
+        yield {'type': 'node', 'data': raw}
+
+        for relationship in relationships:
+            yield {'type': 'relationship', 'node': raw.get('id'), 'data': relationship}
+
+    for record_type, collection in (('group', getattr(instance, 'groups', None)),
+                                    ('policy', getattr(instance, 'policies', None))):
+        for element in _values(collection):
+            yield {'type': record_type, 'data': element.as_raw}
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':'), default=_as_raw) + '\n'
+
+
+VALIDATION_SECTIONS = Sections()
+MODEL_SECTIONS = Sections('types', 'model')
+INSTANCE_SECTIONS = Sections('types', 'model', 'instance')
+
+
 # TODO in future if needed
 class Controller(object):
     pass
 
 
 class ParseController(Controller):
+    SNAPSHOT_STAGES = (Read, Validate, Model)
+    ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+    def __init__(self,
+                 cache=None,
+                 snapshots=None,
+                 raw_cache=None,
+                 pool_size=0,
+                 timeout=None,
+                 cpu_limit=None,
+                 loader_source=None,
+                 metrics=None,
+                 admin_token=None,
+                 memory_limit=None,
+                 max_requests=None,
+                 max_rss=None,
+                 archives=None,
+                 affinity=None):
+        """
+        :param raw_cache - cache of raw data read from files, shared by all requests
+        :param archives - :class:`ArchiveCache` of the uploaded archives
+        :param affinity - :class:`AffinityRing` of the replicas of the service, telling
+        clients which replica to send requests for the same blueprint to
+        :param loader_source - loader source used by all requests that do not specify
+        one, such as an :class:`HttpLoaderSource` (ARIA's default loader source if None)
+        :param metrics - :class:`Metrics` recording request timings and outcomes
+        :param admin_token - token that requests must send in the
+        :code:`ADMIN_TOKEN_HEADER` header to be profiled (profiling is disabled if None)
+        :param pool_size - number of worker processes to parse in, or 0 to parse in the
+        server process itself
+        :param timeout - wall-clock limit for parsing, in seconds (requires workers)
+        :param cpu_limit - CPU time limit for parsing, in seconds (requires workers)
+        :param memory_limit - limit of the memory allocated for parsing, in bytes
+        (requires workers)
+        :param max_requests - number of parses after which a worker is replaced
+        :param max_rss - resident set size in bytes above which a worker is replaced
+        """
+
+        self.cache = cache if cache is not None else ParseResultCache()
+        self.snapshots = snapshots if snapshots is not None else ContextSnapshotCache()
+        self.raw_cache = raw_cache if raw_cache is not None else RawCache()
+        self.pool = WorkerPool(self, pool_size, timeout, cpu_limit, memory_limit, max_requests,
+                               max_rss) if pool_size else None
+        self.loader_source = loader_source
+        self.metrics = metrics if metrics is not None else METRICS
+        self.admin_token = admin_token
+        self.archives = archives if archives is not None else ArchiveCache()
+        self.affinity = affinity
+
+    def _build_context(self, command_data, *args, **kwargs):
+        kwargs['raw_cache'] = self.raw_cache
+        kwargs['timings'] = Timings.current()
+        context = ConsumptionContextBuilder(*args, **dict(command_data, **kwargs)).build()
+
+        if self.loader_source is not None and not command_data.get('loader_source'):
+            context.loading.loader_source = self.loader_source
+
+        context.loading.loader_source = RecordingLoaderSource(
+            ArchiveLoaderSource(self.archives, context.loading.loader_source))
+
+        return context
 
     @staticmethod
-    def _execute_command(command_data, consumers, *args):
-        context = ConsumptionContextBuilder(*args, **command_data).build()
-        ConsumerChain(context, consumers).consume()
+    def _execute_command(context, consumers):
+        # One chain per consumer, so that each can be timed
+        for consumer in consumers:
+            with measure(consumer.__name__.lower()):
+                try:
+                    ConsumerChain(context, (CachedRead if consumer is Read else consumer,)) \
+                        .consume()
+                except IssueLimitError:
+                    pass
+
+            if context.validation.has_issues:
+                break
 
         if context.validation.has_issues:
-            raise ControllerOperationError(context.validation.issues_as_raw)
+            issues = context.validation.issues_as_raw
+            max_issues = getattr(context.validation, 'max_issues', None)
+            # Imports are read in parallel, so a few more issues may have been reported
+            raise ControllerOperationError(issues[:max_issues] if max_issues else issues)
 
         return context
 
     @classmethod
     @dump_issues
-    def _validate(cls, data, *args):
-        cls._execute_command(data, (Read, Validate), *args)
+    def _render(cls, context, consumers, render):
+        return render(cls._execute_command(context, consumers))
 
-        return {}
+    def _snapshot(self, command_data):
+        """
+        Returns a (context, dependencies) pair for the blueprint in `command_data`
+        consumed up to :code:`SNAPSHOT_STAGES`, reusing a previous snapshot if possible.
+        Inputs are left out, because they are only applied when instantiating.
 
-    @classmethod
-    @dump_issues
-    def _model(cls, data, *args):
-        context = cls._execute_command(data, (Read, Validate, Model), *args)
+        :raises ControllerOperationError: when the snapshot stages report issues;
+        the dependencies are attached to the error
+        """
 
-        return {
-            'types': context.modeling.types_as_raw,
-            'model': context.modeling.model_as_raw
-        }
+        command_data = dict((name, value) for name, value in command_data.iteritems()
+                            if name != 'inputs')
+        key = self.snapshots.key(command_data, self.SNAPSHOT_STAGES)
+        snapshot = self.snapshots.get(key)
 
-    @classmethod
-    @dump_issues
-    def _instance(cls, data, *args):
-        context = cls._execute_command(data, (Read, Validate, Model, Inputs, Instance), *args)
+        if snapshot is None:
+            context = self._build_context(command_data)
 
-        return {
-            'types': context.modeling.types_as_raw,
-            'model': context.modeling.model_as_raw,
-            'instance': context.modeling.instance_as_raw
-         }
+            try:
+                self._execute_command(context, self.SNAPSHOT_STAGES)
+            except ControllerOperationError as e:
+                e.dependencies = context.loading.loader_source.dependencies
+                raise
+
+            snapshot = (context, context.loading.loader_source.dependencies)
+
+            if snapshot[1] is not None:
+                self.snapshots.put(key, snapshot, snapshot[1])
+
+        return snapshot
+
+    @staticmethod
+    def _dumps(value):
+        with measure('serialize'):
+            return json_dumps(value)
+
+    def _consume(self, command_data, consumers, render, *args):
+        """
+        Returns the JSON text of the result, together with the dependencies it was
+        derived from, the timings of its steps and the peak memory growth (see
+        :class:`PeakMemory`).
+        """
+
+        timings = Timings()
+
+        with timings.activate(), PeakMemory() as memory:
+            text, dependencies = self._consume_timed(command_data, consumers, render, *args)
+
+        return text, dependencies, timings.items, memory.growth
+
+    def _consume_timed(self, command_data, consumers, render, *args):
+        """
+        Consumer chains that start with :code:`SNAPSHOT_STAGES` only run their remaining
+        consumers, against a copy of the snapshot context.
+        """
+
+        stages = len(self.SNAPSHOT_STAGES)
+
+        if tuple(consumers[:stages]) != self.SNAPSHOT_STAGES:
+            context = self._build_context(command_data, *args)
+            text = self._dumps(self._render(context, consumers, render))
+
+            return text, context.loading.loader_source.dependencies
+
+        try:
+            context, dependencies = self._snapshot(command_data)
+        except ControllerOperationError as e:
+            return self._dumps({'issues': e.issues}), e.dependencies
+
+        if len(consumers) == stages:
+            return self._dumps(render(context)), dependencies
+
+        context = self._build_context(command_data, *args, snapshot=context)
+        text = self._dumps(self._render(context, consumers[stages:], render))
+        instance_dependencies = context.loading.loader_source.dependencies
+
+        if dependencies is None or instance_dependencies is None:
+            return text, None
+
+        return text, dependencies + instance_dependencies
+
+    def _parse(self, command_data, consumers, render, *args):
+        """
+        Runs `consumers` over the blueprint described by `command_data` and returns
+        the JSON text of `render(context)`, or of the issues found while consuming.
+        Results are served from the cache for as long as the blueprint, its imports
+        and the other parameters stay the same.
+
+        With a true :code:`profile` parameter, the blueprint is parsed again without the
+        cached results, snapshots and read files, so that every stage runs, and the profile
+        of parsing it is returned instead, as a text response (see :func:`profile_call`,
+        the format is the :code:`profile_format` parameter).
+        """
+
+        command_data = dict(command_data)
+        profile = command_data.pop('profile', None)
+        profile_format = command_data.pop('profile_format', None) or STATS
+
+        if self.affinity is not None and has_request_context():
+            g.affinity = self.affinity.owner(blueprint_key(command_data))
+
+        if profile:
+            return self._profile(command_data, consumers, render, profile_format, *args)
+
+        return self._parse_in(self.pool, command_data, consumers, render, *args)
+
+    def _profile(self, command_data, consumers, render, profile_format, *args):
+        """
+        :raises ControllerRequestError: when profiling is disabled or the request does
+        not have the admin token
+        """
+
+        if not self.admin_token:
+            raise ControllerRequestError('Profiling is disabled', 403)
+
+        token = request.headers.get(self.ADMIN_TOKEN_HEADER, '') if has_request_context() else ''
+
+        if not hmac.compare_digest(str(token), str(self.admin_token)):
+            raise ControllerRequestError('Profiling requires a valid admin token', 403)
+
+        if profile_format not in PROFILE_FORMATS:
+            raise ControllerRequestError('Unknown profile format: {0}'.format(profile_format))
+
+        if self.pool is not None:
+            text = self.pool.apply('_profiled', command_data, consumers, render, profile_format,
+                                   *args)
+        else:
+            text = self._profiled(command_data, consumers, render, profile_format, *args)
+
+        return Response(text, mimetype='text/plain')
+
+    def _profiled(self, command_data, consumers, render, profile_format, *args):
+        controller = copy.copy(self)
+        controller.snapshots = ContextSnapshotCache(0)
+        controller.raw_cache = None
+
+        return profile_call(profile_format, controller._consume, command_data, consumers,
+                            render, *args)
+
+    def _parse_in(self, pool, command_data, consumers, render, *args):
+        """
+        Like :code:`_parse`, but consumes in the given worker pool (if not None).
+        """
+
+        with measure('cache'):
+            key = self.cache.key(command_data, consumers, render, *args)
+            text = self.cache.get(key)
+
+        if text is None:
+            try:
+                if pool is not None:
+                    text, dependencies, timings, memory = pool.apply('_consume', command_data,
+                                                                     consumers, render, *args)
+                else:
+                    text, dependencies, timings, memory = self._consume(command_data, consumers,
+                                                                        render, *args)
+            except WorkerLimitError as e:
+                issue = Issue('parsing aborted: {0}'.format(e), level=Issue.PLATFORM)
+                return json_dumps({'issues': [issue.as_raw]})
+
+            if Timings.current() is not None:
+                Timings.current().extend(timings)
+                Timings.current().add_memory(memory)
+
+            if dependencies is not None:
+                self.cache.put(key, text, dependencies)
+
+        return text
+
+    def preload(self, paths):
+        """
+        Reads profiles (type definition files imported by many blueprints, or directories
+        of them) and their own imports into the raw cache, pinned for the lifetime of the
+        process. Returns the issues found, by path.
+
+        Only reading is precomputed: the profiles are presented and validated with every
+        blueprint importing them.
+        """
+
+        issues = {}
+
+        for path in paths:
+            if os.path.isdir(path):
+                issues.update(self.preload(os.path.join(root, name)
+                                           for root, _, names in os.walk(path)
+                                           for name in fnmatch.filter(names, '*.yaml')))
+                continue
+
+            context = self._build_context({'uri': os.path.abspath(path)})
+
+            try:
+                self._execute_command(context, (Read,))
+            except ControllerOperationError as e:
+                issues[path] = e.issues
+
+            for dependency, _ in context.loading.loader_source.dependencies or ():
+                self.raw_cache.pin(dependency)
+
+        return issues
+
+    def warm_up(self, paths):
+        """
+        Parses blueprints (or directories of them) up to the instance stage in this
+        process, filling the caches, so that processes forked afterwards share them.
+        Returns the seconds spent, by path.
+        """
+
+        seconds = {}
+
+        for path in paths:
+            if os.path.isdir(path):
+                seconds.update(self.warm_up(os.path.join(root, name)
+                                            for root, _, names in os.walk(path)
+                                            for name in fnmatch.filter(names, '*.yaml')))
+                continue
+
+            started = time.time()
+            self._parse_in(None, {'uri': os.path.abspath(path)},
+                           (Read, Validate, Model, Inputs, Instance), INSTANCE_SECTIONS)
+            seconds[path] = time.time() - started
+
+        return seconds
+
+    def _instance_chunks(self, command_data, *args):
+        """
+        Generates the instance of the blueprint in `command_data` in NDJSON format (see
+        :func:`instance_records`), in chunks, or a single record of the issues found.
+        Results are not cached, but model snapshots are used.
+        """
+
+        try:
+            context, _ = self._snapshot(command_data)
+            context = self._build_context(command_data, *args, snapshot=context)
+            self._execute_command(context, (Inputs, Instance))
+            records = instance_records(context.modeling.instance)
+        except ControllerOperationError as e:
+            records = [{'type': 'issues', 'data': e.issues}]
+
+        for chunk in join_lines(ndjson_lines(records)):
+            yield chunk
+
+    def _stream(self, command_data, *args):
+        """
+        Streams the instance in NDJSON format as it is rendered, in a worker process if
+        there are workers.
+        """
+
+        def chunks():
+            try:
+                if self.pool is not None:
+                    for chunk in self.pool.iterate('_instance_chunks', command_data, *args):
+                        yield chunk
+                else:
+                    for chunk in self._instance_chunks(command_data, *args):
+                        yield chunk
+            except WorkerLimitError as e:
+                issue = Issue('parsing aborted: {0}'.format(e), level=Issue.PLATFORM)
+                yield ''.join(ndjson_lines([{'type': 'issues', 'data': [issue.as_raw]}]))
+
+        return streamed_response(chunks())
+
+    def _upload(self, content, **command_data):
+        """
+        Returns the command data for uploaded `content`: a blueprint, or a zip archive
+        (such as a TOSCA CSAR) whose entries are loaded in place, see
+        :class:`ArchiveCache`. A body that was spooled to disk (see
+        :class:`UploadSpooler`) is parsed from its stored file instead.
+
+        :raises ControllerRequestError: for an archive without a main blueprint
+        """
+
+        spooled = spooled_body()
+
+        if spooled is None and not is_archive(content):
+            return dict(command_data, literal_location=content)
+
+        if spooled is not None and not spooled[1].endswith(ArchiveCache.EXTENSION):
+            return dict(command_data, uri=spooled[1])
+
+        try:
+            archive = self.archives.open(spooled[0]) if spooled is not None \
+                else self.archives.add(content)
+            return dict(command_data, uri=archive.uri(archive.entry))
+        except ArchiveError as e:
+            raise ControllerRequestError(str(e))
+
+    def _validate(self, data, *args):
+        """
+        With a :code:`level` parameter below field validation, the blueprint is only read
+        (reporting syntax issues) and its presentation is not validated. Higher levels
+        validate in full and only leave out the issues above them. With
+        :code:`max_issues`, validation stops after that many issues.
+        """
+
+        level = data.get('level')
+        consumers = (Read,) if level is not None and level < Issue.FIELD else (Read, Validate)
+
+        return self._parse(data, consumers, VALIDATION_SECTIONS, *args)
+
+    def _model(self, data, *args):
+        data = dict(data)
+        sections = MODEL_SECTIONS.select(data.pop('fields', None))
+
+        return self._parse(data, (Read, Validate, Model), sections, *args)
+
+    def _instance(self, data, *args):
+        """
+        With a true :code:`stream` parameter (and no :code:`profile`), returns a
+        streaming response, see :code:`_stream`.
+        """
+
+        data = dict(data)
+        sections = INSTANCE_SECTIONS.select(data.pop('fields', None))
+
+        if data.pop('stream', None) and not data.get('profile'):
+            data.pop('profile_format', None)
+            return self._stream(data, *args)
+
+        return self._parse(data, (Read, Validate, Model, Inputs, Instance), sections, *args)
 
     @json_response
-    def validate_file(self, path):
-        return self._validate({'uri': path})
+    def validate_file(self, path, level=None, max_issues=None, profile=False,
+                      profile_format=None):
+        return self._validate({'uri': path, 'level': level, 'max_issues': max_issues,
+                               'profile': profile, 'profile_format': profile_format})
 
     @json_response
     def validate_indirect(self, indirect_data):
         return self._validate(indirect_data)
 
     @json_response
-    def validate_upload(self, upload_content, inputs=''):
-        return self._validate({'literal_location': upload_content})
+    def validate_upload(self, upload_content, inputs='', level=None, max_issues=None,
+                        profile=False, profile_format=None):
+        return self._validate(self._upload(upload_content, level=level, max_issues=max_issues,
+                                           profile=profile, profile_format=profile_format))
 
     @json_response
-    def model_file(self, path):
-        return self._model({'uri': path})
+    def model_file(self, path, fields=None, profile=False, profile_format=None):
+        return self._model({'uri': path, 'fields': fields, 'profile': profile,
+                            'profile_format': profile_format})
 
     @json_response
     def model_indirect(self, indirect_data):
         return self._model(indirect_data)
 
     @json_response
-    def model_upload(self, upload_content, inputs=''):
-        return self._model({'literal_location': upload_content})
+    def model_upload(self, upload_content, inputs='', fields=None, profile=False,
+                     profile_format=None):
+        return self._model(self._upload(upload_content, fields=fields, profile=profile,
+                                        profile_format=profile_format))
 
     @json_response
-    def instance_file(self, path, inputs=''):
-        return self._instance({'uri': path, 'inputs': inputs})
+    def instance_file(self, path, inputs='', fields=None, profile=False, profile_format=None,
+                      stream=False):
+        return self._instance({'uri': path, 'inputs': inputs, 'fields': fields,
+                               'profile': profile, 'profile_format': profile_format,
+                               'stream': stream})
 
     @json_response
     def instance_indirect(self, indirect_data):
         return self._instance(indirect_data, '--json')
 
     @json_response
-    def instance_upload(self, upload_content, inputs=''):
-        return self._instance({'literal_location': upload_content, 'inputs': inputs})
+    def instance_upload(self, upload_content, inputs='', fields=None, profile=False,
+                        profile_format=None, stream=False):
+        return self._instance(self._upload(upload_content, inputs=inputs, fields=fields,
+                                           profile=profile, profile_format=profile_format,
+                                           stream=stream))
+
+
+class JobController(Controller):
+    """
+    Runs parse operations as background jobs, for clients that cannot keep a connection
+    open for as long as parsing takes.
+    """
+
+    MAX_WAIT = 60
+    OPERATIONS = {
+        'validate': ('_validate',),
+        'model': ('_model',),
+        'instance': ('_instance', '--json')
+    }
+
+    def __init__(self,
+                 parse_controller=None,
+                 directory=None,
+                 threads=JobQueue.DEFAULT_THREADS,
+                 ttl=JobQueue.DEFAULT_TTL):
+        self.parse_controller = parse_controller or ParseController()
+        self.jobs = JobQueue(self._execute, directory, threads, ttl)
+
+    def _execute(self, operation, data):
+        method_name = self.OPERATIONS[operation][0]
+        args = self.OPERATIONS[operation][1:]
+
+        with recorded_timings(self.parse_controller.metrics, 'job_' + operation):
+            return getattr(self.parse_controller, method_name)(data, *args)
+
+    def submit(self, job_data):
+        job_data = dict(job_data)
+        operation = job_data.pop('operation', None)
+        priority = job_data.pop('priority', 0)
+        # Job results are stored whole
+        job_data.pop('stream', None)
+
+        if operation not in self.OPERATIONS:
+            return 'Unknown operation: {0}'.format(operation), 400
+
+        return self.jobs.submit(operation, job_data, priority), 202
+
+    def status(self, job_id, wait=0):
+        if wait > 0:
+            job = self.jobs.wait(job_id, min(wait, self.MAX_WAIT))
+        else:
+            job = self.jobs.get(job_id)
+
+        if job is None:
+            return 'Job not found: {0}'.format(job_id), 404
+
+        return job
+
+    def result(self, job_id):
+        text = self.jobs.result(job_id)
+
+        if text is None:
+            job = self.jobs.get(job_id)
+
+            if job is None:
+                return 'Job not found: {0}'.format(job_id), 404
+
+            return job, 409
+
+        return encoded_response(text)
+
+    def cancel(self, job_id):
+        job = self.jobs.cancel(job_id)
+
+        if job is None:
+            return 'Job not found: {0}'.format(job_id), 404
+
+        return job
+
+
+class SessionController(Controller):
+    """
+    Validates successive versions of an uploaded blueprint, such as the saves of an
+    editor, re-validating only the templates that changed and those depending on them
+    (see :class:`ValidationSessions`). A version is either the whole document or a JSON
+    merge patch of the previous one.
+    """
+
+    def __init__(self,
+                 parse_controller=None,
+                 directory=None,
+                 ttl=ValidationSessions.DEFAULT_TTL):
+        self.parse_controller = parse_controller or ParseController()
+        self.sessions = ValidationSessions(self._validate, self.parse_controller.archives.store,
+                                           directory, ttl)
+
+    def _validate(self, path):
+        return json.loads(self.parse_controller._validate({'uri': path})).get('issues', [])
+
+    @staticmethod
+    def _document(content):
+        """
+        :raises ControllerRequestError: for an archive
+        """
+
+        spooled = spooled_body()
+
+        if spooled is not None:
+            with open(spooled[1], 'rb') as spooled_file:
+                content = spooled_file.read()
+
+        if is_archive(content):
+            raise ControllerRequestError('Sessions validate single blueprint documents')
+
+        return content
+
+    def _result(self, session, session_id):
+        if session is None:
+            return 'Session not found: {0}'.format(session_id), 404
+
+        result = {'session': session['id'], 'revalidated': session['revalidated']}
+        issues = self.sessions.issues(session)
+
+        if issues:
+            result['issues'] = issues
+
+        return result
+
+    def create(self, upload_content):
+        try:
+            session = self.sessions.submit(self._document(upload_content))
+        except ControllerRequestError as e:
+            return str(e), e.status
+
+        return self._result(session, None), 201
+
+    def update(self, session_id, upload_content):
+        try:
+            session = self.sessions.submit(self._document(upload_content), session_id)
+        except ControllerRequestError as e:
+            return str(e), e.status
+
+        return self._result(session, session_id)
+
+    def patch(self, session_id, patch):
+        return self._result(self.sessions.patch(session_id, patch), session_id)
+
+    def status(self, session_id):
+        return self._result(self.sessions.get(session_id), session_id)
+
+    def close(self, session_id):
+        if not self.sessions.remove(session_id):
+            return 'Session not found: {0}'.format(session_id), 404
+
+        return {'session': session_id}
+
+
+class BatchController(Controller):
+    """
+    Validates or models many blueprints at once, spread over a pool of worker processes.
+    Files imported by several blueprints are read only once per worker.
+
+    Also renders a Jinja blueprint template with many sets of variables and validates,
+    models or instantiates every variant. Templates are compiled once, see
+    :class:`TemplateCache`.
+    """
+
+    DEFAULT_PATTERN = '*.yaml'
+    OPERATIONS = {
+        'validate': ((Read, Validate), VALIDATION_SECTIONS),
+        'model': ((Read, Validate, Model), MODEL_SECTIONS)
+    }
+    RENDER_OPERATIONS = dict(OPERATIONS,
+                             instance=((Read, Validate, Model, Inputs, Instance),
+                                       INSTANCE_SECTIONS))
+
+    def __init__(self,
+                 parse_controller=None,
+                 pool_size=WorkerPool.DEFAULT_SIZE,
+                 timeout=None,
+                 cpu_limit=None,
+                 memory_limit=None,
+                 max_requests=None,
+                 max_rss=None,
+                 templates=None):
+        """
+        :param templates - :class:`TemplateCache` of the compiled templates
+        """
+
+        self.parse_controller = parse_controller or ParseController()
+        self.pool = WorkerPool(self.parse_controller, pool_size, timeout, cpu_limit, memory_limit,
+                               max_requests, max_rss)
+        self.templates = templates if templates is not None else TemplateCache()
+
+    @staticmethod
+    def _extract(archive, directory, pattern):
+        """
+        :param archive - zip file path or file object
+        """
+
+        zipfile.ZipFile(archive).extractall(directory)
+        paths = []
+
+        for root, _, names in os.walk(directory):
+            for name in fnmatch.filter(names, pattern):
+                paths.append(os.path.relpath(os.path.join(root, name), directory))
+
+        return sorted(paths)
+
+    @staticmethod
+    def _decode(batch_data):
+        """
+        Decodes batch data sent as JSON, which the endpoints receive undecoded since they also
+        consume zip archives. An archive is returned as it is.
+
+        :raises ControllerRequestError: for JSON that is not an object
+        """
+
+        if isinstance(batch_data, dict) or not has_request_context() or \
+                request.mimetype != 'application/json':
+            return batch_data
+
+        try:
+            batch_data = json.loads(batch_data)
+        except ValueError as e:
+            raise ControllerRequestError('Invalid JSON: {0}'.format(e))
+
+        if not isinstance(batch_data, dict):
+            raise ControllerRequestError('Batch data must be a JSON object')
+
+        return batch_data
+
+    def _run(self, operation, batch_data, pattern):
+        consumers, render = self.OPERATIONS[operation]
+        directory = None
+
+        try:
+            batch_data = self._decode(batch_data)
+        except ControllerRequestError as e:
+            return str(e), e.status
+
+        if isinstance(batch_data, dict):
+            command_data = dict(batch_data)
+            uris = command_data.pop('uris', [])
+        else:
+            command_data = {}
+            directory = tempfile.mkdtemp(prefix='aria_rest_batch')
+
+        def parse(uri):
+            path = os.path.join(directory, uri) if directory is not None else uri
+            started = time.time()
+
+            with recorded_timings(self.parse_controller.metrics, 'batch_' + operation):
+                text = self.parse_controller._parse_in(self.pool, dict(command_data, uri=path),
+                                                       consumers, render)
+
+            return {'uri': uri, 'result': json.loads(text), 'seconds': time.time() - started}
+
+        started = time.time()
+
+        try:
+            if directory is not None:
+                spooled = spooled_body()
+                archive = spooled[1] if spooled is not None else StringIO(batch_data)
+
+                try:
+                    uris = self._extract(archive, directory, pattern or self.DEFAULT_PATTERN)
+                except (zipfile.BadZipfile, zipfile.LargeZipFile) as e:
+                    return 'Invalid zip archive: {0}'.format(e), 400
+
+            return self._map(parse, uris, started)
+        finally:
+            if directory is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _map(self, parse, items, started):
+        """
+        Applies `parse` to all `items` from as many threads as there are workers, and
+        sums up the results.
+        """
+
+        threads = ThreadPool(self.pool.size)
+
+        try:
+            items = threads.map(parse, items)
+        finally:
+            threads.close()
+
+        return {
+            'items': items,
+            'failed': len([item for item in items if item['result'].get('issues')]),
+            'seconds': time.time() - started,
+            'item_seconds': sum(item['seconds'] for item in items)
+        }
+
+    def validate(self, batch_data, pattern=None):
+        return self._run('validate', batch_data, pattern)
+
+    def model(self, batch_data, pattern=None):
+        return self._run('model', batch_data, pattern)
+
+    def _render(self, operation, render_data):
+        """
+        Renders the template file at :code:`uri`, or the :code:`template` source, once for
+        every set of :code:`variables`, and parses the variants in the workers. Imports
+        relative to a template file are resolved against its directory.
+        """
+
+        consumers, render = self.RENDER_OPERATIONS[operation]
+        command_data = dict(render_data)
+        uri = command_data.pop('uri', None)
+        source = command_data.pop('template', None)
+        variable_sets = command_data.pop('variables', None) or [{}]
+
+        try:
+            render = render.select(command_data.pop('fields', None))
+        except ControllerRequestError as e:
+            return str(e), e.status
+
+        started = time.time()
+
+        try:
+            if uri is not None:
+                template = self.templates.load(uri)
+                command_data['import_prefixes'] = [os.path.dirname(os.path.abspath(uri))]
+            elif source is not None:
+                template = self.templates.compile(source)
+            else:
+                return 'Either uri or template is required', 400
+        except IOError as e:
+            return 'Template not found: {0}'.format(e), 404
+        except TemplateError as e:
+            issue = Issue('template: {0}'.format(e), line=getattr(e, 'lineno', None))
+            return {'issues': [issue.as_raw]}
+
+        context = self.templates.context(uri)
+        endpoint = 'batch_render_' + operation
+
+        def parse(index):
+            started = time.time()
+
+            try:
+                literal = template.render(dict(context, **variable_sets[index]))
+            except TemplateError as e:
+                result = {'issues': [Issue('template: {0}'.format(e)).as_raw]}
+            else:
+                with recorded_timings(self.parse_controller.metrics, endpoint):
+                    text = self.parse_controller._parse_in(
+                        self.pool, dict(command_data, literal_location=literal), consumers,
+                        render)
+                result = json.loads(text)
+
+            return {'index': index, 'result': result, 'seconds': time.time() - started}
+
+        return self._map(parse, range(len(variable_sets)), started)
+
+    def render_validate(self, render_data):
+        return self._render('validate', render_data)
+
+    def render_model(self, render_data):
+        return self._render('model', render_data)
+
+    def render_instance(self, render_data):
+        return self._render('instance', render_data)
+
+
+class ReadinessController(Controller):
+
+    def __init__(self, readiness=None):
+        self.readiness = readiness if readiness is not None else Readiness()
+
+    def ready(self):
+        body = {'ready': self.readiness.is_ready, 'seconds': self.readiness.seconds}
+
+        return body, 200 if self.readiness.is_ready else 503
+
+
+class MetricsController(Controller):
+
+    def __init__(self, metrics=None):
+        self.metrics = metrics if metrics is not None else METRICS
+
+    def expose(self):
+        return Response(self.metrics.expose(), content_type=CONTENT_TYPE)
@@ -30,6 +30,11 @@ class BackgroundTaskContext(object):
         self.rundir = os.path.abspath(rundir or os.path.expanduser(self.DEFAULT_DIR))
         self.pidfile_path = os.path.join(self.rundir, '{0}.{1}'.format(self.name, 'pid'))
         self.log_path = os.path.join(self.rundir, '{0}.{1}'.format(self.name, 'log'))
+        self.workers_path = os.path.join(self.rundir, '{0}.{1}'.format(self.name, 'workers'))
+        self.sampling_path = os.path.join(self.rundir, '{0}.{1}'.format(self.name, 'sampling'))
+        self.replicas_path = os.path.join(self.rundir, '{0}.{1}'.format(self.name, 'replicas'))
+        # One file per process
+        self.samples_path = os.path.join(self.rundir, '{0}.{{pid}}.{1}'.format(self.name, 'samples'))
 
 
 try:
@@ -41,6 +46,8 @@ try:
     from daemon.runner import is_pidfile_stale
     from time import sleep
 
+    from .profiling import SamplingSwitch, install_sampling_switch
+
     def start_daemon(context, task, **kwargs):
         pidfile = TimeoutPIDLockFile(context.pidfile_path, context.acquire_timeout)
 
@@ -61,6 +68,7 @@ try:
         puts(Colored.blue('Starting'))
 
         with DaemonContext(pidfile=pidfile, stdout=logfile, stderr=logfile):
+            install_sampling_switch(context.sampling_path, context.samples_path)
             task(**kwargs)
 
     def stop_daemon(context):
@@ -79,11 +87,31 @@ try:
             puts(Colored.red('Not running'))
 
 
+    def profile_daemon(context):
+        pid = TimeoutPIDLockFile(context.pidfile_path, context.acquire_timeout).read_pid()
+
+        if pid is not None:
+            sampling = not os.path.exists(context.sampling_path)
+            os.kill(pid, SamplingSwitch.SIGNAL)
+
+            if sampling:
+                puts(Colored.blue('Sampling stacks of pid: %d' % pid))
+            else:
+                puts(Colored.blue('Stopped sampling, samples are written to: %s'
+                                  % context.samples_path.format(pid='*')))
+        else:
+            puts(Colored.red('Not running'))
+
     def status_daemon(context):
         pid = TimeoutPIDLockFile(context.pidfile_path, context.acquire_timeout).read_pid()
 
         if pid is not None:
             puts(Colored.blue('Running at pid: %d' % pid))
+
+            if os.path.exists(context.workers_path):
+                with open(context.workers_path) as workers_file:
+                    workers = workers_file.read().split()
+                puts(Colored.blue('Workers at pids: %s' % ', '.join(workers)))
         else:
             puts(Colored.blue('Not running'))
 
@@ -97,5 +125,9 @@ except ImportError as e:
         puts(Colored.red('Not running'))
 
 
+    def profile_daemon(context):
+        puts(Colored.red('Not running'))
+
+
     def status_daemon(context):
         puts(Colored.blue('Not running'))
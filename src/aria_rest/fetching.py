@@ -0,0 +1,215 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .jobs import write_atomically
+
+MAX_AGE_PATTERN = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+class FetchError(Exception):
+
+    def __init__(self, url, status=None, message=None):
+        super(FetchError, self).__init__(message or 'HTTP {0}: "{1}"'.format(status, url))
+        self.url = url
+        self.status = status
+
+
+class Flight(object):
+    """
+    A fetch in progress, shared by the threads that asked for the same URL meanwhile.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.text = None
+        self.error = None
+
+
+class HttpFetcher(object):
+    """
+    Fetches documents over HTTP through a pooled keep-alive session, and keeps them in an
+    on-disk cache shared by all processes using the same `directory`.
+
+    Cached documents are reused without a request while they are fresh according to
+    :code:`Cache-Control: max-age`, and revalidated with conditional requests
+    (:code:`If-None-Match`, :code:`If-Modified-Since`) afterwards. Concurrent fetches of
+    the same URL in a process are done once.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'aria_rest_http')
+    DEFAULT_CONNECTIONS = 16
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, connections=DEFAULT_CONNECTIONS,
+                 timeout=DEFAULT_TIMEOUT):
+        """
+        :param directory - cache directory, or None to disable the cache
+        :param connections - number of keep-alive connections kept per host
+        :param timeout - seconds to wait for connecting and for every response read
+        """
+
+        self.directory = directory
+        self.connections = connections
+        self.timeout = timeout
+        self._pid = None
+        self._session = None
+        self._flights = {}
+        self._lock = threading.Lock()
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.connections,
+                                      pool_maxsize=self.connections)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+
+            return self._session
+
+    def _path(self, url, extension):
+        key = hashlib.sha256(url.encode('utf-8') if isinstance(url, unicode) else url)
+
+        return os.path.join(self.directory, '{0}.{1}'.format(key.hexdigest(), extension))
+
+    def _load(self, url):
+        if self.directory is None:
+            return None, None
+
+        try:
+            with open(self._path(url, 'json')) as entry_file:
+                entry = json.load(entry_file)
+            with open(self._path(url, 'body'), 'rb') as body_file:
+                body = body_file.read()
+        except (IOError, ValueError):
+            return None, None
+
+        if entry.get('url') != url:
+            return None, None
+
+        return entry, body
+
+    @staticmethod
+    def _expires(response):
+        cache_control = response.headers.get('Cache-Control', '')
+
+        if 'no-cache' in cache_control:
+            return 0
+
+        match = MAX_AGE_PATTERN.search(cache_control)
+
+        return time.time() + int(match.group(1)) if match else 0
+
+    def _store(self, url, entry, body=None):
+        if self.directory is None:
+            return
+
+        if body is not None:
+            write_atomically(self._path(url, 'body'), body)
+
+        write_atomically(self._path(url, 'json'), json.dumps(entry))
+
+    def _fetch(self, url):
+        entry, body = self._load(url)
+
+        if entry is not None and entry['expires'] > time.time():
+            return body.decode(entry['encoding'])
+
+        headers = {}
+
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise FetchError(url, message='could not fetch "{0}": {1}'.format(url, e))
+
+        if response.status_code == 304 and entry is not None:
+            entry['expires'] = self._expires(response)
+            self._store(url, entry)
+
+            return body.decode(entry['encoding'])
+
+        if response.status_code != 200:
+            raise FetchError(url, response.status_code)
+
+        body = response.content
+        entry = {'url': url,
+                 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified'),
+                 'encoding': response.encoding or 'utf-8',
+                 'expires': self._expires(response)}
+
+        if 'no-store' not in response.headers.get('Cache-Control', ''):
+            self._store(url, entry, body)
+
+        return body.decode(entry['encoding'])
+
+    def fetch(self, url):
+        """
+        Returns the document at `url` as text.
+
+        :raises FetchError: when the document cannot be fetched, :code:`status` is the
+        HTTP status code if the server responded
+        """
+
+        with self._lock:
+            flight = self._flights.get(url)
+            leader = flight is None
+
+            if leader:
+                flight = self._flights[url] = Flight()
+
+        if not leader:
+            flight.done.wait()
+
+            if flight.error is not None:
+                raise flight.error
+
+            return flight.text
+
+        try:
+            flight.text = self._fetch(url)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[url]
+
+            flight.done.set()
+
+        return flight.text
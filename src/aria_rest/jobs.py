@@ -0,0 +1,216 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from Queue import PriorityQueue
+
+JOB_ID_PATTERN = re.compile('^[0-9a-f]{32}$')
+
+
+def write_atomically(path, data):
+    """
+    Writes `data` to a temporary file next to `path`, then renames it over `path`, so
+    readers never see a partially written file.
+    """
+
+    descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path))
+
+    try:
+        with os.fdopen(descriptor, 'wb') as temporary_file:
+            temporary_file.write(data)
+        os.rename(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+class JobQueue(object):
+    """
+    Runs operations in background threads, highest priority first, and keeps their
+    results for `ttl` seconds after they finish.
+
+    Jobs are recorded as files in `directory`, so that every server process sharing it
+    can report on, wait for, and cancel any job; a job is executed by the process that
+    accepted it. Only that process writes the job record, cancellation is requested
+    through a separate marker file.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    DEFAULT_THREADS = 2
+    DEFAULT_TTL = 3600
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, execute, directory=None, threads=DEFAULT_THREADS, ttl=DEFAULT_TTL):
+        """
+        :param execute - function called with the operation name and data of a job,
+        returning the result text (stored encoded as UTF-8)
+        """
+
+        self.execute = execute
+        self.directory = directory or tempfile.mkdtemp(prefix='aria_rest_jobs')
+        self.threads = threads
+        self.ttl = ttl
+        self._pid = None
+        self._queue = None
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._purged = 0
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, job_id, extension):
+        return os.path.join(self.directory, '{0}.{1}'.format(job_id, extension))
+
+    def _start(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = PriorityQueue()
+
+                for _ in range(self.threads):
+                    thread = threading.Thread(target=self._work)
+                    thread.daemon = True
+                    thread.start()
+
+    def _write(self, job, **changes):
+        job.update(changes)
+        write_atomically(self._path(job['id'], 'json'), json.dumps(job))
+
+    def _is_cancelled(self, job_id):
+        return os.path.exists(self._path(job_id, 'cancel'))
+
+    def _work(self):
+        while True:
+            _, _, job, data = self._queue.get()
+
+            if self._is_cancelled(job['id']):
+                self._write(job, status=self.CANCELLED, finished=time.time())
+                continue
+
+            self._write(job, status=self.RUNNING, started=time.time())
+
+            try:
+                result = self.execute(job['operation'], data)
+
+                if self._is_cancelled(job['id']):
+                    self._write(job, status=self.CANCELLED, finished=time.time())
+                    continue
+
+                if isinstance(result, unicode):
+                    result = result.encode('utf-8')
+
+                write_atomically(self._path(job['id'], 'result'), result)
+            except Exception:
+                self._write(job, status=self.FAILED, finished=time.time(),
+                            error=traceback.format_exc())
+                continue
+
+            self._write(job, status=self.SUCCEEDED, finished=time.time())
+
+    def _purge(self):
+        now = time.time()
+
+        if now - self._purged < self.ttl / 10.0:
+            return
+
+        self._purged = now
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    job = self.get(name.split('.', 1)[0])
+
+                    if job is None or job['status'] in self.FINISHED:
+                        os.remove(path)
+            except OSError:
+                pass
+
+    def submit(self, operation, data, priority=0):
+        self._start()
+        self._purge()
+
+        job = {'id': uuid.uuid4().hex, 'operation': operation, 'priority': priority}
+        self._write(job, status=self.QUEUED, submitted=time.time())
+        self._queue.put((-priority, next(self._sequence), job, data))
+
+        return job
+
+    def get(self, job_id):
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+
+        try:
+            with open(self._path(job_id, 'json')) as job_file:
+                job = json.load(job_file)
+        except (IOError, ValueError):
+            return None
+
+        if job['status'] not in self.FINISHED and self._is_cancelled(job_id):
+            job['status'] = self.CANCELLED
+
+        return job
+
+    def wait(self, job_id, timeout):
+        """
+        Returns the job once it has finished, or as it is after `timeout` seconds.
+        """
+
+        deadline = time.time() + timeout
+        job = self.get(job_id)
+
+        while job is not None and job['status'] not in self.FINISHED and time.time() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            job = self.get(job_id)
+
+        return job
+
+    def result(self, job_id):
+        job = self.get(job_id)
+
+        if job is None or job['status'] != self.SUCCEEDED:
+            return None
+
+        try:
+            with open(self._path(job_id, 'result'), 'rb') as result_file:
+                return result_file.read()
+        except IOError:
+            return None
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+
+        if job is not None and job['status'] not in self.FINISHED:
+            open(self._path(job_id, 'cancel'), 'w').close()
+            job['status'] = self.CANCELLED
+
+        return job
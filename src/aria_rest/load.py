@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import multiprocessing
+
+from werkzeug.wsgi import ClosingIterator
+
+
+class RequestLoad(object):
+    """
+    WSGI middleware counting the requests in flight, until their responses are fully
+    sent. The count is kept in shared memory, so it covers all the server processes
+    forked after the middleware is created.
+    """
+
+    def __init__(self, capacity=1, app=None):
+        """
+        :param capacity - number of requests that can be served at the same time
+        :param app - the WSGI application, which can also be set later
+        """
+
+        self.capacity = capacity
+        self.app = app
+        self._in_flight = multiprocessing.Value('i', 0)
+
+    @property
+    def in_flight(self):
+        return self._in_flight.value
+
+    def weight(self, max_weight):
+        """
+        Weight from `max_weight` when idle down to 1 at full capacity, for load balancing.
+        """
+
+        free = max(0.0, 1 - float(self.in_flight) / max(self.capacity, 1))
+        return max(1, int(round(max_weight * free)))
+
+    def _add(self, count):
+        with self._in_flight.get_lock():
+            self._in_flight.value += count
+
+    def __call__(self, environ, start_response):
+        self._add(1)
+
+        try:
+            response = self.app(environ, start_response)
+        except BaseException:
+            self._add(-1)
+            raise
+
+        return ClosingIterator(response, lambda: self._add(-1))
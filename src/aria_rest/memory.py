@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import resource
+import thread
+import threading
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def _statm():
+    try:
+        with open('/proc/self/statm') as statm:
+            return [int(field) * PAGE_SIZE for field in statm.read().split()[:2]]
+    except IOError:
+        return None
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process in bytes.
+    """
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def rss():
+    """
+    Resident set size of this process in bytes. Where it cannot be read (outside Linux)
+    this is the peak resident set size instead.
+    """
+
+    statm = _statm()
+    return statm[1] if statm is not None else peak_rss()
+
+
+def address_space():
+    """
+    Virtual memory size of this process in bytes, or None if it cannot be read.
+    """
+
+    statm = _statm()
+    return statm[0] if statm is not None else None
+
+
+class PeakMemory(object):
+    """
+    Samples the resident set size of the process from a background thread while it is
+    entered, and keeps the peak growth over the size it had on entry, in bytes.
+
+    Python 2 has no allocation tracing, so this is sampled and process-wide: requests
+    handled concurrently by other threads of the process are counted too. Peaks shorter
+    than the sampling interval are still caught when they raise the peak resident set
+    size of the process.
+    """
+
+    DEFAULT_INTERVAL = 0.01
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.baseline = None
+        self.peak = None
+        self._process_peak = None
+        self._stopping = threading.Event()
+
+    @property
+    def growth(self):
+        return max(self.peak - self.baseline, 0) if self.peak is not None else None
+
+    def _sample(self):
+        size = rss()
+
+        if size > self.peak:
+            self.peak = size
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._process_peak = peak_rss()
+        self.baseline = self.peak = rss()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+        try:
+            self._thread.start()
+        except thread.error:
+            # Out of memory already, sample on exit only
+            self._thread = None
+
+        return self
+
+    def __exit__(self, *_):
+        self._stopping.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+        self._sample()
+        process_peak = peak_rss()
+
+        if process_peak > self._process_peak:
+            self.peak = max(self.peak, process_peak)
@@ -0,0 +1,400 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import errno
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .jobs import write_atomically
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+
+class Timings(object):
+    """
+    Durations of the steps of a single request, in seconds, in the order they were
+    recorded, and the peak memory growth of the request in bytes (None if unknown). The
+    timings of the request being handled by a thread are available from
+    :code:`Timings.current()` while they are activated.
+    """
+
+    _local = threading.local()
+
+    def __init__(self):
+        self.items = []
+        self.peak_memory = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def current(cls):
+        return getattr(cls._local, 'timings', None)
+
+    @contextmanager
+    def activate(self):
+        previous = Timings.current()
+        Timings._local.timings = self
+
+        try:
+            yield self
+        finally:
+            Timings._local.timings = previous
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.items.append((name, seconds))
+
+    def extend(self, items):
+        with self._lock:
+            self.items.extend(items)
+
+    def add_memory(self, peak_memory):
+        """
+        Keeps the largest peak memory growth recorded.
+        """
+
+        if peak_memory is not None:
+            with self._lock:
+                self.peak_memory = max(self.peak_memory, peak_memory)
+
+    @contextmanager
+    def measure(self, name):
+        started = time.time()
+
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - started)
+
+    def totals(self):
+        """
+        Total duration by step name, in the order the steps were first recorded.
+        """
+
+        totals = OrderedDict()
+
+        with self._lock:
+            for name, seconds in self.items:
+                totals[name] = totals.get(name, 0) + seconds
+
+        return totals
+
+    def header(self):
+        """
+        Value of the :code:`Server-Timing` response header, in milliseconds, with the
+        peak memory growth in KiB as the description of a :code:`memory` metric.
+        """
+
+        metrics = ['{0};dur={1:.1f}'.format(name, seconds * 1000)
+                   for name, seconds in self.totals().iteritems()]
+
+        if self.peak_memory is not None:
+            metrics.append('memory;desc="{0} KiB"'.format(self.peak_memory // 1024))
+
+        return ', '.join(metrics)
+
+
+@contextmanager
+def measure(name):
+    """
+    Measures a step of the current request, if any.
+    """
+
+    timings = Timings.current()
+
+    if timings is None:
+        yield
+    else:
+        with timings.measure(name):
+            yield
+
+
+def _escape(value):
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return '{' + ','.join('{0}="{1}"'.format(name, _escape(value))
+                          for name, value in labels) + '}' if labels else ''
+
+
+class Metrics(object):
+    """
+    Counters and histograms, exposed in the Prometheus text format.
+
+    With a `directory`, every process regularly saves its own values there and the
+    exposed values are the sums over all processes sharing the directory, so that any
+    worker of a prefork server can report for all of them. The values of processes that
+    exited are added up in a single file, so that replacing workers does not pile up files.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    MEMORY_BUCKETS = tuple(megabytes * 1024 * 1024
+                           for megabytes in (1, 4, 16, 64, 128, 256, 512, 1024, 2048))
+    DEFAULT_NAMED_BUCKETS = {'aria_rest_request_peak_bytes': MEMORY_BUCKETS}
+    SAVE_INTERVAL = 1
+    RETIRED_NAME = 'retired.json'
+    LOCK_NAME = '.lock'
+
+    def __init__(self, directory=None, buckets=DEFAULT_BUCKETS,
+                 named_buckets=DEFAULT_NAMED_BUCKETS):
+        """
+        :param buckets - upper bounds of the histogram buckets
+        :param named_buckets - upper bounds of the buckets of specific histograms, by name
+        """
+
+        self.directory = directory
+        self.buckets = tuple(buckets)
+        self.named_buckets = dict((name, tuple(bounds))
+                                  for name, bounds in named_buckets.iteritems())
+        self._pid = None
+        self._counters = None
+        self._histograms = None
+        self._saved = 0
+        self._lock = threading.Lock()
+
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _reset_if_forked(self):
+        # Values inherited from the parent process are saved by the parent
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._counters = {}
+            self._histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.iteritems())))
+
+        with self._lock:
+            self._reset_if_forked()
+            self._counters[key] = self._counters.get(key, 0) + value
+
+        self._save()
+
+    def _buckets(self, name):
+        return self.named_buckets.get(name, self.buckets)
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.iteritems())))
+        buckets = self._buckets(name)
+
+        with self._lock:
+            self._reset_if_forked()
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+
+            for index, bound in enumerate(buckets):
+                if seconds <= bound:
+                    histogram[index] += 1
+                    break
+            else:
+                histogram[len(buckets)] += 1
+
+            histogram[-1] += seconds
+
+        self._save()
+
+    def observe_timings(self, name, timings, **labels):
+        """
+        Observes every step of a :class:`Timings`, labeled :code:`stage`.
+        """
+
+        for stage, seconds in timings.items:
+            self.observe(name, seconds, stage=stage, **labels)
+
+    def clear(self):
+        """
+        Discards all values, including those saved by other processes.
+        """
+
+        with self._lock:
+            self._pid = None
+
+        if self.directory is not None:
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                os.remove(path)
+
+    def _state(self):
+        with self._lock:
+            self._reset_if_forked()
+
+            return {'counters': [[name, labels, value]
+                                 for (name, labels), value in self._counters.iteritems()],
+                    'histograms': [[name, labels, histogram]
+                                   for (name, labels), histogram in self._histograms.iteritems()]}
+
+    def _save(self, force=False):
+        if self.directory is None or (not force and time.time() - self._saved < self.SAVE_INTERVAL):
+            return
+
+        self._saved = time.time()
+        write_atomically(os.path.join(self.directory, '{0}.json'.format(os.getpid())),
+                         json.dumps(self._state()))
+
+    def _locked(self, operation):
+        """
+        Locks the directory, shared (:code:`fcntl.LOCK_SH`) for reading the saved values
+        or exclusively (:code:`fcntl.LOCK_EX`) for moving the values of exited processes,
+        so that they are never read twice or not at all.
+        """
+
+        lock_file = open(os.path.join(self.directory, self.LOCK_NAME), 'a')
+        fcntl.flock(lock_file, operation)
+
+        return lock_file
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path) as state_file:
+                return json.load(state_file)
+        except (IOError, ValueError):
+            return None
+
+    @staticmethod
+    def _sum(states):
+        counters = {}
+        histograms = {}
+
+        for state in states:
+            for name, labels, value in state['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+
+            for name, labels, histogram in state['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                total = histograms.setdefault(key, [0] * len(histogram))
+                histograms[key] = [a + b for a, b in zip(total, histogram)]
+
+        return counters, histograms
+
+    def _retire(self, paths):
+        """
+        Adds the values saved in `paths` to those of the exited processes and removes the
+        files. Requires the exclusive lock.
+        """
+
+        retired_path = os.path.join(self.directory, self.RETIRED_NAME)
+        states = [state for state in map(self._read, [retired_path] + paths) if state is not None]
+        counters, histograms = self._sum(states)
+
+        write_atomically(retired_path, json.dumps({
+            'counters': [[name, labels, value] for (name, labels), value in counters.iteritems()],
+            'histograms': [[name, labels, histogram]
+                           for (name, labels), histogram in histograms.iteritems()]}))
+
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def retire(self):
+        """
+        Adds the values of this process to those of the exited processes, to be called by a
+        process about to exit. Values recorded afterwards are saved anew.
+        """
+
+        if self.directory is None:
+            return
+
+        self._save(force=True)
+        lock_file = self._locked(fcntl.LOCK_EX)
+
+        try:
+            self._retire([os.path.join(self.directory, '{0}.json'.format(os.getpid()))])
+        finally:
+            lock_file.close()
+
+        with self._lock:
+            self._pid = None
+
+    @staticmethod
+    def _is_alive(pid):
+        try:
+            os.kill(pid, 0)
+        except OSError as e:
+            return e.errno != errno.ESRCH
+
+        return True
+
+    def _states(self):
+        if self.directory is None:
+            return [self._state()]
+
+        self._save(force=True)
+        pattern = os.path.join(self.directory, '*.json')
+        pids = [os.path.basename(path)[:-len('.json')] for path in glob.glob(pattern)]
+
+        # Processes that exited without retiring, such as killed workers
+        if any(pid.isdigit() and not self._is_alive(int(pid)) for pid in pids):
+            lock_file = self._locked(fcntl.LOCK_EX)
+
+            try:
+                self._retire([os.path.join(self.directory, '{0}.json'.format(pid))
+                              for pid in pids if pid.isdigit() and not self._is_alive(int(pid))])
+            finally:
+                lock_file.close()
+
+        lock_file = self._locked(fcntl.LOCK_SH)
+
+        try:
+            return [state for state in map(self._read, glob.glob(pattern)) if state is not None]
+        finally:
+            lock_file.close()
+
+    def expose(self):
+        """
+        Returns all values in the Prometheus text format.
+        """
+
+        counters, histograms = self._sum(self._states())
+        lines = []
+        typed = set()
+
+        for (name, labels), value in sorted(counters.iteritems()):
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE {0} counter'.format(name))
+            lines.append('{0}{1} {2}'.format(name, _labels(labels), value))
+
+        for (name, labels), histogram in sorted(histograms.iteritems()):
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE {0} histogram'.format(name))
+
+            count = 0
+
+            for bound, bucket_count in zip(self._buckets(name) + ('+Inf',), histogram[:-1]):
+                count += bucket_count
+                lines.append('{0}_bucket{1} {2}'.format(name, _labels(labels + (('le', bound),)),
+                                                        count))
+
+            lines.append('{0}_sum{1} {2!r}'.format(name, _labels(labels), histogram[-1]))
+            lines.append('{0}_count{1} {2}'.format(name, _labels(labels), count))
+
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
@@ -0,0 +1,296 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import multiprocessing
+import os
+import resource
+import signal
+import threading
+import traceback
+import types
+from Queue import Queue
+
+from .memory import address_space, rss
+from .metrics import measure
+from .profiling import watch_sampling_switch
+
+
+class WorkerLimitError(Exception):
+    pass
+
+
+class WorkerTimeoutError(WorkerLimitError):
+    pass
+
+
+class WorkerMemoryError(WorkerLimitError):
+    pass
+
+
+class WorkerError(Exception):
+    pass
+
+
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+OUT_OF_MEMORY = 'out of memory'
+ITEM = 'item'
+
+
+class WorkerLimits(object):
+    """
+    Limits of a worker process.
+
+    :param cpu_limit - CPU time limit per call, in seconds
+    :param memory_limit - limit of the memory allocated by a call, in bytes: allocating
+    more raises :code:`MemoryError` in the worker
+    :param max_requests - number of calls after which the worker is replaced
+    :param max_rss - resident set size in bytes above which the worker is replaced
+    """
+
+    def __init__(self, cpu_limit=None, memory_limit=None, max_requests=None, max_rss=None):
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.max_requests = max_requests
+        self.max_rss = max_rss
+
+    def is_exceeded(self, requests):
+        """
+        Whether a worker that handled `requests` calls should be replaced.
+        """
+
+        return bool(self.max_requests and requests >= self.max_requests or
+                    self.max_rss and rss() > self.max_rss)
+
+
+def _set_soft_limit(limit, soft):
+    """
+    Sets the soft `limit` to `soft` (within the hard limit), or to the hard limit if
+    `soft` is None.
+    """
+
+    _, hard = resource.getrlimit(limit)
+
+    if soft is None or hard != resource.RLIM_INFINITY and soft > hard:
+        soft = hard
+
+    resource.setrlimit(limit, (soft, hard))
+
+
+def _work(connection, handler, limits):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    watch_sampling_switch()
+    requests = 0
+
+    while True:
+        try:
+            method_name, args = connection.recv()
+        except (EOFError, IOError):
+            return
+
+        if limits.cpu_limit:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            _set_soft_limit(resource.RLIMIT_CPU,
+                            int(usage.ru_utime + usage.ru_stime) + limits.cpu_limit + 1)
+
+        memory_limited = limits.memory_limit and address_space() is not None
+
+        if memory_limited:
+            _set_soft_limit(resource.RLIMIT_AS, address_space() + limits.memory_limit)
+
+        try:
+            result = getattr(handler, method_name)(*args)
+
+            if isinstance(result, types.GeneratorType):
+                for item in result:
+                    connection.send((ITEM, item, False))
+
+                result = None
+
+            result = (SUCCEEDED, result)
+        except MemoryError:
+            result = (OUT_OF_MEMORY, None)
+        except Exception:
+            result = (FAILED, traceback.format_exc())
+        finally:
+            if memory_limited:
+                _set_soft_limit(resource.RLIMIT_AS, None)
+
+        requests += 1
+        retiring = result[0] == OUT_OF_MEMORY or limits.is_exceeded(requests)
+        connection.send(result + (retiring,))
+
+        if retiring:
+            return
+
+
+class Worker(object):
+
+    def __init__(self, handler, limits):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_work,
+                                               args=(child_connection, handler, limits))
+        self.process.daemon = True
+        self.process.start()
+        child_connection.close()
+
+    def kill(self):
+        self.connection.close()
+
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+
+            if self.process.is_alive():
+                os.kill(self.process.pid, signal.SIGKILL)
+
+        self.process.join()
+
+
+class WorkerPool(object):
+    """
+    Bounded pool of forked worker processes, each holding its own copy of `handler`.
+
+    :code:`apply` calls a method of the handler in a free worker and waits for its result
+    at most `timeout` seconds of wall-clock time (:code:`iterate` for every item of a
+    generator method), while the worker itself is allowed at
+    most `cpu_limit` seconds of CPU time and `memory_limit` bytes of memory per call. A
+    worker that exceeds any of these limits is killed and replaced by a fresh one, and so
+    is a worker that handled `max_requests` calls or grew above `max_rss` bytes of
+    resident memory, so that memory held by workers stays bounded.
+
+    Workers are started lazily, so a pool created before the server forks still gets
+    separate workers in every server process.
+    """
+
+    DEFAULT_SIZE = multiprocessing.cpu_count()
+
+    def __init__(self, handler, size=DEFAULT_SIZE, timeout=None, cpu_limit=None,
+                 memory_limit=None, max_requests=None, max_rss=None):
+        self.handler = handler
+        self.size = size
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.limits = WorkerLimits(cpu_limit, memory_limit, max_requests, max_rss)
+        self._pid = None
+        self._idle = None
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = Queue()
+
+                for _ in range(self.size):
+                    self._idle.put(None)
+
+        return self._idle.get() or Worker(self.handler, self.limits)
+
+    def _receive(self, worker):
+        """
+        Returns the next (status, result, retiring) message of `worker`.
+        """
+
+        try:
+            if worker.connection.poll(self.timeout):
+                return worker.connection.recv()
+        except (EOFError, IOError):
+            worker.kill()
+
+            if worker.process.exitcode == -signal.SIGXCPU:
+                raise WorkerTimeoutError('exceeded {0} seconds of CPU time'.format(self.cpu_limit))
+            raise WorkerError('worker died with exit code {0}'.format(worker.process.exitcode))
+
+        worker.kill()
+        raise WorkerTimeoutError('exceeded {0} seconds'.format(self.timeout))
+
+    def _call(self, method_name, args):
+        """
+        Generates the (status, result) messages of a call in a worker: one for every item
+        if the method returns a generator, then one for its outcome. A worker left in the
+        middle of a call is killed.
+        """
+
+        with measure('queue'):
+            worker = self._acquire()
+
+        finished = retiring = False
+
+        try:
+            try:
+                worker.connection.send((method_name, args))
+            except IOError:
+                worker.kill()
+                raise WorkerError('worker died with exit code {0}'.format(worker.process.exitcode))
+
+            while not finished:
+                status, result, retiring = self._receive(worker)
+                finished = status != ITEM
+                yield status, result
+        finally:
+            if not finished or retiring:
+                worker.kill()
+                worker = None
+
+            self._idle.put(worker)
+
+    def _outcome(self, status, result):
+        if status == OUT_OF_MEMORY:
+            raise WorkerMemoryError('exceeded {0} MB of memory'
+                                    .format(self.memory_limit // (1024 * 1024)))
+
+        if status == FAILED:
+            raise WorkerError(result)
+
+        return result
+
+    def apply(self, method_name, *args):
+        """
+        Calls `method_name` of the handler with `args` in a worker process.
+
+        :raises WorkerTimeoutError: when the call exceeded the wall-clock or the CPU limit
+        :raises WorkerMemoryError: when the call exceeded the memory limit
+        :raises WorkerError: when the call raised an exception, or the worker died
+        """
+
+        for status, result in self._call(method_name, args):
+            pass
+
+        return self._outcome(status, result)
+
+    def iterate(self, method_name, *args):
+        """
+        Like :code:`apply` for a method returning a generator, generating its items as the
+        worker generates them. The wall-clock limit applies to every item.
+        """
+
+        for status, result in self._call(method_name, args):
+            if status == ITEM:
+                yield result
+            else:
+                self._outcome(status, result)
+
+    def close(self):
+        if self._pid == os.getpid():
+            for _ in range(self.size):
+                worker = self._idle.get()
+
+                if worker is not None:
+                    worker.kill()
+
+            self._pid = None
@@ -0,0 +1,177 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import errno
+import os
+import signal
+import socket
+import time
+import traceback
+
+from aria.utils.console import (Colored, puts)
+from werkzeug.serving import make_server
+
+from .pool import WorkerLimits
+from .profiling import watch_sampling_switch
+
+
+class PreforkServer(object):
+    """
+    Serves a WSGI application from several forked worker processes that share a single
+    listening socket. The master process only supervises: workers that die are replaced
+    until the master itself is terminated, and then all workers are stopped with it.
+
+    Everything loaded before :code:`serve_forever` is called (ARIA extensions, the
+    swagger specification) is shared by the workers.
+
+    A worker retires, and is replaced, after serving `max_requests` requests or once its
+    resident set size exceeds `max_rss` bytes, so that memory held by long-lived workers
+    stays bounded.
+    """
+
+    DEFAULT_HOST = '0.0.0.0'
+    DEFAULT_BACKLOG = 128
+    RESPAWN_DELAY = 1
+    RETIRED_STATUS = 0
+
+    def __init__(self, app, port, workers, host=DEFAULT_HOST, workers_file=None,
+                 max_requests=None, max_rss=None, on_exit=None):
+        """
+        :param workers_file - optional path of a file listing the pids of the live workers
+        :param on_exit - optional function called in a worker that is about to exit after
+        serving, such as to save what it recorded
+        """
+
+        self.app = app
+        self.port = port
+        self.workers = workers
+        self.host = host
+        self.workers_file = workers_file
+        self.limits = WorkerLimits(max_requests=max_requests, max_rss=max_rss)
+        self.on_exit = on_exit
+        self.pids = {}
+        self._master_pid = None
+        self._socket = None
+        self._stopping = False
+
+    def _listen(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(self.DEFAULT_BACKLOG)
+
+        return listener
+
+    def _serve(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        watch_sampling_switch()
+
+        status = 1
+
+        try:
+            server = make_server(self.host, self.port, self.app, fd=self._socket.fileno())
+
+            if not self.limits.max_requests and not self.limits.max_rss:
+                server.serve_forever()
+            else:
+                requests = 0
+
+                while not self.limits.is_exceeded(requests):
+                    server.handle_request()
+                    requests += 1
+
+                status = self.RETIRED_STATUS
+        finally:
+            try:
+                if self.on_exit is not None:
+                    self.on_exit()
+            except Exception:
+                traceback.print_exc()
+
+            os._exit(status)
+
+    def _spawn(self):
+        pid = os.fork()
+
+        if pid == 0:
+            self._serve()
+
+        self.pids[pid] = time.time()
+        self._write_workers_file()
+
+    def _write_workers_file(self):
+        if self.workers_file is not None:
+            with open(self.workers_file, 'w') as workers_file:
+                workers_file.write('\n'.join(str(pid) for pid in sorted(self.pids)))
+
+    def _stop(self, *_):
+        if os.getpid() != self._master_pid:
+            # A worker terminated before it reset the handlers inherited from the master
+            os._exit(1)
+
+        self._stopping = True
+
+        for pid in self.pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _reap(self):
+        try:
+            pid, status = os.wait()
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return
+            raise
+
+        started = self.pids.pop(pid, None)
+
+        if started is None or self._stopping:
+            return
+
+        retired = os.WIFEXITED(status) and os.WEXITSTATUS(status) == self.RETIRED_STATUS
+
+        if retired:
+            puts(Colored.blue('Worker {0} retired, replacing it'.format(pid)))
+        else:
+            puts(Colored.red('Worker {0} exited with status {1}, replacing it'.format(pid, status)))
+
+        if time.time() - started < self.RESPAWN_DELAY and not retired:
+            time.sleep(self.RESPAWN_DELAY)
+
+        self._spawn()
+
+    def serve_forever(self):
+        self._master_pid = os.getpid()
+        self._socket = self._listen()
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+
+            while self.pids:
+                self._reap()
+        finally:
+            self._stop()
+            self._socket.close()
+
+            if self.workers_file is not None and os.path.exists(self.workers_file):
+                os.remove(self.workers_file)
@@ -0,0 +1,225 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import thread
+import threading
+import time
+from StringIO import StringIO
+
+from .jobs import write_atomically
+
+STATS = 'stats'
+COLLAPSED = 'collapsed'
+FORMATS = (STATS, COLLAPSED)
+STATS_LIMIT = 100
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return '{0} ({1}:{2})'.format(code.co_name, os.path.basename(code.co_filename),
+                                  code.co_firstlineno)
+
+
+class StackSampler(object):
+    """
+    Samples the stacks of all other threads of the process from a background thread,
+    and counts them in the collapsed format used by flame graph tools. The counts can be
+    written out while sampling.
+    """
+
+    DEFAULT_INTERVAL = 0.005
+
+    def __init__(self, interval=DEFAULT_INTERVAL, ignored_thread_ids=()):
+        self.interval = interval
+        self.ignored_thread_ids = set(ignored_thread_ids)
+        self.counts = {}
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def _sample(self):
+        own_id = thread.get_ident()
+
+        for thread_id, frame in sys._current_frames().iteritems():
+            if thread_id == own_id or thread_id in self.ignored_thread_ids:
+                continue
+
+            names = []
+
+            while frame is not None:
+                names.append(_frame_name(frame))
+                frame = frame.f_back
+
+            stack = ';'.join(reversed(names))
+
+            with self._lock:
+                self.counts[stack] = self.counts.get(stack, 0) + 1
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def collapsed(self):
+        with self._lock:
+            counts = dict(self.counts)
+
+        return ''.join('{0} {1}\n'.format(stack, count)
+                       for stack, count in sorted(counts.iteritems()))
+
+
+def profile_call(profile_format, function, *args):
+    """
+    Calls `function` with `args` and returns its profile as text: the cProfile
+    statistics of the calling thread sorted by cumulative time (:code:`stats`), or
+    sampled stacks of all threads in collapsed format (:code:`collapsed`).
+    """
+
+    if profile_format == COLLAPSED:
+        sampler = StackSampler()
+        sampler.start()
+
+        try:
+            function(*args)
+        finally:
+            sampler.stop()
+
+        return sampler.collapsed()
+
+    profile = cProfile.Profile()
+    profile.runcall(function, *args)
+    stream = StringIO()
+    pstats.Stats(profile, stream=stream).sort_stats('cumulative').print_stats(STATS_LIMIT)
+
+    return stream.getvalue()
+
+
+class SamplingSwitch(object):
+    """
+    Turns stack sampling on and off in every process of a daemon without restarting it.
+
+    A signal sent to the process that installed the switch toggles a marker file. Every
+    process watching the switch (see :code:`watch`) polls the marker, samples its own
+    threads while the marker exists, and writes the samples in collapsed format to
+    `samples_path` (formatted with its pid), on stop and regularly while sampling.
+    """
+
+    SIGNAL = signal.SIGUSR2
+    POLL_INTERVAL = 1
+    WRITE_INTERVAL = 10
+
+    def __init__(self, marker_path, samples_path):
+        """
+        :param samples_path - path of the samples file, with a :code:`{pid}` placeholder
+        """
+
+        self.marker_path = marker_path
+        self.samples_path = samples_path
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def toggle(self, *_):
+        if os.path.exists(self.marker_path):
+            os.remove(self.marker_path)
+        else:
+            open(self.marker_path, 'w').close()
+
+    def install(self):
+        """
+        Handles the signal in this process, and starts watching.
+        """
+
+        if os.path.exists(self.marker_path):
+            os.remove(self.marker_path)
+
+        signal.signal(self.SIGNAL, self.toggle)
+        signal.siginterrupt(self.SIGNAL, False)
+        self.watch()
+
+    def watch(self):
+        """
+        Starts watching in this process, unless it already does. Must be called again in
+        forked processes.
+        """
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+
+        watcher = threading.Thread(target=self._watch)
+        watcher.daemon = True
+        watcher.start()
+
+    def _write(self, sampler):
+        write_atomically(self.samples_path.format(pid=os.getpid()), sampler.collapsed())
+
+    def _watch(self):
+        sampler = None
+        written = 0
+
+        while True:
+            time.sleep(self.POLL_INTERVAL)
+            sampling = os.path.exists(self.marker_path)
+
+            if sampling and sampler is None:
+                sampler = StackSampler(ignored_thread_ids=(thread.get_ident(),))
+                sampler.start()
+                written = time.time()
+            elif sampler is not None and (not sampling or
+                                          time.time() - written > self.WRITE_INTERVAL):
+                if not sampling:
+                    sampler.stop()
+
+                self._write(sampler)
+                written = time.time()
+
+                if not sampling:
+                    sampler = None
+
+
+SWITCH = None
+
+
+def install_sampling_switch(marker_path, samples_path):
+    global SWITCH
+
+    SWITCH = SamplingSwitch(marker_path, samples_path)
+    SWITCH.install()
+
+
+def watch_sampling_switch():
+    """
+    Starts watching the installed sampling switch in this process, if there is one.
+    """
+
+    if SWITCH is not None:
+        SWITCH.watch()
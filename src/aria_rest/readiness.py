@@ -0,0 +1,83 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import threading
+import time
+import traceback
+
+from aria.utils.console import (Colored, puts)
+
+
+class Readiness(object):
+    """
+    Tracks whether the server finished starting up (loading, warm-up) and can serve
+    requests at full speed, and runs callbacks once it does.
+    """
+
+    def __init__(self, started=None):
+        """
+        :param started - time the start was requested (now by default), from which the
+        start-to-ready time is measured
+        """
+
+        self.started = started if started is not None else time.time()
+        self.ready_at = None
+        self.callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self):
+        return self.ready_at is not None
+
+    @property
+    def seconds(self):
+        """
+        Seconds from start to ready, or since start while not ready yet.
+        """
+
+        return (self.ready_at or time.time()) - self.started
+
+    def on_ready(self, callback):
+        """
+        Calls `callback` once ready, immediately if already ready.
+        """
+
+        with self._lock:
+            if not self.is_ready:
+                self.callbacks.append(callback)
+                return
+
+        self._call(callback)
+
+    @staticmethod
+    def _call(callback):
+        try:
+            callback()
+        except Exception:
+            traceback.print_exc()
+
+    def mark_ready(self):
+        with self._lock:
+            if self.is_ready:
+                return
+
+            self.ready_at = time.time()
+            callbacks, self.callbacks = self.callbacks, []
+
+        puts(Colored.blue('Ready in {0:.2f} seconds'.format(self.seconds)))
+
+        for callback in callbacks:
+            self._call(callback)
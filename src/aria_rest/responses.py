@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import json
+import zlib
+
+from flask import Response, request
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CHUNK_SIZE = 64 * 1024
+GZIP_MIN_SIZE = 1024
+
+
+def _chunks(data):
+    for start in xrange(0, len(data), CHUNK_SIZE):
+        yield data[start:start + CHUNK_SIZE]
+
+
+def _gzip_chunks(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in _chunks(data):
+        compressed = compressor.compress(chunk)
+
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        # Flushed, so that clients can decompress every chunk as soon as it arrives
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    yield compressor.flush()
+
+
+def join_lines(lines, size=CHUNK_SIZE):
+    """
+    Groups lines of text into chunks of at least `size` bytes (except for the last one).
+    """
+
+    chunk = []
+    length = 0
+
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+
+        if length >= size:
+            yield ''.join(chunk)
+            chunk = []
+            length = 0
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def streamed_response(chunks, mimetype=NDJSON_MIMETYPE):
+    """
+    Sends chunks of text as they are generated, gzip-compressed when the client accepts
+    it.
+    """
+
+    headers = {'Vary': 'Accept-Encoding'}
+
+    if request.accept_encodings['gzip']:
+        headers['Content-Encoding'] = 'gzip'
+        chunks = _gzip_stream(chunks)
+
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+
+def encoded_response(text, status=200, headers=None):
+    """
+    Sends already serialized JSON text as the response body, without parsing it again.
+
+    The body is streamed in chunks, gzip-compressed when the client accepts it, and
+    re-encoded as msgpack when the client prefers :code:`application/x-msgpack` (and the
+    msgpack package is installed).
+
+    :param headers - additional response headers
+    """
+
+    mimetypes = [JSON_MIMETYPE, MSGPACK_MIMETYPE] if msgpack is not None else [JSON_MIMETYPE]
+    mimetype = request.accept_mimetypes.best_match(mimetypes) or JSON_MIMETYPE
+
+    if mimetype == MSGPACK_MIMETYPE:
+        data = msgpack.packb(json.loads(text), use_bin_type=True)
+    elif isinstance(text, unicode):
+        data = text.encode('utf-8')
+    else:
+        data = text
+
+    headers = dict(headers or (), Vary='Accept, Accept-Encoding')
+
+    if len(data) >= GZIP_MIN_SIZE and request.accept_encodings['gzip']:
+        headers['Content-Encoding'] = 'gzip'
+        body = _gzip_chunks(data)
+    else:
+        headers['Content-Length'] = str(len(data))
+        body = _chunks(data)
+
+    return Response(body, status=status, mimetype=mimetype, headers=headers)
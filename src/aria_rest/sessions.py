@@ -0,0 +1,551 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+import yaml
+from yaml.nodes import MappingNode, ScalarNode, SequenceNode
+
+from .jobs import JOB_ID_PATTERN, write_atomically
+
+TOPOLOGY_TEMPLATE = 'topology_template'
+# Definitions that exist to be aliased elsewhere
+FRAME_SECTIONS = ('dsl_definitions',)
+EXTENSION = '.yaml'
+
+_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+Unit = namedtuple('Unit', ('path', 'first', 'last', 'digest', 'references'))
+Section = namedtuple('Section', ('key_line', 'first', 'unit_ids'))
+
+
+def merge_patch(target, patch):
+    """
+    Applies a JSON merge patch (RFC 7386) to raw data.
+    """
+
+    if not isinstance(patch, dict):
+        return patch
+
+    result = dict(target) if isinstance(target, dict) else {}
+
+    for name, value in patch.iteritems():
+        if value is None:
+            result.pop(name, None)
+        else:
+            result[name] = merge_patch(result.get(name), value)
+
+    return result
+
+
+def _is_section(node):
+    return isinstance(node, MappingNode) and not node.flow_style and bool(node.value) and \
+        all(isinstance(value, MappingNode) for _, value in node.value)
+
+
+def _last_line(node, lines):
+    """
+    Last line (0-based) of a block `node`: its end mark is where the next token starts,
+    which is on a later line unless the document ends there.
+    """
+
+    end = node.end_mark
+
+    if end.line >= len(lines) or not lines[end.line][:end.column].strip():
+        return end.line - 1
+
+    return end.line
+
+
+def _scalars(node, skipped):
+    """
+    Generates the scalar values under `node`, except those under the nodes in `skipped`
+    (a set of ids). Mapping keys are left out.
+    """
+
+    nodes = [node]
+
+    while nodes:
+        node = nodes.pop()
+
+        if id(node) in skipped:
+            continue
+
+        if isinstance(node, ScalarNode):
+            yield node.value
+        elif isinstance(node, SequenceNode):
+            nodes.extend(node.value)
+        elif isinstance(node, MappingNode):
+            nodes.extend(value for _, value in node.value)
+
+
+def _anchors(text):
+    """
+    Returns the lines (0-based) where every anchor is defined, and the (anchor, line)
+    pairs of the aliases.
+    """
+
+    anchors = {}
+    aliases = []
+
+    for event in yaml.parse(text, Loader=_LOADER):
+        if isinstance(event, yaml.AliasEvent):
+            aliases.append((event.anchor, event.start_mark.line))
+        elif isinstance(event, yaml.NodeEvent) and event.anchor is not None:
+            anchors[event.anchor] = event.start_mark.line
+
+    return anchors, aliases
+
+
+class Blueprint(object):
+    """
+    A blueprint document split into "units": the named entries of the sections that are
+    maps of definitions (such as :code:`node_types`, or :code:`node_templates` under
+    :code:`topology_template`), each spanning whole lines of the text. The rest of the
+    document is its "frame".
+
+    Every unit records the names it refers to (scalar values equal to the name of a
+    unit), so that the units affected by a change, and the units they need, can be
+    found. Documents that cannot be split (invalid YAML, or units aliasing anchors of
+    other units) have no units and no frame.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.lines = text.split('\n')
+        self.units = OrderedDict()
+        self.sections = OrderedDict()
+        self.frame = None
+        self.frame_references = frozenset()
+        self._topology = None
+
+        try:
+            root = yaml.compose(text, Loader=_LOADER)
+            anchors, aliases = _anchors(text)
+        except yaml.YAMLError:
+            return
+
+        if isinstance(root, MappingNode):
+            self._split(root)
+
+        for anchor, line in aliases:
+            unit_id = self.unit_at(anchors.get(anchor, -1))
+
+            if unit_id is not None and unit_id != self.unit_at(line):
+                self.units.clear()
+                self.sections.clear()
+                self.frame = None
+                return
+
+    def _split(self, root):
+        sections = []
+
+        for key, value in root.value:
+            if key.value == TOPOLOGY_TEMPLATE and isinstance(value, MappingNode) and \
+                    not value.flow_style:
+                children = [(child_key, child_value) for child_key, child_value in value.value]
+                topology_sections = [((key.value, child_key.value), child_key, child_value)
+                                     for child_key, child_value in children
+                                     if _is_section(child_value)]
+                sections.extend(topology_sections)
+
+                if children and len(topology_sections) == len(children):
+                    self._topology = (key.start_mark.line, children[0][0].start_mark.line,
+                                      [path for path, _, _ in topology_sections])
+            elif _is_section(value) and key.value not in FRAME_SECTIONS:
+                sections.append(((key.value,), key, value))
+
+        names = set(unit_key.value for _, _, value in sections for unit_key, _ in value.value)
+        unit_nodes = set()
+        in_unit = [False] * len(self.lines)
+
+        for path, key, value in sections:
+            entries = value.value
+            unit_ids = []
+
+            for index, (unit_key, unit_value) in enumerate(entries):
+                first = unit_key.start_mark.line
+                last = entries[index + 1][0].start_mark.line - 1 if index + 1 < len(entries) \
+                    else _last_line(value, self.lines)
+                unit_path = path + (unit_key.value,)
+                unit_id = '/'.join(unit_path)
+                text = '\n'.join(self.lines[first:last + 1])
+                references = frozenset(name for name in _scalars(unit_value, ())
+                                       if name in names)
+
+                self.units[unit_id] = Unit(unit_path, first, last,
+                                           hashlib.sha256(text.encode('utf-8')).hexdigest(),
+                                           references)
+                unit_nodes.add(id(unit_value))
+                unit_ids.append(unit_id)
+
+                for line in xrange(first, last + 1):
+                    in_unit[line] = True
+
+            self.sections[path] = Section(key.start_mark.line, entries[0][0].start_mark.line,
+                                          unit_ids)
+
+        frame = '\n'.join(line for line, excluded in zip(self.lines, in_unit) if not excluded)
+        self.frame = hashlib.sha256(frame.encode('utf-8')).hexdigest()
+        self.frame_references = frozenset(name for name in _scalars(root, unit_nodes)
+                                           if name in names)
+
+    def unit_at(self, line):
+        """
+        Returns the id of the unit spanning `line` (0-based), or None.
+        """
+
+        for unit_id, unit in self.units.iteritems():
+            if unit.first <= line <= unit.last:
+                return unit_id
+
+        return None
+
+    def _named(self, names):
+        return set(unit_id for unit_id, unit in self.units.iteritems() if unit.path[-1] in names)
+
+    def affected(self, previous):
+        """
+        Returns the ids of the units that changed since the `previous` version of the
+        document, and of the units that refer to them, directly or not. Returns None when
+        the whole document is affected: the frame changed, or either version could not be
+        split.
+        """
+
+        if previous is None or self.frame is None or self.frame != previous.frame:
+            return None
+
+        affected = set(unit_id for unit_id, unit in self.units.iteritems()
+                       if unit_id not in previous.units or
+                       previous.units[unit_id].digest != unit.digest)
+        names = set(self.units[unit_id].path[-1] for unit_id in affected)
+        names.update(unit.path[-1] for unit_id, unit in previous.units.iteritems()
+                     if unit_id not in self.units)
+
+        while True:
+            dependents = set(unit_id for unit_id, unit in self.units.iteritems()
+                             if unit_id not in affected and unit.references & names)
+
+            if not dependents:
+                return affected
+
+            affected.update(dependents)
+            names.update(self.units[unit_id].path[-1] for unit_id in dependents)
+
+    def closure(self, unit_ids):
+        """
+        Returns `unit_ids` with all the units they and the frame refer to, directly or
+        not.
+        """
+
+        included = set(unit_ids) | self._named(self.frame_references)
+        pending = set(included)
+
+        while pending:
+            names = set()
+
+            for unit_id in pending:
+                names.update(self.units[unit_id].references)
+
+            pending = self._named(names) - included
+            included.update(pending)
+
+        return included
+
+    def prune(self, included):
+        """
+        Returns the text of the document without the units that are not `included`.
+        Excluded lines are blanked rather than removed, so that line numbers are kept.
+        """
+
+        lines = list(self.lines)
+
+        def blank(first, last):
+            for line in xrange(first, last + 1):
+                lines[line] = ''
+
+        emptied = set()
+
+        for path, section in self.sections.iteritems():
+            excluded = [unit_id for unit_id in section.unit_ids if unit_id not in included]
+
+            for unit_id in excluded:
+                blank(self.units[unit_id].first, self.units[unit_id].last)
+
+            if len(excluded) == len(section.unit_ids):
+                blank(section.key_line, section.first - 1)
+                emptied.add(path)
+
+        if self._topology is not None and emptied.issuperset(self._topology[2]):
+            blank(self._topology[0], self._topology[1] - 1)
+
+        return '\n'.join(lines)
+
+    def patched(self, patch):
+        """
+        Returns the text of the document with a JSON merge patch applied. Patches that
+        only add, change or remove units rewrite those units alone, so that the rest of
+        the text (and its line numbers) is kept; other patches rewrite the whole document.
+        """
+
+        raw = yaml.load(self.text, Loader=_LOADER)
+        edits = self._unit_edits(raw, patch) if self.frame is not None else None
+
+        if edits is None:
+            return yaml.safe_dump(merge_patch(raw, patch), default_flow_style=False)
+
+        lines = list(self.lines)
+
+        for first, last, indentation, name, value in sorted(edits, reverse=True):
+            replacement = []
+
+            if value is not None:
+                replacement = [' ' * indentation + line if line else line for line in
+                               yaml.safe_dump({name: value}, default_flow_style=False)
+                               .rstrip('\n').split('\n')]
+
+            lines[first:last + 1] = replacement
+
+        return '\n'.join(lines)
+
+    def _unit_edits(self, raw, patch):
+        """
+        Returns (first line, last line, indentation, name, value) edits of the units
+        changed by `patch`, or None if it changes anything else.
+        """
+
+        if not isinstance(patch, dict):
+            return None
+
+        patched_sections = []
+
+        for name, value in patch.iteritems():
+            if (name,) in self.sections and isinstance(value, dict):
+                patched_sections.append(((name,), value))
+            elif name == TOPOLOGY_TEMPLATE and isinstance(value, dict) and \
+                    all((name, child) in self.sections and isinstance(child_value, dict)
+                        for child, child_value in value.iteritems()):
+                patched_sections.extend(((name, child), child_value)
+                                        for child, child_value in value.iteritems())
+            else:
+                return None
+
+        edits = []
+
+        for path, section_patch in patched_sections:
+            section = self.sections[path]
+            section_raw = raw
+
+            for name in path:
+                section_raw = section_raw[name]
+
+            indentation = len(self.lines[section.first]) - len(self.lines[section.first].lstrip())
+            last = self.units[section.unit_ids[-1]].last
+            remaining = set(section_raw)
+
+            for name, unit_patch in section_patch.iteritems():
+                unit = self.units.get('/'.join(path + (name,)))
+                value = merge_patch(section_raw.get(name), unit_patch) \
+                    if unit_patch is not None else None
+
+                if value is None:
+                    remaining.discard(name)
+                else:
+                    remaining.add(name)
+
+                if unit is not None:
+                    edits.append((unit.first, unit.last, indentation, name, value))
+                elif value is not None:
+                    edits.append((last + 1, last, indentation, name, value))
+
+            if not remaining:
+                return None
+
+        return edits
+
+
+class ValidationSessions(object):
+    """
+    Validates successive versions of a blueprint document, such as the saves of an
+    editor, re-validating only what changed.
+
+    A session keeps the last version of the document and the issues found in it, by
+    unit (see :class:`Blueprint`). A new version is validated without the units that
+    are not affected by its changes (except those that affected units need), and the
+    issues of the unaffected units are kept from the previous versions. Issue lines are
+    kept relative to their unit, so they follow it when lines are added above it.
+
+    Documents are validated from a :class:`ContentStore`, by `validate` (called with the
+    path of the document and returning the list of issues). Sessions are recorded as
+    files in `directory`, so that every server process sharing it can continue them,
+    and expire `ttl` seconds after their last version.
+    """
+
+    DEFAULT_TTL = 3600
+
+    def __init__(self, validate, store, directory=None, ttl=DEFAULT_TTL):
+        self.validate = validate
+        self.store = store
+        self.directory = directory or tempfile.mkdtemp(prefix='aria_rest_sessions')
+        self.ttl = ttl
+        self._purged = 0
+
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, '{0}.json'.format(session_id))
+
+    def _purge(self):
+        now = time.time()
+
+        if now - self._purged < self.ttl / 10.0:
+            return
+
+        self._purged = now
+
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _run(self, blueprint, included=None):
+        """
+        Validates the document, or only its `included` units, and returns its issues
+        outside units and the issues of every validated unit.
+        """
+
+        text = blueprint.text if included is None else blueprint.prune(included)
+        key = self.store.put(text.encode('utf-8'), EXTENSION)
+        name = key + EXTENSION
+        issues = []
+        unit_issues = dict((unit_id, []) for unit_id in
+                           (blueprint.units if included is None else included))
+
+        for issue in self.validate(self.store.path(key, EXTENSION)):
+            unit_id = None
+
+            if issue.get('line') and unicode(issue.get('location') or '').endswith(name):
+                unit_id = blueprint.unit_at(issue['line'] - 1)
+
+            if unit_id is None:
+                issues.append(issue)
+            else:
+                unit_issues.setdefault(unit_id, []).append(
+                    dict(issue, line=issue['line'] - blueprint.units[unit_id].first))
+
+        return issues, unit_issues
+
+    def get(self, session_id):
+        if not JOB_ID_PATTERN.match(session_id):
+            return None
+
+        try:
+            with open(self._path(session_id)) as session_file:
+                return json.load(session_file)
+        except (IOError, ValueError):
+            return None
+
+    def submit(self, text, session_id=None):
+        """
+        Validates a version of the document, in a new session if `session_id` is None.
+        Returns the session, or None if there is no such session.
+        """
+
+        self._purge()
+
+        if isinstance(text, str):
+            text = text.decode('utf-8')
+
+        blueprint = Blueprint(text)
+
+        if session_id is None:
+            session = {'id': uuid.uuid4().hex, 'issues': [], 'units': {}}
+            affected = None
+        else:
+            session = self.get(session_id)
+
+            if session is None:
+                return None
+
+            affected = blueprint.affected(Blueprint(session['document']))
+
+        if affected is None:
+            session['issues'], unit_issues = self._run(blueprint)
+        elif affected:
+            session['issues'], unit_issues = self._run(blueprint, blueprint.closure(affected))
+        else:
+            unit_issues = {}
+
+        session['units'] = dict((unit_id, unit_issues[unit_id]
+                                 if affected is None or unit_id in affected
+                                 else session['units'].get(unit_id, []))
+                                for unit_id in blueprint.units)
+        session['document'] = text
+        session['revalidated'] = len(blueprint.units) if affected is None else len(affected)
+        session['updated'] = time.time()
+
+        write_atomically(self._path(session['id']), json.dumps(session))
+
+        return session
+
+    def patch(self, session_id, patch):
+        """
+        Like :code:`submit` for the last version of the document with a JSON merge patch
+        applied.
+        """
+
+        session = self.get(session_id)
+
+        if session is None:
+            return None
+
+        return self.submit(Blueprint(session['document']).patched(patch), session_id)
+
+    def issues(self, session):
+        """
+        Returns all the issues of a session, with the lines of unit issues in its last
+        version of the document.
+        """
+
+        blueprint = Blueprint(session['document'])
+        issues = list(session['issues'])
+
+        for unit_id, unit in blueprint.units.iteritems():
+            issues.extend(dict(issue, line=issue['line'] + unit.first)
+                          for issue in session['units'].get(unit_id, ()))
+
+        return issues
+
+    def remove(self, session_id):
+        if not JOB_ID_PATTERN.match(session_id):
+            return False
+
+        try:
+            os.remove(self._path(session_id))
+            return True
+        except OSError:
+            return False
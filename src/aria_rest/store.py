@@ -0,0 +1,250 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+import json
+import os
+import re
+import stat
+import tempfile
+import time
+
+from .cache import fingerprint
+from .jobs import write_atomically
+
+KEY_PATTERN = re.compile('^[0-9a-f]{64}$')
+STORED_NAME_PATTERN = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+
+
+class ContentStore(object):
+    """
+    Files named by the SHA-256 hash of their content, bounded by their total size: the
+    least recently stored files are removed first.
+
+    Files are written atomically and never modified, so all processes sharing the
+    `directory` can use them.
+
+    Rather than scanning the directory every time a file is stored, every process keeps
+    a running total of the size of the files, and only scans once the total exceeds
+    `max_bytes`, or every :code:`PURGE_INTERVAL` seconds to account for the files that
+    other processes store.
+    """
+
+    DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+    PURGE_INTERVAL = 60
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._purged = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def key(content):
+        return hashlib.sha256(content).hexdigest()
+
+    def path(self, key, extension=''):
+        """
+        :raises ValueError: when `key` is not a content hash
+        """
+
+        if not KEY_PATTERN.match(key):
+            raise ValueError('Not a content key: {0}'.format(key))
+
+        return os.path.join(self.directory, key + extension)
+
+    def temporary_file(self):
+        """
+        Returns a (file, path) pair for writing content that is then stored with
+        :code:`put_file`.
+        """
+
+        descriptor, path = tempfile.mkstemp(dir=self.directory)
+        return os.fdopen(descriptor, 'wb'), path
+
+    def put(self, content, extension=''):
+        """
+        Stores `content`, and returns its key.
+        """
+
+        key = self.key(content)
+        path = self.path(key, extension)
+
+        if os.path.exists(path):
+            os.utime(path, None)
+        else:
+            write_atomically(path, content)
+            self._purge(path, len(content))
+
+        return key
+
+    def put_file(self, temporary_path, key, extension=''):
+        """
+        Stores the temporary file (see :code:`temporary_file`) whose content hash is
+        `key`, and returns its path.
+        """
+
+        path = self.path(key, extension)
+
+        if os.path.exists(path):
+            os.remove(temporary_path)
+            os.utime(path, None)
+        else:
+            os.rename(temporary_path, path)
+            self._purge(path, os.path.getsize(path))
+
+        return path
+
+    def remove(self, key, extension=''):
+        try:
+            os.remove(self.path(key, extension))
+        except OSError:
+            pass
+
+    @property
+    def is_private(self):
+        """
+        Whether the directory belongs to the current user and no other user can write to it.
+        """
+
+        try:
+            directory_stat = os.stat(self.directory)
+        except OSError:
+            return False
+
+        return directory_stat.st_uid == os.getuid() and \
+            not directory_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    def _purge(self, kept_path, stored_bytes):
+        """
+        Removes the least recently stored files beyond `max_bytes`, other than `kept_path`,
+        which was just stored with `stored_bytes` bytes.
+        """
+
+        now = time.time()
+
+        if self._size is not None:
+            self._size += stored_bytes
+
+            if self._size <= self.max_bytes and now - self._purged < self.PURGE_INTERVAL:
+                return
+
+        self._purged = now
+        files = []
+
+        for name in os.listdir(self.directory):
+            # Temporary files being written are left alone
+            if not STORED_NAME_PATTERN.match(name):
+                continue
+
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+
+            if path == kept_path:
+                continue
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            total -= size
+
+        self._size = total
+
+
+class ResultStore(ContentStore):
+    """
+    Results derived from files, such as serialized parse results, stored under keys that
+    hash what they were derived from (see :func:`content_key`). A result is only loaded
+    while the files it depends on are unchanged, so the store can outlive the server.
+
+    Files are stamped with `version` (of ARIA, see :func:`result_version`) in their
+    extension: results of other versions are never loaded, but they are left for the
+    servers of that version still sharing the `directory` (during a rolling upgrade),
+    until they are removed as least recently used. Like other stored files, results are
+    written atomically and the least recently used are removed first, so all processes
+    sharing the `directory`, including other servers on a shared filesystem, can use them.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), 'aria_rest_results')
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=ContentStore.DEFAULT_MAX_BYTES,
+                 version=''):
+        super(ResultStore, self).__init__(directory, max_bytes)
+        self.extension = '.' + hashlib.sha256(version).hexdigest()[:16]
+
+    def load(self, key):
+        """
+        Returns the (data, dependencies) pair saved under `key`, or None.
+        """
+
+        path = self.path(key, self.extension)
+
+        try:
+            with open(path, 'rb') as result_file:
+                header = result_file.readline()
+                data = result_file.read()
+        except IOError:
+            return None
+
+        try:
+            dependencies = tuple((dependency, tuple(file_fingerprint))
+                                 for dependency, file_fingerprint in json.loads(header))
+        except (TypeError, ValueError):
+            return None
+
+        for dependency, file_fingerprint in dependencies:
+            if fingerprint(dependency) != file_fingerprint:
+                self.remove(key, self.extension)
+                return None
+
+        try:
+            # Keeps it from being removed as least recently used
+            os.utime(path, None)
+        except OSError:
+            return None
+
+        return data, dependencies
+
+    def save(self, key, data, dependencies=()):
+        """
+        :param dependencies - iterable of (path, fingerprint) pairs, see :func:`fingerprint`
+        """
+
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+
+        if len(data) > self.max_bytes:
+            return
+
+        path = self.path(key, self.extension)
+        content = json.dumps(list(dependencies)) + '\n' + data
+        write_atomically(path, content)
+        self._purge(path, len(content))
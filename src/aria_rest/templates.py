@@ -0,0 +1,85 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+
+from aria.parser.reading.jinja import CONTEXT as ARIA_CONTEXT
+from jinja2.sandbox import SandboxedEnvironment
+
+from .cache import LruCache, fingerprint
+
+
+class TemplateCache(LruCache):
+    """
+    Compiled Jinja blueprint templates, bounded by their number. Template files are kept
+    for as long as they do not change, uploaded templates by the hash of their source.
+
+    Templates are rendered in a sandbox, since they may come from clients, with the same
+    variables that ARIA renders :code:`.jinja` files with (see :code:`context`).
+    """
+
+    DEFAULT_MAX_ENTRIES = 64
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        super(TemplateCache, self).__init__(max_entries)
+        self.environment = SandboxedEnvironment()
+
+    @staticmethod
+    def context(path=None):
+        """
+        Variables available to every template. The environment of the server is only
+        available to template files, not to uploaded templates.
+        """
+
+        if path is not None:
+            return dict(ARIA_CONTEXT)
+
+        return dict((name, value) for name, value in ARIA_CONTEXT.iteritems() if name != 'ENV')
+
+    def compile(self, source):
+        """
+        :raises jinja2.TemplateSyntaxError: when the template is not valid
+        """
+
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+
+        key = hashlib.sha256(source).hexdigest()
+        template = self.get(key)
+
+        if template is None:
+            template = self.environment.from_string(source.decode('utf-8'))
+            self.put(key, template, 1)
+
+        return template
+
+    def load(self, path):
+        """
+        :raises IOError: when the file cannot be read
+        :raises jinja2.TemplateSyntaxError: when the template is not valid
+        """
+
+        template = self.get(path)
+
+        if template is None:
+            file_fingerprint = fingerprint(path)
+
+            with open(path) as template_file:
+                template = self.environment.from_string(template_file.read().decode('utf-8'))
+
+            self.put(path, template, 1, [(path, file_fingerprint)])
+
+        return template
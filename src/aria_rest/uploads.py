@@ -0,0 +1,163 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import hashlib
+import os
+from StringIO import StringIO
+
+from flask import has_request_context, request
+from werkzeug.wsgi import get_content_length
+
+from .archives import ZIP_SIGNATURE, ArchiveCache
+
+SPOOLED_BODY = 'aria_rest.spooled_body'
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def spooled_body():
+    """
+    The (key, path) pair of the stored body of the current request if it was spooled,
+    else None.
+    """
+
+    return request.environ.get(SPOOLED_BODY) if has_request_context() else None
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+def _too_large(start_response, max_bytes):
+    body = 'Request body exceeds {0} bytes'.format(max_bytes)
+    start_response('413 Request Entity Too Large', [('Content-Type', 'text/plain'),
+                                                    ('Content-Length', str(len(body))),
+                                                    ('Connection', 'close')])
+    return [body]
+
+
+class UploadSpooler(object):
+    """
+    WSGI middleware bounding request bodies: a body declared larger than `max_bytes` is
+    refused with a 413 before it is read, and others are read incrementally. Bodies of
+    unknown length, such as chunked ones, are read by the middleware itself (when the
+    server supports them, see :code:`wsgi.input_terminated`) and refused with a 413 as
+    soon as more than `max_bytes` were read.
+
+    Bodies larger than `threshold` bytes (except JSON, which is parsed whole anyway) are
+    written to a :class:`ContentStore` as they are read, rather than kept in memory, and
+    are not passed to the application: it finds their stored file with
+    :func:`spooled_body` instead.
+    Archives are stored as :code:`.zip` files, so that :class:`ArchiveCache` can open
+    them, and blueprints as :code:`.yaml` files, so that they can be parsed from there.
+    """
+
+    DEFAULT_THRESHOLD = 1024 * 1024
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+    BLUEPRINT_EXTENSION = '.yaml'
+
+    def __init__(self, store, threshold=DEFAULT_THRESHOLD, max_bytes=DEFAULT_MAX_BYTES,
+                 app=None):
+        """
+        :param app - the WSGI application, which can also be set later
+        """
+
+        self.store = store
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self.app = app
+
+    def _spool(self, stream, length=None, spool=True):
+        """
+        Reads `length` bytes from `stream` (up to its end if None), and returns them, or
+        the (key, path) pair of the stored file if they are more than the threshold and
+        `spool` is true.
+
+        :raises UploadTooLargeError: as soon as more than `max_bytes` bytes were read
+        """
+
+        chunks = []
+        digest = hashlib.sha256()
+        spool_file = spool_path = None
+        size = 0
+
+        try:
+            while length is None or size < length:
+                chunk = stream.read(READ_CHUNK_SIZE if length is None
+                                    else min(READ_CHUNK_SIZE, length - size))
+
+                if not chunk:
+                    break
+
+                size += len(chunk)
+
+                if size > self.max_bytes:
+                    raise UploadTooLargeError()
+
+                digest.update(chunk)
+
+                if spool_file is None:
+                    chunks.append(chunk)
+
+                    if spool and size > self.threshold:
+                        spool_file, spool_path = self.store.temporary_file()
+                        spool_file.write(''.join(chunks))
+                        signature = chunks[0][:len(ZIP_SIGNATURE)]
+                else:
+                    spool_file.write(chunk)
+
+            if spool_file is None:
+                return ''.join(chunks)
+
+            spool_file.close()
+        except BaseException:
+            if spool_file is not None:
+                spool_file.close()
+                os.remove(spool_path)
+            raise
+
+        key = digest.hexdigest()
+        extension = ArchiveCache.EXTENSION if signature == ZIP_SIGNATURE \
+            else self.BLUEPRINT_EXTENSION
+
+        return key, self.store.put_file(spool_path, key, extension)
+
+    def __call__(self, environ, start_response):
+        length = get_content_length(environ)
+        is_json = 'json' in environ.get('CONTENT_TYPE', '')
+        terminated = environ.get('wsgi.input_terminated')
+
+        if length is not None and length > self.max_bytes:
+            return _too_large(start_response, self.max_bytes)
+
+        # Without a terminated input, bodies of unknown length are not read at all
+        if not terminated and (length is None or length <= self.threshold or is_json):
+            return self.app(environ, start_response)
+
+        try:
+            body = self._spool(environ['wsgi.input'], None if terminated else length,
+                               spool=not is_json)
+        except UploadTooLargeError:
+            return _too_large(start_response, self.max_bytes)
+
+        if isinstance(body, tuple):
+            environ[SPOOLED_BODY] = body
+            body = ''
+
+        environ['wsgi.input'] = StringIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ.pop('HTTP_TRANSFER_ENCODING', None)
+
+        return self.app(environ, start_response)
@@ -0,0 +1,104 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import json
+import platform
+import sys
+from argparse import ArgumentParser
+
+from aria import install_aria_extensions
+
+from .measures import compare
+from .suite import benchmark_http, benchmark_in_process
+
+MODES = {
+    'in-process': ('in_process', benchmark_in_process),
+    'http': ('http', benchmark_http)
+}
+
+
+class BenchmarkArgumentParser(ArgumentParser):
+
+    def __init__(self):
+        super(BenchmarkArgumentParser, self).__init__(description='ARIA parsing benchmarks',
+                                                      prog='benchmarks')
+        self.add_argument('--mode',
+                          choices=sorted(MODES) + ['all'],
+                          help='measure stages in-process, endpoints over HTTP, or both',
+                          default='all')
+        self.add_argument('--repetitions',
+                          type=int,
+                          help='timed runs per blueprint and stage',
+                          default=20)
+        self.add_argument('--warmup',
+                          type=int,
+                          help='untimed runs per blueprint and stage before the timed ones',
+                          default=2)
+        self.add_argument('--output',
+                          help='JSON results file (defaults to standard output)')
+        self.add_argument('--baseline',
+                          help='JSON results of a previous run to compare with')
+        self.add_argument('--threshold',
+                          type=float,
+                          help='relative growth of a measure over the baseline reported as a '
+                               'regression',
+                          default=0.2)
+
+
+def aria_version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('aria').version
+    except Exception:
+        return None
+
+
+def main():
+    arguments = BenchmarkArgumentParser().parse_args()
+    install_aria_extensions()
+
+    modes = sorted(MODES) if arguments.mode == 'all' else [arguments.mode]
+    report = {
+        'aria': aria_version(),
+        'python': platform.python_version(),
+        'repetitions': arguments.repetitions,
+        'results': dict((MODES[mode][0], MODES[mode][1](arguments.repetitions, arguments.warmup))
+                        for mode in modes)
+    }
+
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        report['regressions'] = compare(report['results'], baseline['results'],
+                                        arguments.threshold)
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output:
+            output.write(text)
+    else:
+        print text
+
+    for regression in report.get('regressions', ()):
+        print >> sys.stderr, 'Regression in {mode} {blueprint} {stage} {measure}: ' \
+                             '{baseline:.4g} -> {current:.4g} ({change:+.0%})'.format(**regression)
+
+    return 1 if report.get('regressions') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
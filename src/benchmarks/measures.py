@@ -0,0 +1,87 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import math
+
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of `values`.
+    """
+
+    ordered = sorted(values)
+    rank = int(math.ceil(percent / 100.0 * len(ordered)))
+
+    return ordered[max(rank, 1) - 1]
+
+
+def summarize(seconds, peak_rss_kb=None):
+    """
+    Latency percentiles (in seconds) and throughput (per second) of the timed runs.
+    """
+
+    summary = {
+        'runs': len(seconds),
+        'mean': sum(seconds) / len(seconds),
+        'min': min(seconds),
+        'max': max(seconds),
+        'throughput': len(seconds) / sum(seconds) if sum(seconds) else None,
+        'peak_rss_kb': peak_rss_kb
+    }
+
+    for percent in PERCENTILES:
+        summary['p{0}'.format(percent)] = percentile(seconds, percent)
+
+    return summary
+
+
+def compare(results, baseline, threshold, fields=('p50', 'p90', 'peak_rss_kb', 'peak_growth_kb')):
+    """
+    Compares two benchmark results (nested dicts of mode, blueprint and stage) and
+    returns the regressions: measures that grew by more than `threshold` (a fraction)
+    relative to the baseline. Measures missing from either side are skipped.
+    """
+
+    regressions = []
+
+    for mode, blueprints in sorted(results.iteritems()):
+        for blueprint, stages in sorted(blueprints.iteritems()):
+            for stage, summary in sorted(stages.iteritems()):
+                base = baseline.get(mode, {}).get(blueprint, {}).get(stage)
+
+                if base is None:
+                    continue
+
+                for field in fields:
+                    current, previous = summary.get(field), base.get(field)
+
+                    if current is None or not previous:
+                        continue
+
+                    change = float(current - previous) / previous
+
+                    if change > threshold:
+                        regressions.append({'mode': mode,
+                                            'blueprint': blueprint,
+                                            'stage': stage,
+                                            'measure': field,
+                                            'baseline': previous,
+                                            'current': current,
+                                            'change': change})
+
+    return regressions
@@ -0,0 +1,276 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import json
+import os
+import signal
+import socket
+import tempfile
+import time
+import traceback
+
+import requests
+from aria.parser.consumption import ConsumerChain, Read, Validate, Model, Inputs, Instance
+
+from aria_rest.api import AriaRestApi, create_controllers
+from aria_rest.argparser import AriaRestArgumentParser
+from aria_rest.aria_customisation import ConsumptionContextBuilder
+from aria_rest.memory import PeakMemory
+
+from .measures import summarize
+
+BLUEPRINTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'blueprints'))
+
+# (name, blueprint, inputs), relative to BLUEPRINTS_DIR
+BLUEPRINTS = (
+    ('node-cellar', 'tosca/node-cellar/node-cellar.yaml', 'tosca/node-cellar/inputs.yaml'),
+    ('wordpress', 'tosca/wordpress/tosca_single_instance_wordpress.yaml', None),
+    ('cloudify-simple', 'cloudify/simple-blueprint.yaml', None))
+
+STAGES = (Read, Validate, Model, Inputs, Instance)
+
+# Endpoint and the stages it runs
+ENDPOINTS = (('validate', 2), ('model', 3), ('instance', 5))
+
+# Remote imports are fetched once and revalidated afterwards, so that the network does
+# not dominate the measures
+LOADER_SOURCE = 'aria_rest.aria_customisation.HttpLoaderSource'
+
+READY_TIMEOUT = 120
+
+# No caching and no parser processes, so that every request is parsed in the server
+SERVER_ARGUMENTS = ('--cache-size', '0', '--read-cache-size', '0', '--snapshots', '0',
+                    '--result-store-size', '0', '--parsers', '0')
+
+
+def peak_rss_kb(pid):
+    """
+    Peak resident set size of process `pid` (Linux only, None if it cannot be read).
+    """
+
+    try:
+        with open('/proc/{0}/status'.format(pid)) as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+
+    return None
+
+
+def reset_peak_rss(pid):
+    try:
+        with open('/proc/{0}/clear_refs'.format(pid), 'w') as clear_refs:
+            clear_refs.write('5')
+    except IOError:
+        pass
+
+
+def in_child(function, *args):
+    """
+    Calls `function` in a forked process and returns its JSON-serializable result, so
+    that peak memory is measured for that call alone.
+    """
+
+    reader, writer = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        os.close(reader)
+
+        try:
+            try:
+                result = function(*args)
+            except Exception:
+                result = {'error': traceback.format_exc()}
+
+            with os.fdopen(writer, 'w') as output:
+                json.dump(result, output)
+        finally:
+            os._exit(0)
+
+    os.close(writer)
+
+    with os.fdopen(reader) as result_input:
+        result = json.loads(result_input.read())
+
+    os.waitpid(pid, 0)
+
+    if isinstance(result, dict) and 'error' in result:
+        raise RuntimeError(result['error'])
+
+    return result
+
+
+def _paths(blueprint, inputs):
+    return os.path.join(BLUEPRINTS_DIR, blueprint), \
+        os.path.join(BLUEPRINTS_DIR, inputs) if inputs else None
+
+
+def consume_stages(uri, inputs):
+    """
+    Consumes a blueprint one stage at a time, up to the first stage with issues.
+    Returns the seconds spent in every stage, the peak memory growth during every stage
+    (in KB, see :class:`PeakMemory`) and the number of issues.
+    """
+
+    context = ConsumptionContextBuilder(uri=uri, inputs=inputs,
+                                        loader_source=LOADER_SOURCE).build()
+    seconds = []
+    growth = []
+
+    for stage in STAGES:
+        with PeakMemory() as memory:
+            started = time.time()
+            ConsumerChain(context, (stage,)).consume()
+            seconds.append(time.time() - started)
+
+        growth.append(memory.growth // 1024)
+
+        if context.validation.has_issues:
+            break
+
+    return seconds, growth, len(context.validation.issues)
+
+
+def _benchmark_in_process(uri, inputs, repetitions, warmup):
+    for _ in range(warmup):
+        consume_stages(uri, inputs)
+
+    seconds = [[] for _ in STAGES]
+    growth = [0] * len(STAGES)
+    issues = 0
+
+    for _ in range(repetitions):
+        run_seconds, run_growth, issues = consume_stages(uri, inputs)
+
+        for index, stage_seconds in enumerate(run_seconds):
+            seconds[index].append(stage_seconds)
+            growth[index] = max(growth[index], run_growth[index])
+
+    results = {}
+
+    for index, stage in enumerate(STAGES):
+        if seconds[index]:
+            results[stage.__name__] = dict(summarize(seconds[index]),
+                                           peak_growth_kb=growth[index], issues=issues)
+
+    return results
+
+
+def benchmark_in_process(repetitions, warmup):
+    """
+    Times every stage over the bundled blueprints in this process (every blueprint in a
+    forked process of its own). Returns summaries by blueprint and stage, with the peak
+    memory growth of every stage rather than the peak RSS of the process.
+    """
+
+    return dict((name, in_child(_benchmark_in_process, *(_paths(blueprint, inputs) +
+                                                         (repetitions, warmup))))
+                for name, blueprint, inputs in BLUEPRINTS)
+
+
+def _free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    return port
+
+
+def create_server(port, rundir):
+    """
+    Creates the :class:`AriaRestApi` server that is benchmarked: all the controllers, as
+    configured by :code:`SERVER_ARGUMENTS`, with their files in `rundir`.
+    """
+
+    arguments = AriaRestArgumentParser().parse_args(('--port', str(port), '--rundir', rundir) +
+                                                    SERVER_ARGUMENTS)
+
+    return AriaRestApi(port=port, controllers=create_controllers(arguments))
+
+
+def _serve(port):
+    create_server(port, tempfile.mkdtemp(prefix='aria_rest_benchmark')).run()
+
+
+def benchmark_http(repetitions, warmup):
+    """
+    Times the validate, model and instance endpoints over the bundled blueprints,
+    through an :class:`AriaRestApi` server in a forked process. The peak RSS is the
+    server's. Returns summaries by blueprint and endpoint.
+    """
+
+    port = _free_port()
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            _serve(port)
+        finally:
+            os._exit(0)
+
+    url = 'http://127.0.0.1:{0}'.format(port)
+    session = requests.Session()
+    results = {}
+
+    try:
+        deadline = time.time() + READY_TIMEOUT
+
+        while True:
+            try:
+                if session.get(url + '/ready').status_code == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+
+            if time.time() > deadline:
+                raise RuntimeError('server not ready after {0} seconds'.format(READY_TIMEOUT))
+            time.sleep(0.1)
+
+        for name, blueprint, inputs in BLUEPRINTS:
+            path, inputs_path = _paths(blueprint, inputs)
+            results[name] = {}
+
+            for endpoint, stages in ENDPOINTS:
+                params = {'path': path}
+
+                if inputs_path and endpoint == 'instance':
+                    params['inputs'] = inputs_path
+
+                for _ in range(warmup):
+                    session.get('{0}/{1}'.format(url, endpoint), params=params)
+
+                reset_peak_rss(pid)
+                seconds = []
+
+                for _ in range(repetitions):
+                    started = time.time()
+                    response = session.get('{0}/{1}'.format(url, endpoint), params=params)
+                    seconds.append(time.time() - started)
+                    response.raise_for_status()
+
+                results[name][endpoint] = dict(summarize(seconds, peak_rss_kb(pid)),
+                                               issues=len(response.json().get('issues', ())),
+                                               stages=[stage.__name__
+                                                       for stage in STAGES[:stages]])
+    finally:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+
+    return results
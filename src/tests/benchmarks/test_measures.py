@@ -0,0 +1,37 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+from benchmarks.measures import compare, percentile, summarize
+
+
+def test_percentiles_and_throughput():
+    summary = summarize([0.1 * value for value in range(1, 11)], 1000)
+    assert summary['runs'] == 10
+    assert summary['p50'] == 0.5
+    assert summary['p90'] == 0.9
+    assert summary['p99'] == 1.0
+    assert abs(summary['throughput'] - 10 / 5.5) < 1e-9
+    assert percentile([3], 50) == 3
+
+
+def test_regressions():
+    baseline = {'http': {'wordpress': {'validate': {'p50': 0.1, 'p90': 0.2, 'peak_rss_kb': 100}}}}
+    results = {'http': {'wordpress': {'validate': {'p50': 0.15, 'p90': 0.21, 'peak_rss_kb': 100},
+                                      'model': {'p50': 1.0}}}}
+
+    regressions = compare(results, baseline, 0.2)
+    assert [(regression['stage'], regression['measure']) for regression in regressions] == \
+        [('validate', 'p50')]
+    assert compare(results, baseline, 0.6) == []
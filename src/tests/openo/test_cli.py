@@ -25,4 +25,13 @@ def test_help_display(capsys):
         with patch.object(sys, 'argv', testargs):
             openomain.main()
     out, err = capsys.readouterr()
-    assert err.startswith('usage: aria-rest')
\ No newline at end of file
+    assert err.startswith('usage: aria-rest')
+
+def test_stop_unregisters():
+    testargs = ['aria-openo', 'stop', '--ip', '127.0.0.1', '--msb_ip', '127.0.0.1']
+    with patch.object(sys, 'argv', testargs), \
+            patch.object(openomain, 'stop_daemon') as stop_daemon, \
+            patch.object(openomain.ServiceRegistration, 'unregister') as unregister:
+        openomain.main()
+    assert stop_daemon.called
+    unregister.assert_called_once_with(missing_ok=True)
\ No newline at end of file
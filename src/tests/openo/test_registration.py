@@ -14,11 +14,217 @@
 # under the License.
 #
 
+import json
+import os
+import signal
+import tempfile
+import threading
+import time
+import warnings
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
 import pytest
 from aria_openo.registration import ServiceRegistration
+from aria_rest.affinity import AffinityRing
+from aria_rest.load import RequestLoad
+
+
+class StandInMsb(ThreadingMixIn, HTTPServer):
+    """
+    Local stand-in for the Microservice Bus, recording the requests it gets with the port
+    of the client connection they came on, and the nodes registered with it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, failures=0, delay=0):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StandInMsbHandler)
+        self.failures = failures
+        self.delay = delay
+        self.requests = []
+        self.nodes = {}
+        self.url = 'http://127.0.0.1:{0}/openoapi/microservices/v1/services'.format(
+            self.server_port)
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+class StandInMsbHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self, status, body=''):
+        self.server.requests.append((self.command, self.client_address[1]))
+        time.sleep(self.server.delay)
+
+        if self.server.failures:
+            self.server.failures -= 1
+            status = 500
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        service = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)))
+
+        for node in service['nodes']:
+            self.server.nodes[node['nodeId']] = node
+
+        self._respond(201)
+
+    def do_GET(self):
+        self._respond(200, json.dumps({'nodes': self.server.nodes.values()}))
+
+    def do_DELETE(self):
+        node_id = ':'.join(self.path.rsplit('/', 2)[1:])
+        self._respond(204 if self.server.nodes.pop(node_id, None) is not None else 404)
+
+    def log_message(self, *args):
+        pass
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
 
 def test_registration_failure():
     with pytest.raises(Exception):
         reg = ServiceRegistration('127.0.0.1', 0, 'test', '1.0', 'http://test')
         reg.register()
-    assert reg.is_registered == False
\ No newline at end of file
+    assert reg.is_registered == False
+
+
+def test_registration_retries_with_backoff():
+    msb = StandInMsb(failures=2)
+    registration = ServiceRegistration('127.0.0.1', 8204, 'tosca', 'v1', msb.url, heartbeat=0,
+                                       backoff=0.01)
+    registration.start()
+
+    assert wait_for(lambda: registration.is_registered)
+    assert [method for method, _ in msb.requests] == ['POST', 'POST', 'POST']
+
+    registration.stop()
+    assert [method for method, _ in msb.requests][-1] == 'DELETE'
+    assert not registration.is_registered
+
+
+def test_heartbeats_reuse_the_connection():
+    msb = StandInMsb()
+    registration = ServiceRegistration('127.0.0.1', 8204, 'tosca', 'v1', msb.url, heartbeat=0.01)
+    registration.start()
+
+    assert wait_for(lambda: len(msb.requests) >= 3)
+    registration.stop()
+    assert len(set(port for _, port in msb.requests)) == 1
+
+
+def test_slow_msb_does_not_block():
+    msb = StandInMsb(delay=1)
+    registration = ServiceRegistration('127.0.0.1', 8204, 'tosca', 'v1', msb.url, timeout=0.1,
+                                       heartbeat=0, backoff=10)
+    started = time.time()
+    registration.start()
+
+    assert time.time() - started < 0.1
+    assert wait_for(lambda: msb.requests)
+
+    registration.stop()
+    assert time.time() - started < 1
+    assert not registration.is_registered
+
+
+def test_registration_publishes_port_instance_and_weight():
+    msb = StandInMsb()
+    load = RequestLoad(capacity=4)
+    load._add(3)
+    registration = ServiceRegistration('127.0.0.1', 8300, 'tosca', 'v1', msb.url,
+                                       instance_id='replica-1', load=load)
+    registration.register()
+
+    assert msb.nodes == {'replica-1': {'ip': '127.0.0.1', 'port': '8300', 'nodeId': 'replica-1',
+                                       'lb_server_params': 'weight=25'}}
+
+
+def test_weight_changes_are_registered_between_heartbeats():
+    msb = StandInMsb()
+    load = RequestLoad(capacity=4)
+    registration = ServiceRegistration('127.0.0.1', 8300, 'tosca', 'v1', msb.url, heartbeat=60,
+                                       weight_interval=0.01, load=load)
+    registration.start()
+
+    assert wait_for(lambda: msb.nodes)
+    assert msb.nodes['127.0.0.1:8300']['lb_server_params'] == 'weight=100'
+
+    load._add(2)
+    assert wait_for(lambda: msb.nodes['127.0.0.1:8300']['lb_server_params'] == 'weight=50')
+    registration.stop()
+
+def test_registration_updates_affinity_ring():
+    msb = StandInMsb()
+    msb.nodes['other'] = {'ip': '127.0.0.2', 'port': '8204', 'nodeId': 'other'}
+    ring = AffinityRing(tempfile.mktemp())
+    registration = ServiceRegistration('127.0.0.1', 8300, 'tosca', 'v1', msb.url, heartbeat=0,
+                                       affinity=ring)
+    registration.start()
+
+    assert wait_for(lambda: ring.replicas)
+    registration.stop()
+    assert ring.replicas == ['127.0.0.1:8300', '127.0.0.2:8204']
+
+
+def test_affinity_failure_keeps_registration():
+    msb = StandInMsb()
+    ring = AffinityRing(os.path.join(tempfile.mkdtemp(), 'missing', 'replicas'))
+    registration = ServiceRegistration('127.0.0.1', 8300, 'tosca', 'v1', msb.url, heartbeat=0.01,
+                                       affinity=ring)
+    registration.start()
+
+    assert wait_for(lambda: len([method for method, _ in msb.requests if method == 'POST']) >= 3)
+    assert registration.is_registered
+    registration.stop()
+
+
+def test_unregistering_a_missing_node():
+    msb = StandInMsb()
+    registration = ServiceRegistration('127.0.0.1', 8204, 'tosca', 'v1', msb.url)
+    registration.register()
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+
+        registration.unregister(missing_ok=True)
+        registration.unregister(missing_ok=True)
+        assert not caught
+
+        registration.unregister()
+        assert len(caught) == 1
+
+
+def test_terminating_unregisters():
+    msb = StandInMsb()
+    registration = ServiceRegistration('127.0.0.1', 8300, 'tosca', 'v1', msb.url, heartbeat=0.01)
+
+    def terminate(*_):
+        # As the daemon context does
+        raise SystemExit('Terminating')
+
+    previous = signal.signal(signal.SIGTERM, terminate)
+
+    try:
+        with pytest.raises(SystemExit):
+            with registration:
+                registration.start()
+                assert wait_for(lambda: registration.is_registered)
+                os.kill(os.getpid(), signal.SIGTERM)
+                time.sleep(5)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+
+    assert registration._thread is None
+    assert not registration.is_registered
+    assert [method for method, _ in msb.requests][-1] == 'DELETE'
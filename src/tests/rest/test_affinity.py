@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+
+from flask import Flask
+from werkzeug.test import Client
+from werkzeug.wrappers import BaseResponse
+
+import aria_rest.cache
+from aria_rest.affinity import AffinityRing, blueprint_key
+from aria_rest.cache import ParseResultCache
+from aria_rest.load import RequestLoad
+
+
+def test_blueprint_key_ignores_other_parameters():
+    key = blueprint_key({'uri': 'blueprint.yaml'})
+
+    assert blueprint_key({'uri': 'blueprint.yaml', 'inputs': {'a': 1}}) == key
+    assert blueprint_key({'uri': 'other.yaml'}) != key
+
+
+def test_blueprint_is_read_once_for_all_keys(tmpdir, monkeypatch):
+    blueprint = tmpdir.join('blueprint.yaml')
+    blueprint.write('a: 1')
+    data = {'uri': str(blueprint)}
+    opened = []
+
+    def counting_open(path, *args):
+        opened.append(path)
+        return open(path, *args)
+
+    monkeypatch.setattr(aria_rest.cache, 'open', counting_open, raising=False)
+
+    blueprint_key(data)
+    ParseResultCache.key(data, (), 'render')
+    blueprint_key(data)
+    assert opened == [str(blueprint)]
+
+
+def test_ring_maps_keys_to_replicas(tmpdir):
+    ring = AffinityRing(os.path.join(str(tmpdir), 'replicas'))
+    assert ring.owner('key') is None
+
+    ring.update(['10.0.0.1:8204', '10.0.0.2:8204'])
+    owners = dict((str(key), ring.owner(str(key))) for key in range(200))
+    assert set(owners.values()) == set(['10.0.0.1:8204', '10.0.0.2:8204'])
+
+    # Another process sees the same ring
+    assert AffinityRing(ring.path).owner('7') == owners['7']
+
+
+def test_ring_remaps_only_the_keys_of_a_new_replica(tmpdir):
+    ring = AffinityRing(os.path.join(str(tmpdir), 'replicas'))
+    ring.update(['10.0.0.1:8204', '10.0.0.2:8204'])
+    before = dict((str(key), ring.owner(str(key))) for key in range(200))
+
+    ring.update(['10.0.0.1:8204', '10.0.0.2:8204', '10.0.0.3:8204'])
+    moved = [key for key in before if ring.owner(key) != before[key]]
+
+    assert moved
+    assert all(ring.owner(key) == '10.0.0.3:8204' for key in moved)
+
+
+def test_request_load_counts_until_response_closes():
+    app = Flask(__name__)
+    load = RequestLoad(capacity=2)
+
+    @app.route('/')
+    def index():
+        return str(load.in_flight)
+
+    load.app = app.wsgi_app
+    app.wsgi_app = load
+
+    response = Client(app, BaseResponse).get('/')
+    assert response.data == '1'
+    assert load.in_flight == 1
+
+    response.close()
+    assert load.in_flight == 0
+    assert load.weight(10) == 10
@@ -0,0 +1,53 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+from aria_rest.api import ADMIN_TOKEN_VARIABLE, AriaRestApi, _admin_token, instantiate_controllers
+from aria_rest.argparser import AriaRestArgumentParser
+from aria_rest.controllers import JobController, MetricsController, ParseController
+
+
+def test_default_controllers_share_a_parse_controller():
+    controllers = instantiate_controllers(AriaRestApi.DEFAULT_CONTROLLERS)
+    parse_controller = controllers[0]
+
+    assert isinstance(parse_controller, ParseController)
+    assert len(controllers) == len(AriaRestApi.DEFAULT_CONTROLLERS)
+    for controller in controllers[1:]:
+        assert getattr(controller, 'parse_controller', parse_controller) is parse_controller
+
+
+def test_given_parse_controller_is_shared():
+    parse_controller = ParseController()
+    metrics_controller = MetricsController()
+
+    controllers = instantiate_controllers([JobController, parse_controller, metrics_controller])
+
+    assert controllers[0].parse_controller is parse_controller
+    assert controllers[1:] == [parse_controller, metrics_controller]
+
+
+def test_admin_token(tmpdir, monkeypatch):
+    parser = AriaRestArgumentParser()
+    token_file = tmpdir.join('token')
+    token_file.write('from file\n')
+
+    monkeypatch.delenv(ADMIN_TOKEN_VARIABLE, raising=False)
+    assert _admin_token(parser.parse_args(['start'])) is None
+
+    monkeypatch.setenv(ADMIN_TOKEN_VARIABLE, 'from environment')
+    assert _admin_token(parser.parse_args(['start'])) == 'from environment'
+    assert _admin_token(parser.parse_args(['start', '--admin-token-file', str(token_file)])) == \
+        'from file'
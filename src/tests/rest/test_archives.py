@@ -0,0 +1,89 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import zipfile
+from StringIO import StringIO
+
+import pytest
+
+from aria_rest.archives import ArchiveCache, ArchiveError, is_archive, parse_uri
+from aria_rest.store import ContentStore
+
+
+def zip_archive(entries):
+    content = StringIO()
+    with zipfile.ZipFile(content, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, text in entries.iteritems():
+            archive.writestr(name, text)
+    return content.getvalue()
+
+
+CSAR = zip_archive({
+    'TOSCA-Metadata/TOSCA.meta': 'TOSCA-Meta-File-Version: 1.0\nEntry-Definitions: definitions/main.yaml\n',
+    'definitions/main.yaml': 'imports:\n  - types/nodes.yaml\n',
+    'definitions/types/nodes.yaml': 'node_types: {}\n'})
+
+
+def test_entries_are_read_in_place(tmpdir):
+    archives = ArchiveCache(ContentStore(str(tmpdir)))
+    archive = archives.add(CSAR)
+
+    assert is_archive(CSAR) and not is_archive('tosca_definitions_version: 1.0')
+    assert archive.entry == 'definitions/main.yaml'
+    assert archive.resolve('types/nodes.yaml', archive.entry) == 'definitions/types/nodes.yaml'
+    assert archive.resolve('missing.yaml', archive.entry) is None
+    assert archive.read('definitions/types/nodes.yaml') == 'node_types: {}\n'
+    assert parse_uri(archive.uri(archive.entry)) == (archive.key, 'definitions/main.yaml')
+    assert os.listdir(str(tmpdir)) == ['{0}.zip'.format(archive.key)]
+
+
+def test_uploads_are_reused(tmpdir):
+    archives = ArchiveCache(ContentStore(str(tmpdir)))
+    archive = archives.add(CSAR)
+
+    assert archives.add(CSAR) is archive
+    assert ArchiveCache(ContentStore(str(tmpdir))).open(archive.key).entry == archive.entry
+
+
+def test_single_root_blueprint(tmpdir):
+    archives = ArchiveCache(ContentStore(str(tmpdir)))
+
+    assert archives.add(zip_archive({'main.yaml': '', 'types/a.yaml': ''})).entry == 'main.yaml'
+
+    with pytest.raises(ArchiveError):
+        archives.add(zip_archive({'a.yaml': '', 'b.yaml': ''})).entry
+
+
+def test_invalid(tmpdir):
+    archives = ArchiveCache(ContentStore(str(tmpdir)))
+
+    with pytest.raises(ArchiveError):
+        archives.add('PK\x03\x04 truncated')
+
+    assert not os.listdir(str(tmpdir))
+
+    with pytest.raises(ArchiveError):
+        archives.open('../../etc/passwd')
+
+
+def test_files_are_purged(tmpdir):
+    archives = ArchiveCache(ContentStore(str(tmpdir), max_bytes=len(CSAR) + 10))
+    first = archives.add(CSAR)
+    second = archives.add(zip_archive({'main.yaml': 'other'}))
+
+    assert os.listdir(str(tmpdir)) == ['{0}.zip'.format(second.key)]
+    assert archives.add(CSAR).key == first.key
@@ -0,0 +1,132 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import json
+import os
+import zipfile
+from StringIO import StringIO
+
+import pytest
+
+from aria_rest.api import AriaRestApi
+from aria_rest.controllers import BatchController, MetricsController
+from aria_rest.metrics import Metrics, measure
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Client of the default application, whose batch controller parses a blueprint into
+    the name of its file, or the rendered text, measuring a :code:`read` stage. Metrics
+    start empty.
+    """
+
+    api = AriaRestApi()
+    batch_controller, metrics_controller = [
+        [controller for controller in api.controllers if isinstance(controller, cls)][0]
+        for cls in (BatchController, MetricsController)]
+    metrics = Metrics()
+
+    def parse_in(pool, command_data, consumers, render):
+        with measure('read'):
+            pass
+
+        if 'literal_location' in command_data:
+            return json.dumps({'text': command_data['literal_location']})
+        return json.dumps({'name': os.path.basename(command_data['uri'])})
+
+    monkeypatch.setattr(batch_controller.parse_controller, '_parse_in', parse_in)
+    monkeypatch.setattr(batch_controller.parse_controller, 'metrics', metrics)
+    monkeypatch.setattr(metrics_controller, 'metrics', metrics)
+
+    return api.app.app.test_client()
+
+
+def post(client, path, data, content_type='application/json'):
+    response = client.post(path, data=data, content_type=content_type)
+    response.close()
+    return response
+
+
+def archive(*names):
+    content = StringIO()
+
+    with zipfile.ZipFile(content, 'w') as archive_file:
+        for name in names:
+            archive_file.writestr(name, 'tosca_definitions_version: tosca_simple_yaml_1_0')
+
+    return content.getvalue()
+
+
+def test_uris(client):
+    response = post(client, '/batch/validate', json.dumps({'uris': ['a/one.yaml', 'two.yaml']}))
+
+    assert response.status_code == 200
+    assert [item['result'] for item in json.loads(response.data)['items']] == \
+        [{'name': 'one.yaml'}, {'name': 'two.yaml'}]
+
+
+def test_archive(client):
+    response = post(client, '/batch/model?pattern=*.yml',
+                    archive('b.yml', 'a/c.yml', 'README.md'), 'application/zip')
+
+    assert response.status_code == 200
+    assert [item['uri'] for item in json.loads(response.data)['items']] == ['a/c.yml', 'b.yml']
+
+
+def test_invalid_json(client):
+    assert post(client, '/batch/validate', '{"uris": [').status_code == 400
+    assert post(client, '/batch/validate', '["one.yaml"]').status_code == 400
+
+
+def test_invalid_archive(client):
+    response = post(client, '/batch/validate', 'not a zip archive', 'application/zip')
+
+    assert response.status_code == 400
+    assert 'zip' in response.data
+
+
+def test_render(client):
+    response = post(client, '/batch/render/validate',
+                    json.dumps({'template': 'name: {{ name }}',
+                                'variables': [{'name': 'one'}, {'name': 'two'}]}))
+
+    assert response.status_code == 200
+    items = json.loads(response.data)['items']
+    assert [item['index'] for item in items] == [0, 1]
+    assert [item['result'] for item in items] == [{'text': 'name: one'}, {'text': 'name: two'}]
+
+
+def test_render_template_error(client):
+    response = post(client, '/batch/render/model', json.dumps({'template': '{% if %}'}))
+
+    assert response.status_code == 200
+    assert json.loads(response.data)['issues'][0]['message'].startswith('template: ')
+
+
+def test_render_without_template(client):
+    assert post(client, '/batch/render/instance', json.dumps({'variables': []})).status_code == 400
+    assert post(client, '/batch/render/validate',
+                json.dumps({'uri': '/no/such/template.yaml'})).status_code == 404
+
+
+def test_stages_are_recorded_by_endpoint(client):
+    post(client, '/batch/validate', json.dumps({'uris': ['one.yaml', 'two.yaml']}))
+    post(client, '/batch/render/model', json.dumps({'template': 'name: one'}))
+    metrics = client.get('/metrics').data
+
+    assert 'aria_rest_stage_seconds_count{endpoint="batch_validate",stage="read"} 2' in metrics
+    assert 'aria_rest_stage_seconds_count{endpoint="batch_render_model",stage="read"} 1' in metrics
@@ -0,0 +1,195 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import itertools
+import os
+import threading
+import time
+
+import yaml
+
+from aria_rest import aria_customisation
+from aria_rest.aria_customisation import CachedRead, ConsumptionContextBuilder
+from aria_rest.cache import RawCache
+
+LOADER_SOURCE = 'aria_rest.aria_customisation.HttpLoaderSource'
+
+
+class FileLoader(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def get_canonical_location(self):
+        return self.path
+
+
+class FileLoaderSource(object):
+
+    def get_loader(self, context, location, origin_location):
+        return FileLoader(str(location))
+
+
+class YamlReader(object):
+
+    def __init__(self, loader, reads):
+        self.loader = loader
+        self.reads = reads
+
+    def read(self):
+        self.reads.append(os.path.basename(self.loader.path))
+
+        with open(self.loader.path) as yaml_file:
+            return yaml.safe_load(yaml_file)
+
+
+class CountingReaderSource(object):
+    """
+    Reads YAML files, recording their names in :code:`reads`.
+    """
+
+    def __init__(self):
+        self.reads = []
+
+    def get_reader(self, context, location, loader):
+        return YamlReader(loader, self.reads)
+
+
+class StandInModeling(object):
+    """
+    Modeling context generating serial ids, like ARIA's with :code:`IdType.LOCAL_SERIAL`.
+    """
+
+    def __init__(self):
+        self.model = {'node_templates': ['server']}
+        self.instance = None
+        self.inputs = {}
+        self._serial_id_counter = itertools.count(1)
+        self._locally_unique_ids = set()
+
+    def generate_id(self):
+        the_id = self._serial_id_counter.next()
+        self._locally_unique_ids.add(the_id)
+        return the_id
+
+
+class StandInSnapshot(object):
+
+    def __init__(self):
+        self.modeling = StandInModeling()
+        self.presentation = type('Presentation', (object,), {'presenter': object()})()
+
+
+def read(path, raw_cache):
+    """
+    Reads `path` the way an import is read, in a new context sharing `raw_cache`. Returns
+    the raw data and the names of the files read so far by contexts built the same way.
+    """
+
+    context = ConsumptionContextBuilder(loader_source='tests.rest.test_builder.FileLoaderSource',
+                                        reader_source='tests.rest.test_builder.CountingReaderSource',
+                                        raw_cache=raw_cache).build()
+
+    return CachedRead(context)._read(path, None), context.reading.reader_source.reads
+
+
+def test_second_build_reuses_templates(monkeypatch):
+    imported = []
+
+    def import_fullname(name):
+        imported.append(name)
+        return aria_customisation.HttpLoaderSource
+
+    monkeypatch.setattr(aria_customisation, 'import_fullname', import_fullname)
+    monkeypatch.setattr(ConsumptionContextBuilder, '_classes', {})
+    monkeypatch.setattr(ConsumptionContextBuilder, '_templates', {})
+
+    first = ConsumptionContextBuilder(loader_source=LOADER_SOURCE, prefixes='/profiles').build()
+    second = ConsumptionContextBuilder(loader_source=LOADER_SOURCE, prefixes='/profiles').build()
+
+    assert imported == [LOADER_SOURCE]
+    assert second.loading.loader_source is first.loading.loader_source
+    assert second.loading.prefixes == first.loading.prefixes
+
+
+def test_contexts_do_not_share_state():
+    first = ConsumptionContextBuilder(loader_source=LOADER_SOURCE, prefixes='/profiles',
+                                      import_prefixes=['/templates']).build()
+    second = ConsumptionContextBuilder(loader_source=LOADER_SOURCE, prefixes='/profiles').build()
+
+    first.validation.report('wrong field')
+    first.loading.prefixes.append('/more')
+
+    assert not second.validation.has_issues
+    assert '/templates' not in second.loading.prefixes
+    assert '/more' not in second.loading.prefixes
+    assert second.modeling is not first.modeling
+    assert second.presentation is not first.presentation
+
+
+def test_imports_are_read_again_when_edited(tmpdir, monkeypatch):
+    monkeypatch.setattr(ConsumptionContextBuilder, '_templates', {})
+    types = tmpdir.join('types.yaml')
+    types.write('node_types: {Server: {}}')
+    raw_cache = RawCache()
+
+    raw, reads = read(str(types), raw_cache)
+    assert raw == {'node_types': {'Server': {}}}
+    assert reads == ['types.yaml']
+
+    # Another context reuses what was read, and gets its own copy
+    raw['node_types']['Changed'] = {}
+    raw, reads = read(str(types), raw_cache)
+    assert raw == {'node_types': {'Server': {}}}
+    assert reads == ['types.yaml']
+
+    types.write('node_types: {Server: {}, Database: {}}')
+    os.utime(str(types), (time.time() + 10, time.time() + 10))
+
+    raw, reads = read(str(types), raw_cache)
+    assert raw == {'node_types': {'Server': {}, 'Database': {}}}
+    assert reads == ['types.yaml', 'types.yaml']
+
+
+def test_instances_of_a_snapshot_generate_their_own_ids():
+    snapshot = StandInSnapshot()
+    snapshot.modeling.generate_id()
+    ids = {}
+    started = threading.Event()
+
+    def instantiate(name):
+        context = ConsumptionContextBuilder(snapshot=snapshot).build()
+        started.wait()
+        ids[name] = [context.modeling.generate_id() for _ in range(100)]
+        ids[name + ' unique'] = context.modeling._locally_unique_ids
+
+    threads = [threading.Thread(target=instantiate, args=(name,)) for name in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+
+    assert ids['a'] == ids['b'] == range(2, 102)
+    assert ids['a unique'] is not ids['b unique']
+    assert snapshot.modeling._locally_unique_ids == set([1])
+    assert snapshot.modeling.generate_id() == 2
@@ -0,0 +1,194 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import time
+
+import pytest
+
+from aria_rest.cache import (ContextSnapshotCache, LruCache, ParseResultCache, RawCache,
+                              fingerprint)
+from aria_rest.store import ResultStore
+
+
+class Consumer(object):
+    pass
+
+
+class LoadingContext(object):
+    def __init__(self, prefixes=()):
+        self.prefixes = list(prefixes)
+        self.file_search_paths = []
+
+
+def test_lru_eviction_by_size():
+    cache = LruCache(10)
+    cache.put('a', 'a', 4)
+    cache.put('b', 'b', 4)
+    assert cache.get('a') == 'a'
+    cache.put('c', 'c', 4)
+    assert 'b' not in cache
+    assert cache.get('a') == 'a'
+    assert cache.get('c') == 'c'
+    assert cache.size == 8
+
+
+def test_oversized_entry_is_not_cached():
+    cache = LruCache(10)
+    cache.put('a', 'a', 11)
+    assert cache.get('a') is None
+    assert cache.size == 0
+
+
+def test_entry_invalidated_by_dependency_change(tmpdir):
+    imported = tmpdir.join('types.yaml')
+    imported.write('a: 1')
+    path = str(imported)
+
+    cache = ParseResultCache()
+    cache.put('key', '{}', [(path, fingerprint(path))])
+    assert cache.get('key') == '{}'
+
+    imported.write('a: 22')
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert cache.get('key') is None
+    assert len(cache) == 0
+
+
+def test_key_depends_on_content_inputs_and_stages(tmpdir):
+    blueprint = tmpdir.join('blueprint.yaml')
+    blueprint.write('a: 1')
+    data = {'uri': str(blueprint), 'inputs': {'x': 1}}
+
+    key = ParseResultCache.key(data, (Consumer,), 'render')
+    assert key == ParseResultCache.key(dict(data), (Consumer,), 'render')
+    assert key != ParseResultCache.key(dict(data, inputs={'x': 2}), (Consumer,), 'render')
+    assert key != ParseResultCache.key(data, (Consumer, Consumer), 'render')
+
+    assert key != ParseResultCache.key(data, (Consumer,), 'other')
+
+    blueprint.write('a: 2')
+    os.utime(str(blueprint), (time.time() + 10, time.time() + 10))
+    assert key != ParseResultCache.key(data, (Consumer,), 'render')
+
+
+def test_snapshots_bounded_by_count():
+    cache = ContextSnapshotCache(2)
+    snapshots = [object() for _ in range(3)]
+    for index, snapshot in enumerate(snapshots):
+        cache.put(index, snapshot)
+    assert len(cache) == 2
+    assert cache.get(0) is None
+    assert cache.get(2) is snapshots[2]
+
+
+def test_raw_cache_resolution_keys():
+    key = RawCache.key('types.yaml', 'blueprint.yaml', LoadingContext())
+    assert key == RawCache.key('types.yaml', 'blueprint.yaml', LoadingContext())
+    assert key != RawCache.key('types.yaml', 'other/blueprint.yaml', LoadingContext())
+    assert key != RawCache.key('types.yaml', 'blueprint.yaml', LoadingContext(['/prefix']))
+
+
+def test_raw_cache_returns_copies(tmpdir):
+    imported = tmpdir.join('types.yaml')
+    imported.write('a: [1]')
+    path = str(imported)
+
+    cache = RawCache()
+    cache.put('key', path, {'a': [1]})
+    assert cache.resolve('key') == path
+
+    raw = cache.get(path)
+    raw['a'].append(2)
+    assert cache.get(path) == {'a': [1]}
+
+    cache.put('missing', str(tmpdir.join('missing.yaml')), {})
+    assert cache.resolve('missing') is None
+
+
+def test_pinned_profiles_are_not_evicted(tmpdir):
+    profile = tmpdir.join('profile.yaml')
+    profile.write('a: 1')
+    other = tmpdir.join('other.yaml')
+    other.write('b: 2')
+
+    cache = RawCache(100)
+    cache.put(None, str(profile), {'a': 1})
+    cache.pin(str(profile))
+    assert cache.size == 0
+
+    cache.put(None, str(other), {'b': 'x' * 200})
+    assert cache.get(str(profile)) == {'a': 1}
+
+    profile.write('a: 11')
+    os.utime(str(profile), (time.time() + 10, time.time() + 10))
+    assert cache.get(str(profile)) is None
+
+
+def test_results_are_loaded_from_the_store(tmpdir):
+    imported = tmpdir.join('types.yaml')
+    imported.write('a: 1')
+    path = str(imported)
+    key = 'a' * 64
+
+    ParseResultCache(store=ResultStore(str(tmpdir.join('results')))) \
+        .put(key, '{}', [(path, fingerprint(path))])
+
+    # After a restart, or in another process sharing the directory
+    cache = ParseResultCache(store=ResultStore(str(tmpdir.join('results'))))
+    assert cache.get(key) == '{}'
+    assert len(cache) == 1
+
+    imported.write('a: 22')
+    os.utime(path, (time.time() + 10, time.time() + 10))
+    assert ParseResultCache(store=cache.store).get(key) is None
+    assert not os.listdir(str(tmpdir.join('results')))
+
+
+def test_stored_results_of_other_versions_are_ignored(tmpdir):
+    directory = str(tmpdir.join('results'))
+    ResultStore(directory, version='aria==0.1.0').save('a' * 64, '{}')
+    assert ResultStore(directory, version='aria==0.1.0').load('a' * 64) == ('{}', ())
+
+    store = ResultStore(directory, max_bytes=8, version='aria==0.2.0')
+    assert store.load('a' * 64) is None
+    assert ResultStore(directory, version='aria==0.1.0').load('a' * 64) == ('{}', ())
+
+    # Until they are the least recently used
+    os.utime(os.path.join(directory, os.listdir(directory)[0]), (0, 0))
+    store.save('b' * 64, '{}')
+    assert ResultStore(directory, version='aria==0.1.0').load('a' * 64) is None
+    assert store.load('b' * 64) == ('{}', ())
+
+
+def test_raw_data_is_loaded_from_the_store(tmpdir):
+    imported = tmpdir.join('types.yaml')
+    imported.write('a: [1]')
+    path = str(imported)
+
+    RawCache(store=ResultStore(str(tmpdir.join('results')))).put('key', path, {'a': [1]})
+
+    cache = RawCache(store=ResultStore(str(tmpdir.join('results'))))
+    assert cache.get(path) == {'a': [1]}
+    assert cache.get(str(tmpdir.join('other.yaml'))) is None
+
+
+def test_raw_data_is_not_stored_where_others_can_write(tmpdir):
+    store = ResultStore(str(tmpdir.join('results')))
+    os.chmod(store.directory, 0o777)
+
+    with pytest.raises(ValueError):
+        RawCache(store=store)
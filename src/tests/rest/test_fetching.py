@@ -0,0 +1,127 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import pytest
+
+from aria_rest.fetching import FetchError, HttpFetcher
+
+DOCUMENT = 'tosca_definitions_version: tosca_simple_yaml_1_0\n'
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), Handler)
+        self.requests = []
+        self.connections = set()
+        self.headers = {'ETag': '"v1"'}
+        self.delay = 0
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self.server_address[1])
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.headers.get('If-None-Match')))
+        server.connections.add(self.client_address)
+        time.sleep(server.delay)
+
+        if self.path != '/types.yaml':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == server.headers['ETag']:
+            self.send_response(304)
+            self.send_header('ETag', server.headers['ETag'])
+            self.end_headers()
+        else:
+            self.send_response(200)
+            for name, value in server.headers.iteritems():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(DOCUMENT)))
+            self.end_headers()
+            self.wfile.write(DOCUMENT)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_conditional_requests_over_one_connection(server, tmpdir):
+    fetcher = HttpFetcher(str(tmpdir))
+    url = server.url + '/types.yaml'
+
+    assert fetcher.fetch(url) == DOCUMENT
+    assert fetcher.fetch(url) == DOCUMENT
+    assert HttpFetcher(str(tmpdir)).fetch(url) == DOCUMENT
+
+    assert server.requests == [('/types.yaml', None), ('/types.yaml', '"v1"'),
+                               ('/types.yaml', '"v1"')]
+    assert len(server.connections) == 2
+
+
+def test_fresh_documents_are_not_requested(server, tmpdir):
+    server.headers['Cache-Control'] = 'max-age=60'
+    fetcher = HttpFetcher(str(tmpdir))
+
+    fetcher.fetch(server.url + '/types.yaml')
+    fetcher.fetch(server.url + '/types.yaml')
+    assert len(server.requests) == 1
+
+
+def test_concurrent_fetches_are_done_once(server):
+    server.delay = 0.2
+    fetcher = HttpFetcher(None)
+    texts = []
+
+    def fetch():
+        texts.append(fetcher.fetch(server.url + '/types.yaml'))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert texts == [DOCUMENT] * 4
+    assert len(server.requests) == 1
+
+
+def test_missing_document(server, tmpdir):
+    with pytest.raises(FetchError) as e:
+        HttpFetcher(str(tmpdir)).fetch(server.url + '/missing.yaml')
+    assert e.value.status == 404
@@ -0,0 +1,83 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import threading
+
+from aria_rest.jobs import JobQueue
+
+
+def test_job_result(tmpdir):
+    jobs = JobQueue(lambda operation, data: '{"%s": %d}' % (operation, data['x']), str(tmpdir))
+    job = jobs.submit('validate', {'x': 1})
+    assert jobs.wait(job['id'], 5)['status'] == JobQueue.SUCCEEDED
+    assert jobs.result(job['id']) == '{"validate": 1}'
+
+
+def test_non_ascii_result(tmpdir):
+    jobs = JobQueue(lambda operation, data: u'{"description": "caf\u00e9"}', str(tmpdir))
+    job = jobs.wait(jobs.submit('validate', {})['id'], 5)
+    assert job['status'] == JobQueue.SUCCEEDED
+    assert jobs.result(job['id']).decode('utf-8') == u'{"description": "caf\u00e9"}'
+
+
+def test_unwritable_result(tmpdir):
+    jobs = JobQueue(lambda operation, data: None, str(tmpdir))
+    job = jobs.wait(jobs.submit('validate', {})['id'], 5)
+    assert job['status'] == JobQueue.FAILED
+    assert 'TypeError' in job['error']
+
+
+def test_failed_job(tmpdir):
+    def execute(operation, data):
+        raise ValueError()
+
+    jobs = JobQueue(execute, str(tmpdir))
+    job = jobs.wait(jobs.submit('validate', {})['id'], 5)
+    assert job['status'] == JobQueue.FAILED
+    assert 'ValueError' in job['error']
+    assert jobs.result(job['id']) is None
+
+
+def test_priority_and_cancel(tmpdir):
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def execute(operation, data):
+        started.set()
+        release.wait(5)
+        order.append(operation)
+        return '{}'
+
+    jobs = JobQueue(execute, str(tmpdir), threads=1)
+    blocking = jobs.submit('blocking', {})
+    started.wait(5)
+    low = jobs.submit('low', {}, priority=1)
+    high = jobs.submit('high', {}, priority=10)
+    cancelled = jobs.submit('cancelled', {}, priority=5)
+    assert jobs.cancel(cancelled['id'])['status'] == JobQueue.CANCELLED
+    release.set()
+
+    assert jobs.wait(low['id'], 5)['status'] == JobQueue.SUCCEEDED
+    assert jobs.get(cancelled['id'])['status'] == JobQueue.CANCELLED
+    assert order == ['blocking', 'high', 'low']
+    assert jobs.get(blocking['id'])['status'] == JobQueue.SUCCEEDED
+
+
+def test_unknown_job(tmpdir):
+    jobs = JobQueue(None, str(tmpdir))
+    assert jobs.get('../../etc/passwd') is None
+    assert jobs.cancel('0' * 32) is None
@@ -0,0 +1,28 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+from aria_rest.memory import PeakMemory, address_space, rss
+
+
+def test_sizes():
+    assert 0 < rss() <= address_space()
+
+
+def test_peak_memory():
+    with PeakMemory(interval=0.001) as memory:
+        bytearray(128 * 1024 * 1024)
+
+    assert memory.growth >= 64 * 1024 * 1024
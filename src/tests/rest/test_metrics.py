@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import os
+
+from aria_rest.metrics import Metrics, Timings, measure
+
+
+def test_timings():
+    timings = Timings()
+
+    with measure('ignored'):
+        pass
+
+    with timings.activate():
+        assert Timings.current() is timings
+
+        with measure('read'):
+            pass
+
+    assert Timings.current() is None
+
+    timings.extend([('validate', 0.002), ('read', 0.001)])
+    assert timings.totals().keys() == ['read', 'validate']
+    assert timings.header().startswith('read;dur=1.')
+    assert timings.header().endswith('validate;dur=2.0')
+
+
+def test_peak_memory():
+    timings = Timings()
+    timings.add('read', 0.001)
+    timings.add_memory(2048 * 1024)
+    timings.add_memory(None)
+    timings.add_memory(1024)
+
+    assert timings.header() == 'read;dur=1.0, memory;desc="2048 KiB"'
+
+
+def test_prometheus_text():
+    metrics = Metrics(buckets=(0.1, 1))
+    metrics.increment('requests_total', endpoint='validate_file', outcome='ok')
+    metrics.increment('requests_total', endpoint='validate_file', outcome='ok')
+    metrics.observe('stage_seconds', 0.05, stage='read')
+    metrics.observe('stage_seconds', 5, stage='read')
+
+    assert metrics.expose().splitlines() == [
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="validate_file",outcome="ok"} 2',
+        '# TYPE stage_seconds histogram',
+        'stage_seconds_bucket{stage="read",le="0.1"} 1',
+        'stage_seconds_bucket{stage="read",le="1"} 1',
+        'stage_seconds_bucket{stage="read",le="+Inf"} 2',
+        'stage_seconds_sum{stage="read"} 5.05',
+        'stage_seconds_count{stage="read"} 2']
+
+
+def test_named_buckets():
+    metrics = Metrics(buckets=(0.1, 1), named_buckets={'peak_bytes': (1024,)})
+    metrics.observe('peak_bytes', 4096)
+
+    assert 'peak_bytes_bucket{le="1024"} 0' in metrics.expose()
+    assert 'peak_bytes_bucket{le="+Inf"} 1' in metrics.expose()
+
+
+def test_processes_are_summed(tmpdir):
+    metrics = Metrics(str(tmpdir))
+    metrics.increment('requests_total')
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            metrics.increment('requests_total')
+            metrics.expose()
+        finally:
+            os._exit(0)
+
+    os.waitpid(pid, 0)
+    assert 'requests_total 2' in metrics.expose()
+
+    metrics.clear()
+    assert metrics.expose() == '\n'
+
+
+def test_exited_processes_are_added_up(tmpdir):
+    metrics = Metrics(str(tmpdir))
+    metrics.increment('requests_total')
+    children = []
+
+    for retire in (True, False):
+        pid = os.fork()
+
+        if pid == 0:
+            try:
+                metrics.increment('requests_total')
+                metrics.increment('requests_total')
+                if retire:
+                    metrics.retire()
+                else:
+                    metrics.expose()
+            finally:
+                os._exit(0)
+
+        os.waitpid(pid, 0)
+        children.append(pid)
+
+    assert 'requests_total 5' in metrics.expose()
+    assert sorted(os.listdir(str(tmpdir))) == ['.lock', '{0}.json'.format(os.getpid()),
+                                               Metrics.RETIRED_NAME]
+
+    metrics.retire()
+    metrics.increment('requests_total')
+    assert 'requests_total 6' in metrics.expose()
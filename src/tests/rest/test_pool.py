@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import time
+
+import pytest
+
+from aria_rest.pool import WorkerError, WorkerMemoryError, WorkerPool, WorkerTimeoutError
+
+
+class Handler(object):
+
+    def pid(self):
+        return os.getpid()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def spin(self):
+        while True:
+            pass
+
+    def fail(self):
+        raise ValueError('failed')
+
+    def count(self, n):
+        for i in range(n):
+            yield i
+        raise ValueError('counted')
+
+    def allocate(self, megabytes):
+        return len(bytearray(megabytes * 1024 * 1024))
+
+
+def test_apply_runs_in_worker():
+    pool = WorkerPool(Handler(), 1)
+    try:
+        pid = pool.apply('pid')
+        assert pid != os.getpid()
+        assert pool.apply('pid') == pid
+    finally:
+        pool.close()
+
+
+def test_timeout_replaces_worker():
+    pool = WorkerPool(Handler(), 1, timeout=0.2)
+    try:
+        pid = pool.apply('pid')
+        with pytest.raises(WorkerTimeoutError):
+            pool.apply('sleep', 5)
+        assert pool.apply('pid') != pid
+    finally:
+        pool.close()
+
+
+def test_cpu_limit():
+    pool = WorkerPool(Handler(), 1, cpu_limit=1)
+    try:
+        with pytest.raises(WorkerTimeoutError):
+            pool.apply('spin')
+        assert pool.apply('pid')
+    finally:
+        pool.close()
+
+
+def test_error():
+    pool = WorkerPool(Handler(), 1)
+    try:
+        with pytest.raises(WorkerError) as e:
+            pool.apply('fail')
+        assert 'ValueError' in str(e.value)
+    finally:
+        pool.close()
+
+
+def test_memory_limit_replaces_worker():
+    pool = WorkerPool(Handler(), 1, memory_limit=64 * 1024 * 1024)
+    try:
+        pid = pool.apply('pid')
+        assert pool.apply('allocate', 16)
+        with pytest.raises(WorkerMemoryError):
+            pool.apply('allocate', 256)
+        assert pool.apply('pid') != pid
+    finally:
+        pool.close()
+
+
+def test_max_requests_replaces_worker():
+    pool = WorkerPool(Handler(), 1, max_requests=2)
+    try:
+        pids = [pool.apply('pid') for _ in range(4)]
+        assert pids[0] == pids[1] != pids[2] == pids[3]
+    finally:
+        pool.close()
+
+
+def test_max_rss_replaces_worker():
+    pool = WorkerPool(Handler(), 1, max_rss=1)
+    try:
+        assert pool.apply('pid') != pool.apply('pid')
+    finally:
+        pool.close()
+
+
+def test_iterate():
+    pool = WorkerPool(Handler(), 1)
+    try:
+        items = pool.iterate('count', 3)
+        assert [next(items) for _ in range(3)] == [0, 1, 2]
+        with pytest.raises(WorkerError) as e:
+            next(items)
+        assert 'counted' in str(e.value)
+    finally:
+        pool.close()
+
+
+def test_abandoned_iteration_replaces_worker():
+    pool = WorkerPool(Handler(), 1)
+    try:
+        pid = pool.apply('pid')
+        items = pool.iterate('count', 100000)
+        assert next(items) == 0
+        items.close()
+        assert pool.apply('pid') != pid
+    finally:
+        pool.close()
@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+import signal
+import socket
+import time
+import urllib2
+
+from aria_rest.prefork import PreforkServer
+
+
+def application(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(os.getpid())]
+
+
+def free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+
+def test_workers_are_served_and_replaced(tmpdir):
+    port = free_port()
+    workers_file = str(tmpdir.join('test.workers'))
+    master = os.fork()
+
+    if master == 0:
+        try:
+            server = PreforkServer(application, port, 2, host='127.0.0.1', workers_file=workers_file)
+            server.serve_forever()
+        finally:
+            os._exit(0)
+
+    def workers():
+        if not os.path.exists(workers_file):
+            return []
+        with open(workers_file) as f:
+            return [int(pid) for pid in f.read().split()]
+
+    try:
+        wait_for(lambda: len(workers()) == 2)
+        pids = workers()
+
+        def responding():
+            try:
+                return int(urllib2.urlopen('http://127.0.0.1:%d/' % port).read()) in pids
+            except IOError:
+                return False
+        wait_for(responding)
+
+        os.kill(pids[0], signal.SIGKILL)
+        wait_for(lambda: len(workers()) == 2 and pids[0] not in workers())
+    finally:
+        os.kill(master, signal.SIGTERM)
+        os.waitpid(master, 0)
+
+    assert not os.path.exists(workers_file)
+
+
+def test_workers_retire_after_max_requests(tmpdir):
+    port = free_port()
+    master = os.fork()
+
+    def on_exit():
+        tmpdir.join(str(os.getpid())).write('')
+
+    if master == 0:
+        try:
+            PreforkServer(application, port, 1, host='127.0.0.1', max_requests=1,
+                          on_exit=on_exit).serve_forever()
+        finally:
+            os._exit(0)
+
+    pids = []
+
+    def served():
+        try:
+            pids.append(int(urllib2.urlopen('http://127.0.0.1:%d/' % port).read()))
+        except IOError:
+            pass
+        return len(pids) == 3
+
+    try:
+        wait_for(served)
+    finally:
+        os.kill(master, signal.SIGTERM)
+        os.waitpid(master, 0)
+
+    assert len(set(pids)) == 3
+    assert set(str(pid) for pid in pids[:2]) <= set(os.listdir(str(tmpdir)))
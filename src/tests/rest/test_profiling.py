@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import os
+import time
+
+from aria_rest import controllers
+from aria_rest.controllers import ParseController
+from aria_rest.profiling import COLLAPSED, STATS, SamplingSwitch, StackSampler, profile_call
+
+
+def busy(seconds):
+    deadline = time.time() + seconds
+
+    while time.time() < deadline:
+        pass
+
+
+def test_stats():
+    assert 'busy' in profile_call(STATS, busy, 0.01)
+
+
+def test_collapsed_stacks():
+    stacks = profile_call(COLLAPSED, busy, 0.2).splitlines()
+    assert stacks
+    assert any('test_collapsed_stacks' in stack and ';busy (' in stack for stack in stacks)
+    assert all(stack.rsplit(' ', 1)[1].isdigit() for stack in stacks)
+
+
+def test_profiled_requests_skip_caches(monkeypatch):
+    controller = ParseController()
+    profiled = []
+
+    def fake_profile_call(profile_format, function, *args):
+        profiled.append(function.__self__)
+        return ''
+
+    monkeypatch.setattr(controllers, 'profile_call', fake_profile_call)
+    controller._profiled({'uri': 'blueprint.yaml'}, controller.SNAPSHOT_STAGES, None, STATS)
+
+    assert profiled[0].raw_cache is None
+    assert profiled[0].snapshots is not controller.snapshots
+    assert profiled[0].snapshots.max_size == 0
+    assert controller.raw_cache is not None
+
+
+class YieldingCounts(dict):
+    """
+    Lets other threads run between the items it iterates over.
+    """
+
+    def iteritems(self):
+        for stack in dict.__iter__(self):
+            time.sleep(0.001)
+            yield stack, self[stack]
+
+
+def test_collapsed_while_sampling():
+    sampler = StackSampler(interval=0)
+    sampler.counts = YieldingCounts()
+    sampler.start()
+
+    try:
+        deadline = time.time() + 5
+
+        while not sampler.counts and time.time() < deadline:
+            time.sleep(0.01)
+
+        for depth in range(20):
+            # Every depth is a new stack, counted while the counts are written
+            recurse(depth, sampler.collapsed)
+    finally:
+        sampler.stop()
+
+    assert sampler.collapsed()
+
+
+def recurse(depth, function):
+    return function() if depth == 0 else recurse(depth - 1, function)
+
+
+def test_sampling_switch(tmpdir):
+    marker = str(tmpdir.join('test.sampling'))
+    samples = str(tmpdir.join('test.{pid}.samples'))
+    switch = SamplingSwitch(marker, samples)
+    switch.POLL_INTERVAL = 0.05
+    switch.watch()
+
+    switch.toggle()
+    assert os.path.exists(marker)
+    busy(0.3)
+
+    switch.toggle()
+    assert not os.path.exists(marker)
+
+    path = samples.format(pid=os.getpid())
+    deadline = time.time() + 5
+
+    while not os.path.exists(path):
+        assert time.time() < deadline
+        time.sleep(0.05)
+
+    with open(path) as samples_file:
+        assert 'busy (' in samples_file.read()
@@ -0,0 +1,41 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+import time
+
+from aria_rest.readiness import Readiness
+
+
+def test_callbacks_run_once_ready():
+    readiness = Readiness(time.time() - 1)
+    calls = []
+
+    def fail():
+        raise RuntimeError()
+
+    readiness.on_ready(lambda: calls.append(1))
+    readiness.on_ready(fail)
+    readiness.on_ready(lambda: calls.append(2))
+    assert not readiness.is_ready
+    assert calls == []
+
+    readiness.mark_ready()
+    readiness.mark_ready()
+    assert readiness.is_ready
+    assert calls == [1, 2]
+    assert 1 <= readiness.seconds < 2
+
+    readiness.on_ready(lambda: calls.append(3))
+    assert calls == [1, 2, 3]
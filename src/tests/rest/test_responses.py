@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import gzip
+import json
+import zlib
+from StringIO import StringIO
+
+import msgpack
+from flask import Flask
+
+from aria_rest.responses import encoded_response, join_lines, streamed_response
+
+TEXT = json.dumps({'instance': {'nodes': ['node_%d' % index for index in range(1000)]}})
+
+
+def respond(headers):
+    with Flask(__name__).test_request_context(headers=headers):
+        response = encoded_response(TEXT)
+        return response, ''.join(response.response)
+
+
+def test_plain_json():
+    response, body = respond({})
+    assert response.mimetype == 'application/json'
+    assert response.headers['Content-Length'] == str(len(TEXT))
+    assert body == TEXT
+
+
+def test_gzip():
+    response, body = respond({'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.GzipFile(fileobj=StringIO(body)).read() == TEXT
+
+
+def test_msgpack():
+    response, body = respond({'Accept': 'application/x-msgpack'})
+    assert response.mimetype == 'application/x-msgpack'
+    assert msgpack.unpackb(body, raw=False) == json.loads(TEXT)
+
+
+def test_join_lines():
+    assert list(join_lines(['ab\n', 'c\n', 'de\n'], 4)) == ['ab\nc\n', 'de\n']
+
+
+def test_streamed_gzip():
+    chunks = ['{"index": %d}\n' % index for index in range(100)]
+
+    with Flask(__name__).test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = streamed_response(iter(chunks))
+        body = [chunk for chunk in response.response]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(body) == 101
+    assert zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body[0]) == chunks[0]
+    assert gzip.GzipFile(fileobj=StringIO(''.join(body))).read() == ''.join(chunks)
@@ -0,0 +1,135 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+from aria_rest.sessions import Blueprint, ValidationSessions
+from aria_rest.store import ContentStore
+
+BLUEPRINT = '''tosca_definitions_version: tosca_simple_yaml_1_0
+
+node_types:
+  Server:
+    derived_from: tosca.nodes.Compute
+
+topology_template:
+  node_templates:
+    web:
+      type: Server
+      properties:
+        broken: true
+    db:
+      type: tosca.nodes.Compute
+    app:
+      type: tosca.nodes.SoftwareComponent
+      requirements:
+        - host: web
+'''
+
+
+class Validator(object):
+    """
+    Reports an issue for every line containing "broken", and remembers the documents.
+    """
+
+    def __init__(self):
+        self.documents = []
+
+    def __call__(self, path):
+        with open(path) as document:
+            text = document.read()
+
+        self.documents.append(text)
+
+        return [{'level': 2, 'message': 'broken', 'location': path, 'line': number + 1}
+                for number, line in enumerate(text.split('\n')) if 'broken' in line]
+
+
+def sessions(tmpdir):
+    validator = Validator()
+    return validator, ValidationSessions(validator, ContentStore(str(tmpdir.join('store'))),
+                                         str(tmpdir.join('sessions')))
+
+
+def test_units():
+    blueprint = Blueprint(BLUEPRINT)
+
+    assert list(blueprint.units) == ['node_types/Server', 'topology_template/node_templates/web',
+                                     'topology_template/node_templates/db',
+                                     'topology_template/node_templates/app']
+    assert blueprint.units['topology_template/node_templates/app'].references == {'web'}
+    assert blueprint.unit_at(12) == 'topology_template/node_templates/db'
+    assert Blueprint('a:\n  b: &shared\n    e: 1\nc:\n  d: *shared\n').frame is None
+    assert Blueprint('{').frame is None
+
+
+def test_only_affected_units_are_revalidated(tmpdir):
+    validator, validation = sessions(tmpdir)
+    session = validation.submit(BLUEPRINT)
+
+    assert session['revalidated'] == 4
+    assert [issue['line'] for issue in validation.issues(session)] == [12]
+
+    session = validation.submit(BLUEPRINT.replace('Server\n      properties', 'Server\n      '
+                                                  'description: web server\n      properties'),
+                                session['id'])
+    pruned = validator.documents[-1]
+
+    assert session['revalidated'] == 2
+    assert 'db:' not in pruned and 'Server:' in pruned
+    assert len(pruned.split('\n')) == len(BLUEPRINT.split('\n')) + 1
+    assert [issue['line'] for issue in validation.issues(session)] == [13]
+
+
+def test_unaffected_issues_follow_their_unit(tmpdir):
+    validator, validation = sessions(tmpdir)
+    session = validation.submit(BLUEPRINT)
+    session = validation.submit(BLUEPRINT.replace('node_types:\n', 'node_types:\n  Other:\n'
+                                                  '    derived_from: tosca.nodes.Root\n'),
+                                session['id'])
+
+    assert session['revalidated'] == 1
+    assert 'web:' not in validator.documents[-1]
+    assert [issue['line'] for issue in validation.issues(session)] == [14]
+
+    session = validation.submit(BLUEPRINT, session['id'])
+
+    assert session['revalidated'] == 0
+    assert [issue['line'] for issue in validation.issues(session)] == [12]
+    assert len(validator.documents) == 2
+
+
+def test_frame_changes_revalidate_everything(tmpdir):
+    validator, validation = sessions(tmpdir)
+    session = validation.submit(BLUEPRINT)
+    session = validation.submit(BLUEPRINT.replace('1_0', '1_1'), session['id'])
+
+    assert session['revalidated'] == 4
+    assert validator.documents[-1] == BLUEPRINT.replace('1_0', '1_1')
+
+
+def test_patch(tmpdir):
+    validator, validation = sessions(tmpdir)
+    session = validation.submit(BLUEPRINT)
+    session = validation.patch(session['id'], {'topology_template': {'node_templates': {
+        'web': {'properties': None}, 'cache': {'type': 'tosca.nodes.Compute'}}}})
+
+    assert session['revalidated'] == 3
+    assert not validation.issues(session)
+    assert session['document'].split('\n')[:9] == BLUEPRINT.split('\n')[:9]
+    assert '    cache:\n      type: tosca.nodes.Compute\n' in session['document']
+
+    assert validation.patch('0' * 32, {}) is None
+    assert validation.remove(session['id'])
+    assert validation.get(session['id']) is None
@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+
+import yaml
+
+import aria_rest
+
+OPERATIONS = set([
+    ('/ready', 'get', 'ReadinessController.ready'),
+    ('/metrics', 'get', 'MetricsController.expose'),
+    ('/validate', 'get', 'ParseController.validate_file'),
+    ('/validate', 'post', 'ParseController.validate_upload'),
+    ('/indirect/validate', 'post', 'ParseController.validate_indirect'),
+    ('/model', 'get', 'ParseController.model_file'),
+    ('/model', 'post', 'ParseController.model_upload'),
+    ('/indirect/model', 'post', 'ParseController.model_indirect'),
+    ('/instance', 'get', 'ParseController.instance_file'),
+    ('/instance', 'post', 'ParseController.instance_upload'),
+    ('/indirect/instance', 'post', 'ParseController.instance_indirect'),
+    ('/jobs', 'post', 'JobController.submit'),
+    ('/jobs/{job_id}', 'get', 'JobController.status'),
+    ('/jobs/{job_id}', 'delete', 'JobController.cancel'),
+    ('/jobs/{job_id}/result', 'get', 'JobController.result'),
+    ('/validate/sessions', 'post', 'SessionController.create'),
+    ('/validate/sessions/{session_id}', 'get', 'SessionController.status'),
+    ('/validate/sessions/{session_id}', 'put', 'SessionController.update'),
+    ('/validate/sessions/{session_id}', 'patch', 'SessionController.patch'),
+    ('/validate/sessions/{session_id}', 'delete', 'SessionController.close'),
+    ('/batch/validate', 'post', 'BatchController.validate'),
+    ('/batch/model', 'post', 'BatchController.model'),
+    ('/batch/render/validate', 'post', 'BatchController.render_validate'),
+    ('/batch/render/model', 'post', 'BatchController.render_model'),
+    ('/batch/render/instance', 'post', 'BatchController.render_instance')])
+
+
+class UniqueKeyLoader(yaml.SafeLoader):
+    """
+    Refuses duplicate mapping keys, which :code:`yaml.safe_load` silently overwrites.
+    """
+
+    def construct_mapping(self, node, deep=False):
+        keys = [self.construct_object(key_node, deep=deep) for key_node, _ in node.value]
+        duplicates = set(key for key in keys if keys.count(key) > 1)
+        if duplicates:
+            raise yaml.constructor.ConstructorError(None, None,
+                                                    'duplicate keys: {0}'.format(duplicates),
+                                                    node.start_mark)
+        return yaml.SafeLoader.construct_mapping(self, node, deep)
+
+
+def load_specification():
+    path = os.path.join(os.path.dirname(aria_rest.__file__), 'swagger.yaml')
+    with open(path) as specification:
+        return yaml.load(specification, Loader=UniqueKeyLoader)
+
+
+def test_paths_and_operations():
+    paths = load_specification()['paths']
+
+    operations = set((path, method, operation['operationId'])
+                     for path, methods in paths.iteritems()
+                     for method, operation in methods.iteritems()
+                     if isinstance(operation, dict) and 'operationId' in operation)
+    assert operations == OPERATIONS
@@ -0,0 +1,61 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+
+import pytest
+from jinja2 import TemplateSyntaxError
+from jinja2.exceptions import SecurityError
+
+from aria_rest.templates import TemplateCache
+
+
+def test_compiled_once():
+    templates = TemplateCache()
+    template = templates.compile('name: {{ name }}')
+
+    assert templates.compile(u'name: {{ name }}') is template
+    assert template.render(name='node') == 'name: node'
+
+    with pytest.raises(TemplateSyntaxError):
+        templates.compile('name: {{ name')
+
+
+def test_file_recompiled_when_changed(tmpdir):
+    path = tmpdir.join('blueprint.yaml.jinja')
+    path.write('version: 1')
+    templates = TemplateCache()
+    template = templates.load(str(path))
+
+    assert templates.load(str(path)) is template
+
+    path.write('version: 22')
+    os.utime(str(path), (0, 0))
+
+    assert templates.load(str(path)).render() == 'version: 22'
+
+
+def test_sandboxed():
+    template = TemplateCache().compile("{{ ''.__class__.__mro__[1].__subclasses__() }}")
+
+    with pytest.raises(SecurityError):
+        template.render()
+
+
+def test_environment_only_for_files():
+    assert 'ENV' in TemplateCache.context('blueprint.yaml.jinja')
+    assert 'ENV' not in TemplateCache.context()
+    assert 'ARIA_VERSION' in TemplateCache.context()
@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import os
+from StringIO import StringIO
+
+from flask import Flask, request
+from werkzeug.test import Client, create_environ
+from werkzeug.wrappers import BaseResponse
+
+from aria_rest.store import ContentStore
+from aria_rest.uploads import UploadSpooler, spooled_body
+
+from .test_archives import CSAR
+
+
+def client(tmpdir, threshold, max_bytes):
+    app = Flask(__name__)
+
+    @app.route('/', methods=['POST'])
+    def upload():
+        spooled = spooled_body()
+        if spooled is None:
+            return 'read {0}'.format(len(request.get_data()))
+        return 'spooled {0}'.format(os.path.basename(spooled[1]))
+
+    app.wsgi_app = UploadSpooler(ContentStore(str(tmpdir)), threshold, max_bytes, app.wsgi_app)
+    return Client(app, BaseResponse)
+
+
+def test_small_bodies_are_read(tmpdir):
+    response = client(tmpdir, 1024, 4096).post('/', data='x' * 1024)
+
+    assert response.data == 'read 1024'
+    assert not os.listdir(str(tmpdir))
+
+
+def test_large_bodies_are_spooled(tmpdir):
+    upload = client(tmpdir, 100, 4096)
+    blueprint = 'tosca_definitions_version: tosca_simple_yaml_1_0\n' * 20
+
+    response = upload.post('/', data=blueprint)
+    assert response.data == 'spooled {0}.yaml'.format(ContentStore.key(blueprint))
+    with open(os.path.join(str(tmpdir), '{0}.yaml'.format(ContentStore.key(blueprint)))) as spooled:
+        assert spooled.read() == blueprint
+
+    response = upload.post('/', data=CSAR, content_type='application/zip')
+    assert response.data == 'spooled {0}.zip'.format(ContentStore.key(CSAR))
+    assert len(os.listdir(str(tmpdir))) == 2
+
+
+def test_json_is_not_spooled(tmpdir):
+    response = client(tmpdir, 100, 4096).post('/', data='[' + '0, ' * 100 + '0]',
+                                               content_type='application/json')
+
+    assert response.data == 'read 303'
+
+
+def test_too_large(tmpdir):
+    response = client(tmpdir, 100, 4096).post('/', data='x' * 4097)
+
+    assert response.status_code == 413
+    assert not os.listdir(str(tmpdir))
+
+
+def post_chunked(client, data):
+    environ = create_environ('/', method='POST', input_stream=StringIO(data),
+                             headers={'Transfer-Encoding': 'chunked'})
+    del environ['CONTENT_LENGTH']
+    environ['wsgi.input_terminated'] = True
+
+    return client.open(environ)
+
+
+def test_chunked_bodies_are_bounded(tmpdir):
+    upload = client(tmpdir, 100, 4096)
+
+    assert post_chunked(upload, 'x' * 50).data == 'read 50'
+    assert post_chunked(upload, 'x' * 200).data == 'spooled {0}.yaml'.format(
+        ContentStore.key('x' * 200))
+
+    response = post_chunked(upload, 'x' * 5000)
+    assert response.status_code == 413
+    assert len(os.listdir(str(tmpdir))) == 1
+
+
+def test_store_is_bounded(tmpdir):
+    store = ContentStore(str(tmpdir), max_bytes=250)
+    first = store.put('a' * 100, '.yaml')
+    os.utime(store.path(first, '.yaml'), (0, 0))
+
+    temporary_file, temporary_path = store.temporary_file()
+    with temporary_file:
+        temporary_file.write('b' * 100)
+    second = ContentStore.key('b' * 100)
+    assert store.put_file(temporary_path, second, '.yaml') == store.path(second, '.yaml')
+    assert len(os.listdir(str(tmpdir))) == 2
+
+    store.put('c' * 100, '.yaml')
+    assert sorted(os.listdir(str(tmpdir))) == sorted('{0}.yaml'.format(ContentStore.key(c * 100))
+                                                     for c in 'bc')
+
+
+def test_store_scans_only_when_full(tmpdir, monkeypatch):
+    store = ContentStore(str(tmpdir), max_bytes=250)
+    store.put('a' * 100)
+    scans = []
+    listdir = os.listdir
+
+    def counting_listdir(path):
+        scans.append(path)
+        return listdir(path)
+
+    monkeypatch.setattr(os, 'listdir', counting_listdir)
+
+    store.put('b' * 100)
+    assert not scans
+
+    store.put('c' * 100)
+    assert scans == [str(tmpdir)]
+    assert len(listdir(str(tmpdir))) == 2
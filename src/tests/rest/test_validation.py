@@ -0,0 +1,59 @@
+#
+# Copyright (c) 2017 GigaSpaces Technologies Ltd. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+#
+
+import pytest
+from aria.parser.validation import Issue
+
+from aria_rest.aria_customisation import (BoundedValidationContext, ConsumptionContextBuilder,
+                                          IssueLimitError)
+
+
+def test_issues_above_level_are_ignored():
+    validation = BoundedValidationContext(level=Issue.FIELD)
+    validation.report('wrong field', level=Issue.FIELD)
+    validation.report('unknown type', level=Issue.BETWEEN_TYPES)
+
+    assert [issue.message for issue in validation.issues] == ['wrong field']
+
+    validation = BoundedValidationContext(level=Issue.SYNTAX)
+    validation.report('unknown type', level=Issue.BETWEEN_TYPES)
+
+    assert not validation.has_issues
+
+
+def test_consumption_stops_after_max_issues():
+    validation = BoundedValidationContext(max_issues=2)
+    validation.report('first', level=Issue.FIELD)
+
+    with pytest.raises(IssueLimitError):
+        validation.report('second', level=Issue.FIELD)
+
+    assert len(validation.issues) == 2
+
+    validation = BoundedValidationContext(level=Issue.FIELD, max_issues=1)
+    validation.report('unknown type', level=Issue.BETWEEN_TYPES)
+
+    with pytest.raises(IssueLimitError):
+        validation.report('wrong field', level=Issue.FIELD)
+
+
+def test_builder():
+    context = ConsumptionContextBuilder(level=Issue.SYNTAX, max_issues=5).build()
+
+    assert isinstance(context.validation, BoundedValidationContext)
+    assert (context.validation.max_level, context.validation.max_issues) == (Issue.SYNTAX, 5)
+    assert not isinstance(ConsumptionContextBuilder().build().validation,
+                          BoundedValidationContext)